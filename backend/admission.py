@@ -0,0 +1,130 @@
+"""
+Admission control in front of model inference
+
+Bounds how many chatbot.chat() calls run at once (max_in_flight) and how many
+may wait for a slot (max_queue). When the queue is full, or a request has
+waited longer than queue_timeout, the caller gets Overloaded and should
+answer 503 with Retry-After instead of letting latency grow for everyone.
+Crisis messages are never shed: they skip the queue limit and the queue
+timeout, and are always served before other waiters, so they wait at most
+for the in-flight work to finish.
+
+All bookkeeping runs on the event loop thread; the work itself runs in the
+default thread pool so the loop stays free to reject quickly, with the
+caller's contextvars (the request id in log lines) copied over and, for a
+profiled request, the pool thread added to its profile.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from functools import partial
+from typing import Any, Callable
+
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS
+from profiling import profiled
+
+REJECTED_QUEUE_FULL = ADMISSION_REJECTIONS.labels("queue_full")
+REJECTED_TIMEOUT = ADMISSION_REJECTIONS.labels("timeout")
+
+_PRIORITY_CRISIS = 0
+_PRIORITY_NORMAL = 1
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 1, max_queue: int = 32, queue_timeout: float = 10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        # Heap of (priority, sequence, future); abandoned entries are skipped lazily
+        self._waiters = []
+        self._sequence = itertools.count()
+        # Moving average of service time, used for the Retry-After hint
+        self._service_seconds = 0.5
+
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.in_flight)
+        ADMISSION_QUEUE_DEPTH.set_function(lambda: self.queued)
+
+    def retry_after(self) -> int:
+        backlog = (self.queued + self.in_flight) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(backlog * self._service_seconds))
+
+    async def _acquire(self, priority: bool):
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self.in_flight += 1
+            return
+        if not priority and self.queued >= self.max_queue:
+            REJECTED_QUEUE_FULL.inc()
+            raise Overloaded("queue_full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        rank = _PRIORITY_CRISIS if priority else _PRIORITY_NORMAL
+        heapq.heappush(self._waiters, (rank, next(self._sequence), future))
+        self.queued += 1
+        start = time.perf_counter()
+        try:
+            # Crisis waiters are next in line for any slot; they wait it out
+            await asyncio.wait_for(future, None if priority else self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done() or future.cancelled():
+                self.queued -= 1
+                REJECTED_TIMEOUT.inc()
+                raise Overloaded("timeout", self.retry_after())
+            # The slot was handed over just as the timeout fired; keep it
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                self.queued -= 1
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    def _release(self):
+        """Hand the slot to the best waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.queued -= 1
+                future.set_result(True)
+                return
+        self.in_flight -= 1
+
+    async def run(self, func: Callable, *args, priority: bool = False, **kwargs) -> Any:
+        """Run func in the thread pool once admitted
+
+        The slot is released when the work finishes, not when the caller
+        stops waiting, so a disconnected client cannot push in-flight work
+        past max_in_flight.
+        """
+        await self._acquire(priority)
+        start = time.perf_counter()
+        # run_in_executor does not carry contextvars over on its own
+        context = contextvars.copy_context()
+        try:
+            work = asyncio.get_running_loop().run_in_executor(
+                None, context.run, profiled(partial(func, *args, **kwargs)))
+        except BaseException:
+            self._release()
+            raise
+
+        def finished(_):
+            self._service_seconds += 0.2 * (time.perf_counter() - start - self._service_seconds)
+            self._release()
+
+        work.add_done_callback(finished)
+        return await asyncio.shield(work)
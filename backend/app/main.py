@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 import uvicorn
 import psycopg2
@@ -10,33 +12,86 @@ import os
 from datetime import datetime
 import json
 import re
+import threading
+import asyncio
+from collections import deque
+from time import perf_counter
 from dotenv import load_dotenv
 
+import logging
+import metrics
+from logging_config import setup_logging, install_request_logging
+from profiling import install_profiling
+from session_cache import SessionCache
+from ids import new_session_id
+from migrate import run_migrations
+from partitions import (
+    LOCK_TIMEOUT as PARTITION_LOCK_TIMEOUT, database_now, ensure_partitions, expire_partitions,
+    oldest_retained_day, retention_cutoff, to_database_time
+)
+from archive import archive_partition, archive_sessions
+import timeseries
+import trajectory
+from health import HealthProber
+from config import (
+    MESSAGE_RETENTION_HOURS, PARTITION_PREMAKE_DAYS, PARTITION_RETENTION_MODE, ARCHIVE_ENABLED, ARCHIVE_DIR,
+    TIMESERIES_MINUTE_RETENTION_HOURS, TIMESERIES_HOUR_RETENTION_DAYS, TIMESERIES_MAX_POINTS,
+    TRAJECTORY_HALF_LIFE_HOURS, HEALTH_PROBE_INTERVAL
+)
+from metrics import (
+    STAGE_SESSION_LOOKUP, STAGE_HISTORY_FETCH, STAGE_CLASSIFY, STAGE_GENERATE, STAGE_SAVE,
+    EMOTIONS, DB_CONNECTIONS_OPENED, DB_CONNECTION_ERRORS, DB_CONNECT_SECONDS, DB_CONNECTIONS_IN_USE,
+    WEBSOCKET_CONNECTIONS
+)
+
 # Load environment variables
 load_dotenv()
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="FeelMate API", version="1.0.0")
 
+ALLOWED_ORIGINS = ["http://localhost:3000"]
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Opt-in request profiling and /admin/profiles endpoints
+install_profiling(app)
+
+# Request IDs for log correlation (registered last so it wraps everything)
+install_request_logging(app)
+
+# Connections report close() so /metrics can show how many are checked out
+class TrackedConnection(psycopg2.extensions.connection):
+    def close(self):
+        if not self.closed:
+            DB_CONNECTIONS_IN_USE.dec()
+        super().close()
+
 # Database connection
 def get_db_connection():
     try:
         database_url = os.getenv("DATABASE_URL")
         if not database_url:
-            print("DATABASE_URL not found in environment variables")
+            logger.warning("DATABASE_URL not found in environment variables")
             return None
-        connection = psycopg2.connect(database_url)
+        start = perf_counter()
+        connection = psycopg2.connect(database_url, connection_factory=TrackedConnection)
+        DB_CONNECT_SECONDS.observe(perf_counter() - start)
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECTIONS_IN_USE.inc()
         return connection
     except Exception as e:
-        print(f"Database connection error: {e}")
+        DB_CONNECTION_ERRORS.inc()
+        logger.error("Database connection error: %s", e)
         return None
 
 # Create chat tables if they don't exist
@@ -47,7 +102,7 @@ def init_chat_tables():
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS chat_sessions (
-                    id SERIAL PRIMARY KEY,
+                    id BIGSERIAL PRIMARY KEY,
                     user_id TEXT NOT NULL,
                     session_id TEXT UNIQUE NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -61,7 +116,7 @@ def init_chat_tables():
             """)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS chat_messages (
-                    id SERIAL PRIMARY KEY,
+                    id BIGSERIAL PRIMARY KEY,
                     session_id TEXT NOT NULL,
                     message TEXT NOT NULL,
                     sender TEXT NOT NULL,
@@ -74,13 +129,29 @@ def init_chat_tables():
             """)
             conn.commit()
             cursor.close()
+            # Brings both fresh and existing databases to the current schema
+            applied = run_migrations(conn)
+            if applied:
+                logger.info("Applied migrations: %s", ", ".join(applied))
+            cursor = conn.cursor()
+            ensure_partitions(cursor, PARTITION_PREMAKE_DAYS)
+            conn.commit()
+            cursor.close()
             conn.close()
-            print("Chat tables initialized successfully")
+            logger.info("Chat tables initialized successfully")
         except Exception as e:
-            print(f"Error initializing tables: {e}")
+            logger.error("Error initializing tables: %s", e)
 
 # Session timeout configuration (in minutes)
 SESSION_TIMEOUT_MINUTES = 30  # 30 minutes of inactivity
+# Partition upkeep and expired-session cleanup run on this schedule, in a
+# background thread, instead of on every message
+SESSION_CLEANUP_INTERVAL_SECONDS = 60
+
+# Hot sessions are validated from memory; entries expire with the session timeout
+session_cache = SessionCache(ttl_seconds=SESSION_TIMEOUT_MINUTES * 60)
+_cleanup_lock = threading.Lock()
+_maintenance_stop = threading.Event()
 
 def cleanup_expired_sessions():
     conn = get_db_connection()
@@ -94,96 +165,194 @@ def cleanup_expired_sessions():
             WHERE last_activity < NOW() - INTERVAL '%s minutes'
             AND is_active = TRUE
         """, (SESSION_TIMEOUT_MINUTES,))
+        conn.commit()
+        now = database_now(cursor)
+        # Expiring days are archived to Parquet first, then each partition is
+        # detached in its own short transaction; a failed write keeps it in Postgres
+        archive = (lambda day: archive_partition(conn, day, ARCHIVE_DIR)) if ARCHIVE_ENABLED else None
+        expired = expire_partitions(conn, MESSAGE_RETENTION_HOURS, PARTITION_RETENTION_MODE, now, archive)
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", (PARTITION_LOCK_TIMEOUT,))
+        ensure_partitions(cursor, PARTITION_PREMAKE_DAYS, now)
+        conn.commit()
+        # Only delete sessions whose messages were all in expired partitions,
+        # so ON DELETE CASCADE has no message rows left to remove
+        cutoff = retention_cutoff(cursor, MESSAGE_RETENTION_HOURS, now)
+        oldest_day = oldest_retained_day(cursor, MESSAGE_RETENTION_HOURS, now)
+        if oldest_day is not None:
+            cutoff = min(cutoff, datetime.combine(oldest_day, datetime.min.time()))
+        if ARCHIVE_ENABLED:
+            archive_sessions(conn, cutoff, ARCHIVE_DIR)
+        conn.commit()
+        timeseries.rollup(cursor, now, TIMESERIES_MINUTE_RETENTION_HOURS, TIMESERIES_HOUR_RETENTION_DAYS)
+        conn.commit()
         cursor.execute("""
-            DELETE FROM chat_messages 
-            WHERE session_id IN (
-                SELECT session_id FROM chat_sessions 
-                WHERE is_active = FALSE 
-                AND last_activity < NOW() - INTERVAL '%s hours'
-            )
-        """, (24,))
-        cursor.execute("""
-            DELETE FROM chat_sessions 
-            WHERE is_active = FALSE 
-            AND last_activity < NOW() - INTERVAL '%s hours'
-        """, (24,))
+            DELETE FROM chat_sessions
+            WHERE is_active = FALSE
+            AND last_activity < %s
+        """, (cutoff,))
         conn.commit()
         cursor.close()
-        conn.close()
-        print(f"Session cleanup completed - timeout: {SESSION_TIMEOUT_MINUTES} minutes")
+        if expired:
+            logger.info("Expired chat_messages partitions (%s): %s", PARTITION_RETENTION_MODE, ", ".join(expired))
+        logger.debug("Session cleanup completed - timeout: %s minutes", SESSION_TIMEOUT_MINUTES)
     except Exception as e:
-        print(f"Error cleaning up sessions: {e}")
+        logger.error("Error cleaning up sessions: %s", e)
+    finally:
+        conn.close()
 
-def update_session_activity(session_id: str):
+def ensure_future_partitions():
+    """Create partitions PARTITION_PREMAKE_DAYS ahead; inserts fail without one"""
     conn = get_db_connection()
     if not conn:
         return
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE chat_sessions 
-            SET last_activity = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-            WHERE session_id = %s
-        """, (session_id,))
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", (PARTITION_LOCK_TIMEOUT,))
+        created = ensure_partitions(cursor, PARTITION_PREMAKE_DAYS)
         conn.commit()
         cursor.close()
-        conn.close()
+        if created:
+            logger.info("Created chat_messages partitions: %s", ", ".join(created))
     except Exception as e:
-        print(f"Error updating session activity: {e}")
+        logger.error("Error creating partitions: %s", e)
+    finally:
+        conn.close()
+
+def _run_maintenance():
+    # Independent of request traffic, so a server that sat idle for longer
+    # than PARTITION_PREMAKE_DAYS still has a partition for today
+    while not _maintenance_stop.is_set():
+        ensure_future_partitions()
+        _run_cleanup()
+        _maintenance_stop.wait(SESSION_CLEANUP_INTERVAL_SECONDS)
+
+def _run_cleanup():
+    if not _cleanup_lock.acquire(blocking=False):
+        return
+    try:
+        cleanup_expired_sessions()
+    finally:
+        _cleanup_lock.release()
 
 def get_or_create_session(user_id: str, session_id: Optional[str] = None) -> str:
+    # Hot path: an active cached session needs no database round trip.
+    # save_message writes last_activity through to Postgres afterwards.
+    if session_id and session_cache.get(session_id):
+        return session_id
     conn = get_db_connection()
     if not conn:
-        return f"session-{user_id}-{datetime.now().timestamp()}"
+        return new_session_id()
     try:
         cursor = conn.cursor()
-        cleanup_expired_sessions()
         if session_id:
+            # Also check the timeout here, since cleanup no longer runs per message
             cursor.execute("""
-                SELECT session_id FROM chat_sessions 
+                SELECT id, user_id, current_emotion, severity_level,
+                       EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - last_activity))
+                FROM chat_sessions 
                 WHERE session_id = %s AND is_active = TRUE
-            """, (session_id,))
-            if cursor.fetchone():
-                update_session_activity(session_id)
+                AND last_activity >= CURRENT_TIMESTAMP - INTERVAL '%s minutes'
+            """, (session_id, SESSION_TIMEOUT_MINUTES))
+            row = cursor.fetchone()
+            if row:
+                pk, owner, current_emotion, severity_level, idle_seconds = row
+                session_cache.put(session_id, pk, owner, float(idle_seconds or 0), current_emotion, severity_level)
                 return session_id
-        new_session_id = f"session-{user_id}-{datetime.now().timestamp()}"
+        created_id = new_session_id()
         cursor.execute("""
             INSERT INTO chat_sessions (user_id, session_id, created_at, updated_at, last_activity)
             VALUES (%s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        """, (user_id, new_session_id))
+            RETURNING id
+        """, (user_id, created_id))
+        pk = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
-        return new_session_id
+        session_cache.put(created_id, pk, user_id)
+        return created_id
     except Exception as e:
-        print(f"Error in get_or_create_session: {e}")
-        return f"session-{user_id}-{datetime.now().timestamp()}"
+        logger.error("Error in get_or_create_session: %s", e)
+        return new_session_id()
+    finally:
+        conn.close()
+
+def session_pk_for(cursor, session_id: str) -> Optional[int]:
+    """chat_sessions.id for a public session ID, from the cache when possible"""
+    entry = session_cache.peek(session_id)
+    if entry is not None and entry.pk is not None:
+        return entry.pk
+    cursor.execute("SELECT id FROM chat_sessions WHERE session_id = %s", (session_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
 
-def save_message(session_id: str, message: str, sender: str, emotion_data: Dict):
+def save_messages(session_id: str, messages: List[tuple]):
+    """
+    Persist (message, sender, emotion_data, message_id) rows of one session
+    in one transaction. A user row whose client message_id is already stored
+    for the session is a resend: it and the AI reply after it are skipped,
+    so the turn is not counted twice in the buckets and trajectory.
+    """
     conn = get_db_connection()
     if not conn:
         return
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO chat_messages (session_id, message, sender, emotion, severity, confidence, timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-        """, (
-            session_id, message, sender,
-            emotion_data.get('emotion'),
-            emotion_data.get('severity'),
-            emotion_data.get('confidence', 0.0)
-        ))
-        cursor.execute("""
-            UPDATE chat_sessions 
-            SET current_emotion = %s, severity_level = %s, updated_at = CURRENT_TIMESTAMP, last_activity = CURRENT_TIMESTAMP
-            WHERE session_id = %s
-        """, (emotion_data.get('emotion'), emotion_data.get('severity'), session_id))
+        session_pk = session_pk_for(cursor, session_id)
+        if session_pk is None:
+            logger.warning("Not saving message for unknown session %s", session_id)
+            cursor.close()
+            conn.close()
+            return
+        # Serializes saves of one session, so a resend waits for and then sees the first copy
+        cursor.execute("SELECT 1 FROM chat_sessions WHERE id = %s FOR UPDATE", (session_pk,))
+        saved = []
+        duplicate = False
+        for message, sender, emotion_data, message_id in messages:
+            if sender == "user":
+                duplicate = False
+                if message_id is not None:
+                    cursor.execute("""
+                        SELECT 1 FROM chat_messages WHERE session_pk = %s AND client_message_id = %s
+                    """, (session_pk, message_id))
+                    duplicate = cursor.fetchone() is not None
+                if duplicate:
+                    logger.info("Skipping resent message %s in session %s", message_id, session_id)
+            if duplicate:
+                continue
+            saved.append(emotion_data)
+            cursor.execute("""
+                INSERT INTO chat_messages (session_pk, message, sender, emotion, severity, confidence,
+                                           client_message_id, timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            """, (
+                session_pk, message, sender,
+                emotion_data.get('emotion'),
+                emotion_data.get('severity'),
+                emotion_data.get('confidence', 0.0),
+                message_id if sender == "user" else None
+            ))
+            cursor.execute("""
+                UPDATE chat_sessions 
+                SET current_emotion = %s, severity_level = %s, updated_at = CURRENT_TIMESTAMP, last_activity = CURRENT_TIMESTAMP
+                WHERE id = %s
+                RETURNING user_id
+            """, (emotion_data.get('emotion'), emotion_data.get('severity'), session_pk))
+            user_id = cursor.fetchone()[0]
+            if sender == "user":
+                timeseries.record_message(cursor, emotion_data.get('emotion'), emotion_data.get('severity'))
+                trajectory.record_message(
+                    cursor, user_id, emotion_data.get('emotion'), emotion_data.get('severity'), TRAJECTORY_HALF_LIFE_HOURS
+                )
         conn.commit()
         cursor.close()
         conn.close()
+        if saved:
+            session_cache.touch(session_id, saved[-1].get('emotion'), saved[-1].get('severity'))
     except Exception as e:
-        print(f"Error saving message: {e}")
+        logger.error("Error saving message: %s", e)
+
+def save_message(session_id: str, message: str, sender: str, emotion_data: Dict,
+                 message_id: Optional[str] = None):
+    save_messages(session_id, [(message, sender, emotion_data, message_id)])
 
 def get_conversation_history(session_id: str) -> List[str]:
     conn = get_db_connection()
@@ -191,11 +360,12 @@ def get_conversation_history(session_id: str) -> List[str]:
         return []
     try:
         cursor = conn.cursor()
+        session_pk = session_pk_for(cursor, session_id)
         cursor.execute("""
             SELECT message, sender, emotion, severity FROM chat_messages 
-            WHERE session_id = %s 
+            WHERE session_pk = %s 
             ORDER BY timestamp ASC
-        """, (session_id,))
+        """, (session_pk,))
         messages = []
         for row in cursor.fetchall():
             message, sender, emotion, severity = row
@@ -207,17 +377,22 @@ def get_conversation_history(session_id: str) -> List[str]:
         conn.close()
         return messages
     except Exception as e:
-        print(f"Error getting conversation history: {e}")
+        logger.error("Error getting conversation history: %s", e)
         return []
 
 # Initialize tables on startup
 init_chat_tables()
 
+# Client message ids are UUIDs; anything longer is rejected
+MAX_MESSAGE_ID_LENGTH = 64
+
 # Pydantic models
 class ChatMessage(BaseModel):
     message: str
     user_id: str
     session_id: Optional[str] = None
+    # Client-generated; a resend with the same id is not stored twice
+    message_id: Optional[str] = Field(None, max_length=MAX_MESSAGE_ID_LENGTH)
 
 class ChatResponse(BaseModel):
     response: str
@@ -362,24 +537,89 @@ class ContextAwareResponseGenerator:
 emotion_classifier = ContextAwareEmotionClassifier()
 response_generator = ContextAwareResponseGenerator()
 
+# Dependencies are probed in the background; /health serves the cached result
+health = HealthProber(interval=HEALTH_PROBE_INTERVAL)
+
+def check_database():
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("connection failed")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+
+def check_model():
+    result = emotion_classifier.classify_emotion_with_context("I feel okay today", [])
+    return {"emotion": result["emotion"]}
+
+# Without DATABASE_URL the API still answers (no history), so only degrade
+health.add_check("database", check_database, critical=bool(os.getenv("DATABASE_URL")))
+health.add_check("model", check_model)
+
+@app.on_event("startup")
+def start_health_prober():
+    health.start()
+
+@app.on_event("shutdown")
+def stop_health_prober():
+    health.stop()
+
+@app.on_event("startup")
+def start_maintenance():
+    _maintenance_stop.clear()
+    threading.Thread(target=_run_maintenance, name="db-maintenance", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_maintenance():
+    _maintenance_stop.set()
+
+# Stored with every AI reply
+AI_MESSAGE_EMOTION = {'emotion': 'supportive', 'severity': 'low', 'confidence': 0.8}
+
 # API endpoints
 @app.get("/")
 def read_root():
     return {"message": "FeelMate Emotional Support API with Chat History"}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "database": "connected" if get_db_connection() else "disconnected"}
+async def health_check():
+    status_code, body = health.snapshot()
+    return JSONResponse(body, status_code=status_code)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/api/chat/send-message")
 async def send_message(chat_message: ChatMessage):
     try:
+        start = perf_counter()
         session_id = get_or_create_session(chat_message.user_id, chat_message.session_id)
+        stage_end = perf_counter()
+        STAGE_SESSION_LOOKUP.observe(stage_end - start)
+        start = stage_end
         conversation_history = get_conversation_history(session_id)
+        stage_end = perf_counter()
+        STAGE_HISTORY_FETCH.observe(stage_end - start)
+        start = stage_end
         emotion_data = emotion_classifier.classify_emotion_with_context(chat_message.message, conversation_history)
+        stage_end = perf_counter()
+        STAGE_CLASSIFY.observe(stage_end - start)
+        EMOTIONS.labels(emotion_data['emotion']).inc()
+        start = stage_end
         ai_response = response_generator.generate_response(emotion_data, conversation_history, chat_message.message)
-        save_message(session_id, chat_message.message, "user", emotion_data)
-        save_message(session_id, ai_response, "ai", {'emotion': 'supportive', 'severity': 'low', 'confidence': 0.8})
+        stage_end = perf_counter()
+        STAGE_GENERATE.observe(stage_end - start)
+        start = stage_end
+        save_messages(session_id, [
+            (chat_message.message, "user", emotion_data, chat_message.message_id),
+            (ai_response, "ai", AI_MESSAGE_EMOTION, None)
+        ])
+        STAGE_SAVE.observe(perf_counter() - start)
         resources = response_generator.get_resources(emotion_data)
         return ChatResponse(
             response=ai_response,
@@ -391,9 +631,113 @@ async def send_message(chat_message: ChatMessage):
             session_id=session_id
         )
     except Exception as e:
-        print(f"Error in send_message: {e}")
+        logger.exception("Error in send_message: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# WebSocket chat keeps the session and a history window in memory for the
+# life of the socket; classify_emotion_with_context looks back 10 messages
+WS_HISTORY_WINDOW = 10
+WS_PERSIST_QUEUE_SIZE = 64
+
+class ChatConnection:
+    """Per-socket chat state: resolved session, bounded history and an ordered persist queue"""
+
+    def __init__(self, session_id: str, history: List[str]):
+        self.session_id = session_id
+        self.history = deque(history[-WS_HISTORY_WINDOW:], maxlen=WS_HISTORY_WINDOW)
+        # A full queue blocks the receive loop, so a slow database applies backpressure
+        self.pending: asyncio.Queue = asyncio.Queue(maxsize=WS_PERSIST_QUEUE_SIZE)
+        self.writer = asyncio.create_task(self._persist())
+
+    def reply(self, message: str):
+        start = perf_counter()
+        history = list(self.history)
+        emotion_data = emotion_classifier.classify_emotion_with_context(message, history)
+        stage_end = perf_counter()
+        STAGE_CLASSIFY.observe(stage_end - start)
+        EMOTIONS.labels(emotion_data['emotion']).inc()
+        ai_response = response_generator.generate_response(emotion_data, history, message)
+        STAGE_GENERATE.observe(perf_counter() - stage_end)
+        self.history.extend((f"user: {message}", f"ai: {ai_response}"))
+        return emotion_data, ai_response
+
+    async def save(self, message: str, emotion_data: Dict, ai_response: str, message_id: Optional[str] = None):
+        await self.pending.put([
+            (message, "user", emotion_data, message_id),
+            (ai_response, "ai", AI_MESSAGE_EMOTION, None)
+        ])
+
+    async def _persist(self):
+        """Write queued turns in order; turns that queued up meanwhile share one transaction"""
+        closing = False
+        while not closing:
+            turns = [await self.pending.get()]
+            while not self.pending.empty():
+                turns.append(self.pending.get_nowait())
+            if None in turns:
+                closing = True
+                turns = turns[:turns.index(None)]
+            rows = [row for turn in turns for row in turn]
+            if rows:
+                start = perf_counter()
+                await run_in_threadpool(save_messages, self.session_id, rows)
+                STAGE_SAVE.observe(perf_counter() - start)
+
+    async def close(self):
+        """Flush pending turns before the connection state is dropped"""
+        await self.pending.put(None)
+        # Shielded: a cancelled handler (e.g. on shutdown) must not cancel the flush
+        await asyncio.shield(self.writer)
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, user_id: str, session_id: Optional[str] = None):
+    # CORSMiddleware does not cover WebSockets, so check the origin here
+    origin = websocket.headers.get("origin")
+    if origin and origin not in ALLOWED_ORIGINS:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    start = perf_counter()
+    session_id = await run_in_threadpool(get_or_create_session, user_id, session_id)
+    stage_end = perf_counter()
+    STAGE_SESSION_LOOKUP.observe(stage_end - start)
+    history = await run_in_threadpool(get_conversation_history, session_id)
+    STAGE_HISTORY_FETCH.observe(perf_counter() - stage_end)
+    connection = ChatConnection(session_id, history)
+    WEBSOCKET_CONNECTIONS.inc()
+    try:
+        await websocket.send_json({"type": "session", "session_id": session_id})
+        while True:
+            try:
+                payload = json.loads(await websocket.receive_text())
+                message = payload["message"].strip()
+                message_id = payload.get("message_id")
+                if message_id is not None and (not isinstance(message_id, str)
+                                               or len(message_id) > MAX_MESSAGE_ID_LENGTH):
+                    raise ValueError("invalid message_id")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": 'Expected {"message": "..."}'})
+                continue
+            if not message:
+                continue
+            emotion_data, ai_response = connection.reply(message)
+            await connection.save(message, emotion_data, ai_response, message_id)
+            await websocket.send_json({
+                "type": "reply",
+                "response": ai_response,
+                "emotion": emotion_data['emotion'],
+                "severity": emotion_data['severity'],
+                "confidence": emotion_data['confidence'],
+                "needs_help": emotion_data['needs_help'],
+                "resources": response_generator.get_resources(emotion_data),
+                "session_id": session_id
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        WEBSOCKET_CONNECTIONS.dec()
+        await connection.close()
+
 @app.get("/api/chat/session-status/{session_id}")
 async def get_session_status(session_id: str):
     try:
@@ -425,7 +769,7 @@ async def get_session_status(session_id: str):
             "session_timeout_minutes": SESSION_TIMEOUT_MINUTES
         }
     except Exception as e:
-        print(f"Error getting session status: {e}")
+        logger.error("Error getting session status: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/api/chat/history/{session_id}")
@@ -436,10 +780,11 @@ async def get_chat_history(session_id: str):
             raise HTTPException(status_code=500, detail="Database connection failed")
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT message, sender, emotion, severity, timestamp 
-            FROM chat_messages 
-            WHERE session_id = %s 
-            ORDER BY timestamp ASC
+            SELECT m.message, m.sender, m.emotion, m.severity, m.timestamp 
+            FROM chat_messages m
+            JOIN chat_sessions s ON s.id = m.session_pk
+            WHERE s.session_id = %s 
+            ORDER BY m.timestamp ASC
         """, (session_id,))
         messages = []
         for row in cursor.fetchall():
@@ -455,7 +800,7 @@ async def get_chat_history(session_id: str):
         conn.close()
         return {"messages": messages, "session_id": session_id}
     except Exception as e:
-        print(f"Error getting chat history: {e}")
+        logger.error("Error getting chat history: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/api/analytics/dashboard-stats")
@@ -492,9 +837,67 @@ async def get_dashboard_stats():
             "severity_distribution": severity_distribution
         }
     except Exception as e:
-        print(f"Error getting dashboard stats: {e}")
+        logger.error("Error getting dashboard stats: %s", e)
         return {"total_sessions": 0, "total_messages": 0, "emotion_distribution": {}, "severity_distribution": {}}
 
+@app.get("/api/analytics/timeseries")
+async def get_emotion_timeseries(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$")
+):
+    """Emotion and severity counts of user messages per bucket, from pre-aggregated buckets"""
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cursor = conn.cursor()
+        # Buckets hold the database's local time (LOCALTIMESTAMP); offset-aware
+        # bounds are converted to its TimeZone, naive ones are taken as is
+        end = to_database_time(cursor, end) if end else database_now(cursor)
+        start = to_database_time(cursor, start) if start else end - timeseries.STEP[granularity] * 24
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if timeseries.bucket_count(start, end, granularity) > TIMESERIES_MAX_POINTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Range too large for {granularity} granularity (max {TIMESERIES_MAX_POINTS} buckets)"
+            )
+        buckets = timeseries.query(cursor, start, end, granularity)
+        cursor.close()
+        return {
+            "granularity": granularity,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "buckets": buckets
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error getting emotion timeseries: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        conn.close()
+
+@app.get("/api/users/{user_id}/trajectory")
+async def get_user_trajectory(user_id: str):
+    """Rolling emotion statistics across all of a user's sessions (one row lookup)"""
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        cursor = conn.cursor()
+        result = trajectory.get_trajectory(cursor, user_id)
+        cursor.close()
+    except Exception as e:
+        logger.error("Error getting user trajectory: %s", e)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        conn.close()
+    if result is None:
+        raise HTTPException(status_code=404, detail="No messages recorded for this user")
+    return result
+
 if __name__ == "__main__":
     print("Starting FeelMate API server with chat history...")
     print("API will be available at: http://localhost:8001")
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Two-tier cascade emotion classifier
+
+Every message is scored by the cheap TF-IDF model first. Only messages whose
+confidence falls below a tunable threshold are escalated to the transformer
+pipeline, so most traffic never pays for distilroberta inference.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.ml.training.train_emotion_model import EmotionModelTrainer
+from metrics import INFERENCE_BATCH_SIZE
+
+FAST_BATCH_SIZE = INFERENCE_BATCH_SIZE.labels("fast")
+TRANSFORMER_BATCH_SIZE = INFERENCE_BATCH_SIZE.labels("transformer")
+
+DEFAULT_THRESHOLD = 0.6
+
+
+def _top_prediction(result: Any) -> Dict[str, Any]:
+    """Normalize a transformers pipeline result to a single {label, score} dict"""
+    while isinstance(result, list):
+        result = result[0]
+    return {"label": result["label"].lower(), "score": float(result["score"])}
+
+
+class CascadeEmotionClassifier:
+    """Cheap model first, transformer only on low confidence"""
+
+    def __init__(
+        self,
+        fast_model: EmotionModelTrainer,
+        transformer: Optional[Callable] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+    ):
+        self.fast_model = fast_model
+        self.transformer = transformer
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.reset_metrics()
+
+    @classmethod
+    def from_saved_model(cls, transformer: Optional[Callable] = None, threshold: float = DEFAULT_THRESHOLD):
+        """Build a cascade around the trained model in app/ml/models
+
+        Prefers the memory-mapped bundle and falls back to the joblib pickles.
+        """
+        trainer = EmotionModelTrainer()
+        try:
+            trainer.load_bundle()
+        except FileNotFoundError:
+            trainer.load_model()
+        return cls(trainer, transformer=transformer, threshold=threshold)
+
+    def _transformer_ready(self) -> bool:
+        # A ModelRegistry has no active model until one loads (possibly later, via /admin/models)
+        return self.transformer is not None and getattr(self.transformer, "active", True) is not None
+
+    def reset_metrics(self):
+        with self._lock:
+            self._total = 0
+            self._escalated = 0
+            self._agreed = 0
+            self._fast_seconds = 0.0
+            self._transformer_seconds = 0.0
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Classify one message, escalating to the transformer if needed"""
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """Classify many messages; low-confidence ones go to the transformer in one call"""
+        texts = list(texts)
+        if not texts:
+            return []
+
+        FAST_BATCH_SIZE.observe(len(texts))
+        start = time.perf_counter()
+        fast = self.fast_model.predict_batch(texts)
+        fast_seconds = time.perf_counter() - start
+
+        results = [
+            {
+                "emotion": str(fast["emotion"][i]),
+                "confidence": float(fast["confidence"][i]),
+                "tier": "fast",
+            }
+            for i in range(len(texts))
+        ]
+
+        escalate = []
+        if self._transformer_ready():
+            escalate = [i for i in range(len(texts)) if fast["confidence"][i] < self.threshold]
+
+        agreed = 0
+        transformer_seconds = 0.0
+        if escalate:
+            TRANSFORMER_BATCH_SIZE.observe(len(escalate))
+            start = time.perf_counter()
+            outputs = self.transformer([texts[i] for i in escalate], top_k=1)
+            transformer_seconds = time.perf_counter() - start
+            for i, output in zip(escalate, outputs):
+                prediction = _top_prediction(output)
+                if prediction["label"] == results[i]["emotion"]:
+                    agreed += 1
+                results[i] = {
+                    "emotion": prediction["label"],
+                    "confidence": prediction["score"],
+                    "tier": "transformer",
+                    "fast_emotion": results[i]["emotion"],
+                    "fast_confidence": results[i]["confidence"],
+                }
+
+        with self._lock:
+            self._total += len(texts)
+            self._escalated += len(escalate)
+            self._agreed += agreed
+            self._fast_seconds += fast_seconds
+            self._transformer_seconds += transformer_seconds
+
+        return results
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Escalation rate, fast/transformer agreement and time spent per tier"""
+        with self._lock:
+            total = self._total
+            escalated = self._escalated
+            return {
+                "threshold": self.threshold,
+                "total_messages": total,
+                "escalated_messages": escalated,
+                "escalation_rate": escalated / total if total else 0.0,
+                "agreement_rate": self._agreed / escalated if escalated else None,
+                "fast_seconds": self._fast_seconds,
+                "transformer_seconds": self._transformer_seconds,
+                "avg_fast_ms": 1000 * self._fast_seconds / total if total else 0.0,
+                "avg_transformer_ms": 1000 * self._transformer_seconds / escalated if escalated else 0.0,
+            }
+
+
+def sweep_thresholds(
+    fast_model: EmotionModelTrainer,
+    transformer: Callable,
+    texts: List[str],
+    thresholds: Iterable[float] = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9),
+) -> List[Dict[str, Any]]:
+    """Report escalation rate and agreement with the transformer for each threshold
+
+    The transformer labels every text once; each threshold is then evaluated
+    against those reference labels so the sweep costs a single transformer pass.
+    """
+    fast = fast_model.predict_batch(texts)
+    reference = [_top_prediction(output)["label"] for output in transformer(texts, top_k=1)]
+
+    report = []
+    for threshold in thresholds:
+        escalated = fast["confidence"] < threshold
+        final = [
+            reference[i] if escalated[i] else str(fast["emotion"][i])
+            for i in range(len(texts))
+        ]
+        agreement = sum(1 for label, ref in zip(final, reference) if label == ref)
+        report.append({
+            "threshold": threshold,
+            "escalation_rate": float(escalated.mean()) if len(texts) else 0.0,
+            "agreement_with_transformer": agreement / len(texts) if texts else 0.0,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from transformers import pipeline
+
+    from app.ml.training.train_emotion_model import EmotionDataset
+    from config import EMOTION_MODEL
+
+    trainer = EmotionModelTrainer()
+    trainer.load_model()
+    transformer = pipeline("text-classification", model=EMOTION_MODEL, device=-1)
+    texts = [item["text"] for item in EmotionDataset().create_synthetic_dataset()]
+
+    print("Threshold sweep (escalation rate vs agreement with transformer):")
+    for row in sweep_thresholds(trainer, transformer, texts):
+        print(f"threshold={row['threshold']:.2f} "
+              f"escalation={row['escalation_rate']:.1%} "
+              f"agreement={row['agreement_with_transformer']:.1%}")
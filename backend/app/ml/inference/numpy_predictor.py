@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Standalone NumPy-only emotion predictor
+
+Serves a model exported by app/ml/training/export_numpy.py without importing
+scikit-learn, scipy or pandas. The TF-IDF transform and the tree traversal
+replay scikit-learn's arithmetic step for step (same dtypes, same summation
+order), so predictions match EmotionModelTrainer.predict_emotion exactly.
+"""
+
+import json
+import re
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+EXPORT_PATH = "app/ml/models/emotion_numpy.npz"
+EXPORT_FORMAT = "numpy-emotion/1"
+
+
+class NumpyEmotionPredictor:
+    def __init__(self, path: str = EXPORT_PATH):
+        with np.load(path, allow_pickle=False) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+
+        meta = json.loads(str(self.arrays.pop("meta")))
+        if meta.get("format") != EXPORT_FORMAT:
+            raise ValueError(f"Unsupported export format: {meta.get('format')}")
+        self.meta = meta
+
+        self.classes_ = self.arrays["classes"]
+        self.kind = meta["model_kind"]
+        self.severity_map = meta["severity_map"]
+        self.default_severity = meta["default_severity"]
+        self.help_threshold = meta["help_threshold"]
+
+        vectorizer = meta["vectorizer"]
+        self.lowercase = vectorizer["lowercase"]
+        self.token_pattern = re.compile(vectorizer["token_pattern"])
+        self.stop_words = frozenset(vectorizer["stop_words"] or ())
+        self.min_n, self.max_n = vectorizer["ngram_range"]
+        self.binary = vectorizer["binary"]
+        self.sublinear_tf = vectorizer["sublinear_tf"]
+        self.norm = vectorizer["norm"]
+        self.vocabulary = {
+            str(term): i for i, term in enumerate(self.arrays["vocabulary"])
+        }
+        self.idf = self.arrays["idf"]
+        self.n_features = len(self.vocabulary)
+
+    def _tokens(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = [t for t in self.token_pattern.findall(text) if t not in self.stop_words]
+        if self.max_n == 1:
+            return tokens
+        ngrams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[i:i + n]))
+        return ngrams
+
+    def _transform_row(self, text: str):
+        """TF-IDF features of one text as (sorted column indices, float64 values)"""
+        counts: Dict[int, int] = {}
+        for token in self._tokens(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        columns = np.array(sorted(counts), dtype=np.int64)
+        values = np.array([counts[c] for c in columns], dtype=np.float64)
+        if self.binary:
+            values[:] = 1.0
+        if self.sublinear_tf:
+            values = np.log(values) + 1.0
+        values = values * self.idf[columns]
+
+        # Row norms accumulate sequentially, in column order, like scikit-learn
+        if self.norm == "l2":
+            total = 0.0
+            for v in values:
+                total += v * v
+            if total != 0.0:
+                values = values / np.sqrt(total)
+        elif self.norm == "l1":
+            total = 0.0
+            for v in values:
+                total += abs(v)
+            if total != 0.0:
+                values = values / total
+        return columns, values
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Dense float64 TF-IDF matrix"""
+        X = np.zeros((len(texts), self.n_features), dtype=np.float64)
+        for row, text in enumerate(texts):
+            columns, values = self._transform_row(text)
+            X[row, columns] = values
+        return X
+
+    def _forest_proba(self, X: np.ndarray) -> np.ndarray:
+        a = self.arrays
+        # Trees compare float32 features against float64 thresholds
+        X = X.astype(np.float32)
+        n_samples = X.shape[0]
+        rows = np.arange(n_samples)[:, None]
+        node = np.broadcast_to(a["roots"], (n_samples, len(a["roots"]))).copy()
+        while True:
+            left = a["children_left"][node]
+            active = left != -1
+            if not active.any():
+                break
+            go_left = X[rows, a["feature"][node]] <= a["threshold"][node]
+            node = np.where(active, np.where(go_left, left, a["children_right"][node]), node)
+
+        leaf_values = a["value"][node]
+        proba = np.zeros((n_samples, len(self.classes_)), dtype=np.float64)
+        for tree in range(leaf_values.shape[1]):
+            proba += leaf_values[:, tree]
+        proba /= leaf_values.shape[1]
+        return proba
+
+    def _linear_proba(self, X: np.ndarray) -> np.ndarray:
+        coef_t = self.arrays["coef"].T
+        decision = np.zeros((X.shape[0], coef_t.shape[1]), dtype=np.float64)
+        for row in range(X.shape[0]):
+            for column in np.flatnonzero(X[row]):
+                decision[row] += X[row, column] * coef_t[column]
+        decision += self.arrays["intercept"]
+        decision -= np.max(decision, axis=1).reshape((-1, 1))
+        np.exp(decision, out=decision)
+        decision /= np.sum(decision, axis=1).reshape((-1, 1))
+        return decision
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        X = self.transform(texts)
+        if self.kind == "forest":
+            return self._forest_proba(X)
+        return self._linear_proba(X)
+
+    def predict_batch(self, texts: Iterable[str]) -> Dict:
+        """Columnar predictions, same layout as EmotionModelTrainer.predict_batch"""
+        texts = list(texts)
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        class_severity = np.array(
+            [self.severity_map.get(str(label), self.default_severity) for label in self.classes_],
+            dtype=np.int64
+        )
+        severity = class_severity[best]
+        return {
+            "emotion": self.classes_[best],
+            "confidence": probabilities[np.arange(len(texts)), best],
+            "severity": severity,
+            "needs_help": severity >= self.help_threshold,
+            "probabilities": probabilities,
+            "classes": self.classes_
+        }
+
+    def predict_emotion(self, text: str) -> Dict:
+        """Drop-in replacement for EmotionModelTrainer.predict_emotion"""
+        probabilities = self.predict_proba([text])[0]
+        emotion = self.classes_[probabilities.argmax()]
+        severity = self.severity_map.get(str(emotion), self.default_severity)
+        return {
+            "emotion": emotion,
+            "confidence": max(probabilities),
+            "severity": severity,
+            "needs_help": severity >= self.help_threshold,
+            "probabilities": dict(zip(self.classes_, probabilities))
+        }
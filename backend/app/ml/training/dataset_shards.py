@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, sharded storage for emotion datasets
+
+Records are streamed from any iterable into gzip-compressed JSONL shards, one
+shard sequence per split, plus a manifest.json describing every shard. Each
+record is assigned to train or test by hashing its text with a seed, so the
+split is deterministic, needs no shuffling buffer and is stable across runs
+and machines. Hashing does not stratify, so write_shards counts records per
+label and fails if the test split is empty or misses a label that train
+has. Shards are independent files and can be read in parallel.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+SHARD_DIR = "app/ml/data/shards"
+MANIFEST_FILE = "manifest.json"
+SHARD_FORMAT = "jsonl.gz"
+SPLITS = ("train", "test")
+
+# Hash buckets used for the deterministic split
+_BUCKETS = 10000
+
+
+def split_for(text: str, test_fraction: float = 0.2, seed: int = 42) -> str:
+    """Deterministically assign a record to "train" or "test" by its text"""
+    digest = hashlib.blake2b(f"{seed}:{text}".encode("utf-8"), digest_size=8).digest()
+    bucket = int.from_bytes(digest, "big") % _BUCKETS
+    return "test" if bucket < test_fraction * _BUCKETS else "train"
+
+
+class _ShardWriter:
+    """Rolls over to a new gzip JSONL file every shard_size records"""
+
+    def __init__(self, output_dir: str, split: str, shard_size: int):
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.shards: List[Dict] = []
+        self._file = None
+        self._count = 0
+
+    def _open(self):
+        name = f"{self.split}-{len(self.shards):05d}.{SHARD_FORMAT}"
+        self._file = gzip.open(os.path.join(self.output_dir, name), "wt", encoding="utf-8")
+        self.shards.append({"file": name, "split": self.split, "records": 0})
+        self._count = 0
+
+    def write(self, record: Dict):
+        if self._file is None or self._count >= self.shard_size:
+            self.close()
+            self._open()
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self._file.write("\n")
+        self._count += 1
+        self.shards[-1]["records"] = self._count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def check_split_labels(labels: Dict[str, Counter]):
+    """Raise ValueError if a split is empty or test lacks a label seen in train"""
+    for split in SPLITS:
+        if not sum(labels[split].values()):
+            raise ValueError(f"{split.capitalize()} split is empty "
+                             f"({sum(sum(c.values()) for c in labels.values())} records); "
+                             "use more records or another test_fraction")
+    missing = [label for label in labels["train"] if label not in labels["test"]]
+    if missing:
+        counts = ", ".join(f"{label} ({labels['train'][label]} in train)" for label in missing)
+        raise ValueError(f"Test split has no records for {counts}; "
+                         "use more records for these labels, a larger test_fraction or another seed")
+
+
+def write_shards(records: Iterable[Dict], output_dir: str = SHARD_DIR, shard_size: int = 10000,
+                 test_fraction: float = 0.2, seed: int = 42, label_key: str = "emotion") -> Dict:
+    """Stream records into train/test shards and write the manifest
+
+    Only one open shard per split is held at a time, so memory use does not
+    grow with the dataset size. Raises ValueError (without writing a
+    manifest) if the test split does not cover every label_key value.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {split: _ShardWriter(output_dir, split, shard_size) for split in SPLITS}
+    labels = {split: Counter() for split in SPLITS}
+    try:
+        for record in records:
+            split = split_for(record["text"], test_fraction, seed)
+            writers[split].write(record)
+            labels[split][record.get(label_key)] += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    try:
+        check_split_labels(labels)
+    except ValueError:
+        # The old manifest may now point at overwritten shards
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        raise
+
+    shards = writers["train"].shards + writers["test"].shards
+    manifest = {
+        "format": SHARD_FORMAT,
+        "created_at": datetime.now().isoformat(),
+        "seed": seed,
+        "test_fraction": test_fraction,
+        "shard_size": shard_size,
+        "records": {split: sum(s["records"] for s in writers[split].shards) for split in SPLITS},
+        "labels": {split: {str(label): n for label, n in labels[split].items()} for split in SPLITS},
+        "shards": shards,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Wrote {len(shards)} shards to {output_dir} "
+          f"(train: {manifest['records']['train']}, test: {manifest['records']['test']})")
+    return manifest
+
+
+def read_manifest(output_dir: str = SHARD_DIR) -> Dict:
+    with open(os.path.join(output_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_shard(path: str) -> Iterator[Dict]:
+    """Lazily yield the records of one shard"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_shard(path: str) -> List[Dict]:
+    return list(iter_shard(path))
+
+
+def shard_paths(output_dir: str = SHARD_DIR, split: Optional[str] = None) -> List[str]:
+    manifest = read_manifest(output_dir)
+    return [
+        os.path.join(output_dir, shard["file"])
+        for shard in manifest["shards"]
+        if split is None or shard["split"] == split
+    ]
+
+
+def iter_split(output_dir: str = SHARD_DIR, split: str = "train") -> Iterator[Dict]:
+    """Stream every record of a split without loading it all at once"""
+    for path in shard_paths(output_dir, split):
+        yield from iter_shard(path)
+
+
+def load_split(output_dir: str = SHARD_DIR, split: str = "train", workers: Optional[int] = None) -> List[Dict]:
+    """Read all shards of a split, decompressing and parsing them in parallel"""
+    paths = shard_paths(output_dir, split)
+    if len(paths) <= 1 or workers == 1:
+        return [record for path in paths for record in iter_shard(path)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [record for shard in pool.map(read_shard, paths) for record in shard]
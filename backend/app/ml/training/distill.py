@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Knowledge distillation from the transformer into the fast TF-IDF model
+
+The transformer labels an unlabeled corpus (plain text files, JSONL shards
+or the Parquet chat archive) with its full probability distribution, in
+batched pipeline calls. Soft labels are cached on disk per teacher, so
+growing the corpus only pays for the new texts. The student is a TF-IDF +
+logistic regression model trained on those soft targets: each text is
+expanded into one row per class weighted by the teacher's probability,
+which makes the weighted log-loss exactly the soft-target cross-entropy.
+
+The report compares teacher, previous fast model and student on
+agreement with the teacher, gold accuracy on the labeled synthetic set,
+latency, and how much traffic the cascade would keep on the student.
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from app.ml.training import dataset_shards
+from app.ml.training.train_emotion_model import EmotionDataset, EmotionModelTrainer
+
+REPORT_PATH = "app/ml/models/distillation_report.json"
+SOFT_LABELS_PATH = "app/ml/data/distill/soft_labels.npz"
+
+DEFAULT_BATCH_SIZE = 32
+# Teacher probabilities below this are dropped when expanding rows; they
+# carry almost no gradient but would multiply the training set size
+MIN_PROBABILITY = 0.01
+
+
+def _iter_text_file(path: str) -> Iterator[str]:
+    """One message per line, or JSONL records with a "text" field (optionally gzipped)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    is_jsonl = ".jsonl" in os.path.basename(path)
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)["text"] if is_jsonl else line
+
+
+def _iter_archive(root: str) -> Iterator[str]:
+    """User messages from the Parquet chat archive"""
+    import archive
+
+    for batch in archive.scan_messages(root, columns=["sender", "message"]):
+        for sender, message in zip(batch.column("sender").to_pylist(), batch.column("message").to_pylist()):
+            if sender == "user" and message:
+                yield message
+
+
+def collect_corpus(paths: Iterable[str] = (), archive_dir: Optional[str] = None,
+                   shards: bool = False, limit: Optional[int] = None) -> List[str]:
+    """Deduplicated texts from every source, in first-seen order"""
+    sources = [_iter_text_file(path) for path in paths]
+    if archive_dir:
+        sources.append(_iter_archive(archive_dir))
+    if shards:
+        # Shard labels are ignored: the teacher relabels everything
+        sources.append(record["text"] for split in dataset_shards.SPLITS
+                       for record in dataset_shards.iter_split(split=split))
+
+    seen = {}
+    for source in sources:
+        for text in source:
+            text = " ".join(text.split())
+            if text and text not in seen:
+                seen[text] = None
+                if limit and len(seen) >= limit:
+                    return list(seen)
+    return list(seen)
+
+
+def teacher_classes(teacher) -> List[str]:
+    """Lower-cased label names in the teacher's output order"""
+    id2label = teacher.model.config.id2label
+    return [id2label[i].lower() for i in sorted(id2label)]
+
+
+def label_with_teacher(teacher: Callable, texts: List[str], classes: List[str],
+                       batch_size: int = DEFAULT_BATCH_SIZE, progress_every: int = 10000) -> np.ndarray:
+    """Teacher probability matrix (len(texts) x len(classes)) from batched pipeline calls"""
+    column = {label: i for i, label in enumerate(classes)}
+    probabilities = np.zeros((len(texts), len(classes)), dtype=np.float32)
+    chunk = batch_size * 16
+    start = time.perf_counter()
+    for offset in range(0, len(texts), chunk):
+        outputs = teacher(texts[offset:offset + chunk], top_k=None, batch_size=batch_size, truncation=True)
+        for row, scores in enumerate(outputs, offset):
+            for score in scores:
+                probabilities[row, column[score["label"].lower()]] = score["score"]
+        done = min(offset + chunk, len(texts))
+        if done % progress_every < chunk or done == len(texts):
+            rate = done / (time.perf_counter() - start)
+            print(f"Labeled {done}/{len(texts)} texts ({rate:.0f} texts/sec)")
+    return probabilities
+
+
+def load_soft_labels(path: str, teacher_name: str, classes: List[str]) -> Dict[str, np.ndarray]:
+    """Cached text -> probability rows for this teacher, or empty if it changed"""
+    if not os.path.exists(path):
+        return {}
+    cached = np.load(path, allow_pickle=False)
+    if str(cached["teacher"]) != teacher_name or list(cached["classes"]) != classes:
+        return {}
+    return dict(zip(cached["texts"].tolist(), cached["probabilities"]))
+
+
+def save_soft_labels(path: str, teacher_name: str, classes: List[str], labels: Dict[str, np.ndarray]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    texts = list(labels)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp,
+        teacher=np.array(teacher_name),
+        classes=np.array(classes),
+        texts=np.array(texts),
+        probabilities=np.stack([labels[text] for text in texts]) if texts else np.zeros((0, len(classes))),
+    )
+    os.replace(tmp, path)
+
+
+def soften(probabilities: np.ndarray, temperature: float) -> np.ndarray:
+    """Equivalent to softmax(logits / T) given softmax(logits)"""
+    if temperature == 1.0:
+        return probabilities
+    scaled = np.power(np.clip(probabilities, 1e-12, 1.0), 1.0 / temperature)
+    return scaled / scaled.sum(axis=1, keepdims=True)
+
+
+def expand_soft_targets(X, probabilities: np.ndarray, classes: List[str],
+                        min_probability: float = MIN_PROBABILITY):
+    """One weighted row per (text, class) with enough teacher probability"""
+    rows, columns = np.nonzero(probabilities >= min_probability)
+    weights = probabilities[rows, columns]
+    return X[rows], np.asarray(classes)[columns], weights
+
+
+def build_student(max_features: int = 20000, C: float = 10.0) -> EmotionModelTrainer:
+    # No stop word list: "not", "no" and "never" flip emotions and the
+    # corpus is large enough for bigrams to pay off
+    vectorizer = TfidfVectorizer(max_features=max_features, ngram_range=(1, 2), sublinear_tf=True)
+    return EmotionModelTrainer(vectorizer=vectorizer, model=LogisticRegression(C=C, max_iter=1000))
+
+
+def train_student(student: EmotionModelTrainer, texts: List[str], probabilities: np.ndarray,
+                  classes: List[str], min_probability: float = MIN_PROBABILITY) -> Dict:
+    X = student.vectorizer.fit_transform(texts)
+    X_rows, y_rows, weights = expand_soft_targets(X, probabilities, classes, min_probability)
+    start = time.perf_counter()
+    student.model.fit(X_rows, y_rows, sample_weight=weights)
+    return {
+        "texts": len(texts),
+        "expanded_rows": int(X_rows.shape[0]),
+        "vocabulary": len(student.vectorizer.vocabulary_),
+        "fit_seconds": time.perf_counter() - start,
+    }
+
+
+def _fast_probabilities(trainer: EmotionModelTrainer, texts: List[str], classes: List[str]) -> np.ndarray:
+    """predict_batch probabilities reordered to the teacher's class columns"""
+    result = trainer.predict_batch(texts)
+    own = {str(label): i for i, label in enumerate(result["classes"])}
+    aligned = np.zeros((len(texts), len(classes)))
+    for column, label in enumerate(classes):
+        if label in own:
+            aligned[:, column] = result["probabilities"][:, own[label]]
+    return aligned
+
+
+def _agreement(predicted: np.ndarray, reference: np.ndarray) -> Optional[float]:
+    return float(np.mean(predicted == reference)) if len(reference) else None
+
+
+def evaluate_fast_model(trainer: EmotionModelTrainer, texts: List[str], teacher_probabilities: np.ndarray,
+                        classes: List[str], threshold: float) -> Dict:
+    """Agreement with the teacher overall and on the traffic the cascade would keep"""
+    probabilities = _fast_probabilities(trainer, texts, classes)
+    predicted = probabilities.argmax(axis=1)
+    teacher = teacher_probabilities.argmax(axis=1)
+    kept = probabilities.max(axis=1) >= threshold
+    # Mean per-text cross-entropy against the teacher's distribution
+    cross_entropy = -np.mean(np.sum(teacher_probabilities * np.log(np.clip(probabilities, 1e-12, 1.0)), axis=1))
+    return {
+        "teacher_agreement": _agreement(predicted, teacher),
+        "soft_cross_entropy": float(cross_entropy),
+        "cascade_coverage": float(kept.mean()),
+        "cascade_kept_agreement": _agreement(predicted[kept], teacher[kept]),
+        "cascade_system_agreement": _agreement(np.where(kept, predicted, teacher), teacher),
+    }
+
+
+def gold_accuracy(predict: Callable[[List[str]], List[str]], data: List[Dict]) -> Optional[float]:
+    """Accuracy on labeled examples whose emotion the predictor can output at all"""
+    return _agreement(np.asarray(predict([item["text"] for item in data])),
+                      np.asarray([item["emotion"] for item in data]))
+
+
+def _time_per_message(call: Callable, texts: List[str], repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call(texts)
+        best = min(best, time.perf_counter() - start)
+    return 1000 * best / len(texts)
+
+
+def measure_latency(teacher: Callable, student: EmotionModelTrainer, texts: List[str],
+                    batch_size: int, single_calls: int = 50) -> Dict:
+    """Milliseconds per message, one at a time (chat path) and batched"""
+    single = texts[:single_calls]
+    teacher(single[:4], top_k=1)  # warm up
+    latency = {
+        "teacher_single_ms": _time_per_message(lambda batch: [teacher(t, top_k=1) for t in batch], single, 1),
+        "teacher_batch_ms": _time_per_message(
+            lambda batch: teacher(batch, top_k=1, batch_size=batch_size, truncation=True), texts, 1),
+        "student_single_ms": _time_per_message(lambda batch: [student.predict_emotion(t) for t in batch], single),
+        "student_batch_ms": _time_per_message(student.predict_batch, texts),
+    }
+    latency["single_speedup"] = latency["teacher_single_ms"] / latency["student_single_ms"]
+    latency["batch_speedup"] = latency["teacher_batch_ms"] / latency["student_batch_ms"]
+    return latency
+
+
+def _load_baseline() -> Optional[EmotionModelTrainer]:
+    """The currently deployed fast model, as the cascade would load it"""
+    trainer = EmotionModelTrainer()
+    try:
+        trainer.load_bundle()
+    except FileNotFoundError:
+        try:
+            trainer.load_model()
+        except FileNotFoundError:
+            return None
+    return trainer
+
+
+def deploy_decision(student: Dict, baseline: Optional[Dict]) -> str:
+    """Why the student may replace the deployed fast model, or "" if it is worse on both metrics"""
+    if baseline is None:
+        return "no previous fast model"
+    for metric in ("teacher_agreement", "cascade_system_agreement"):
+        if student[metric] >= baseline[metric]:
+            return f"{metric} {student[metric]:.4f} >= {baseline[metric]:.4f}"
+    return ""
+
+
+def run_distillation(teacher: Callable, teacher_name: str, corpus: List[str],
+                     batch_size: int = DEFAULT_BATCH_SIZE, temperature: float = 1.0,
+                     threshold: float = 0.6, soft_labels_path: Optional[str] = SOFT_LABELS_PATH,
+                     report_path: Optional[str] = REPORT_PATH, save: bool = True,
+                     student: Optional[EmotionModelTrainer] = None, force: bool = False) -> Dict:
+    """
+    Label the corpus, train the student, compare it and optionally deploy it.
+    The student is only saved when it matches or beats the previous fast
+    model on teacher agreement or end-to-end cascade agreement, unless force.
+    """
+    classes = teacher_classes(teacher)
+    cached = load_soft_labels(soft_labels_path, teacher_name, classes) if soft_labels_path else {}
+    missing = [text for text in corpus if text not in cached]
+    print(f"{len(corpus)} texts, {len(corpus) - len(missing)} with cached soft labels")
+
+    label_seconds = 0.0
+    if missing:
+        start = time.perf_counter()
+        cached.update(zip(missing, label_with_teacher(teacher, missing, classes, batch_size)))
+        label_seconds = time.perf_counter() - start
+        if soft_labels_path:
+            save_soft_labels(soft_labels_path, teacher_name, classes, cached)
+
+    splits = {"train": [], "test": []}
+    for text in corpus:
+        splits[dataset_shards.split_for(text)].append(text)
+    if not splits["train"] or not splits["test"]:
+        raise ValueError(f"Corpus of {len(corpus)} texts is too small to hold out a test split")
+    train_probabilities = soften(np.stack([cached[text] for text in splits["train"]]), temperature)
+    test_probabilities = np.stack([cached[text] for text in splits["test"]]).astype(np.float64)
+
+    baseline = _load_baseline()
+    student = student or build_student()
+    print(f"Training student on {len(splits['train'])} texts...")
+    training = train_student(student, splits["train"], train_probabilities, classes)
+
+    gold = [item for item in EmotionDataset().iter_synthetic_dataset() if item["emotion"] in classes]
+
+    def teacher_labels(texts):
+        probabilities = label_with_teacher(teacher, texts, classes, batch_size, progress_every=len(texts) + 1)
+        return [classes[i] for i in probabilities.argmax(axis=1)]
+
+    def fast_labels(trainer):
+        return lambda texts: [classes[i] for i in _fast_probabilities(trainer, texts, classes).argmax(axis=1)]
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "teacher": teacher_name,
+        "classes": classes,
+        "temperature": temperature,
+        "cascade_threshold": threshold,
+        "corpus": {
+            "texts": len(corpus),
+            "train": len(splits["train"]),
+            "test": len(splits["test"]),
+            "newly_labeled": len(missing),
+            "label_seconds": label_seconds,
+        },
+        "training": training,
+        "student": evaluate_fast_model(student, splits["test"], test_probabilities, classes, threshold),
+        "baseline": (evaluate_fast_model(baseline, splits["test"], test_probabilities, classes, threshold)
+                     if baseline else None),
+        "gold_accuracy": {
+            "examples": len(gold),
+            "teacher": gold_accuracy(teacher_labels, gold),
+            "student": gold_accuracy(fast_labels(student), gold),
+            "baseline": gold_accuracy(fast_labels(baseline), gold) if baseline else None,
+        },
+        "latency": measure_latency(teacher, student, splits["test"][:1000], batch_size),
+    }
+
+    reason = deploy_decision(report["student"], report["baseline"])
+    report["deployed"] = bool(save and (reason or force))
+    report["deploy_reason"] = reason or ("forced" if force else "student is worse than the baseline")
+    if report["deployed"]:
+        student.save_model()
+        report["bundle"] = student.save_bundle()
+        print(f"Student bundle saved to {report['bundle']} ({report['deploy_reason']})")
+    elif save:
+        print(f"Keeping the deployed fast model: {report['deploy_reason']} "
+              "(rerun with --force to deploy anyway)")
+
+    if report_path:
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Distillation report saved to {report_path}")
+
+    return report
+
+
+def print_summary(report: Dict):
+    def fmt(value: Optional[float], spec: str) -> str:
+        return "n/a" if value is None else format(value, spec)
+
+    latency = report["latency"]
+    print(f"\n{'model':<9} {'agreement':>9} {'gold acc':>9} {'coverage':>9} {'ms/msg':>8}")
+    rows = [
+        ("teacher", {"teacher_agreement": 1.0, "cascade_coverage": 0.0}, latency["teacher_single_ms"]),
+        ("baseline", report["baseline"], None),
+        ("student", report["student"], latency["student_single_ms"]),
+    ]
+    for name, metrics, ms in rows:
+        if metrics is None:
+            continue
+        gold = report["gold_accuracy"][name]
+        print(f"{name:<9} {fmt(metrics['teacher_agreement'], '.4f'):>9} {fmt(gold, '.4f'):>9} "
+              f"{fmt(metrics['cascade_coverage'], '.1%'):>9} {fmt(ms, '.3f'):>8}")
+    student = report["student"]
+    print(f"\nStudent is {latency['single_speedup']:.0f}x faster per message "
+          f"({latency['batch_speedup']:.0f}x batched); at threshold {report['cascade_threshold']} "
+          f"it keeps {student['cascade_coverage']:.1%} of traffic with "
+          f"{fmt(student['cascade_kept_agreement'], '.4f')} agreement, "
+          f"{fmt(student['cascade_system_agreement'], '.4f')} end to end")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from autotune import load_tuning
+    from config import ARCHIVE_DIR, CASCADE_THRESHOLD, EMOTION_MODEL, TUNING_FILE
+    from model_registry import load_pipeline
+
+    parser = argparse.ArgumentParser(description="Distill the transformer emotion model into the fast model")
+    parser.add_argument("corpus", nargs="*",
+                        help="text files, one message per line, or .jsonl[.gz] files with a text field")
+    parser.add_argument("--archive", nargs="?", const=ARCHIVE_DIR,
+                        help=f"also read user messages from the chat archive (default {ARCHIVE_DIR})")
+    parser.add_argument("--shards", action="store_true", help="also read texts from the dataset shards")
+    parser.add_argument("--limit", type=int, help="stop after this many distinct texts")
+    parser.add_argument("--teacher", default=EMOTION_MODEL)
+    parser.add_argument("--batch-size", type=int, help="teacher batch size (default: tuned, else 32)")
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--threshold", type=float, default=CASCADE_THRESHOLD)
+    parser.add_argument("--soft-labels", default=SOFT_LABELS_PATH)
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--no-save", action="store_true", help="report only; keep the deployed fast model")
+    parser.add_argument("--force", action="store_true", help="deploy the student even if it is worse than the baseline")
+    args = parser.parse_args()
+
+    texts = collect_corpus(args.corpus, args.archive, args.shards, args.limit)
+    if not texts:
+        parser.error("no corpus: pass text files, --archive or --shards")
+
+    tuning = load_tuning(TUNING_FILE)
+    batch_size = args.batch_size or (tuning["batch_size"] if tuning else DEFAULT_BATCH_SIZE)
+    report = run_distillation(
+        load_pipeline(args.teacher), args.teacher, texts,
+        batch_size=batch_size, temperature=args.temperature, threshold=args.threshold,
+        soft_labels_path=args.soft_labels, report_path=args.report, save=not args.no_save,
+        force=args.force,
+    )
+    print_summary(report)
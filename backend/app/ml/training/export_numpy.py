@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Export the trained emotion model to flat NumPy arrays
+
+The export is a single .npz file read by app/ml/inference/numpy_predictor.py,
+so serving workers can classify without importing scikit-learn or pandas.
+Tree ensembles are flattened into one node table with per-tree root offsets;
+multinomial linear models are stored as coef/intercept.
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from app.ml.inference.numpy_predictor import EXPORT_FORMAT, EXPORT_PATH, NumpyEmotionPredictor
+from app.ml.training.train_emotion_model import (
+    DEFAULT_SEVERITY, HELP_SEVERITY_THRESHOLD, SEVERITY_MAP,
+    EmotionDataset, EmotionModelTrainer
+)
+
+
+def _export_vectorizer(vectorizer) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    if vectorizer.analyzer != "word" or vectorizer.tokenizer or vectorizer.preprocessor:
+        raise ValueError("Only the default word analyzer can be exported")
+    if vectorizer.strip_accents:
+        raise ValueError("strip_accents is not supported by the NumPy predictor")
+
+    vocabulary = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for term, index in vectorizer.vocabulary_.items():
+        vocabulary[index] = term
+
+    stop_words = vectorizer.get_stop_words()
+    config = {
+        "lowercase": vectorizer.lowercase,
+        "token_pattern": vectorizer.token_pattern,
+        "stop_words": sorted(stop_words) if stop_words else None,
+        "ngram_range": list(vectorizer.ngram_range),
+        "binary": vectorizer.binary,
+        "sublinear_tf": vectorizer.sublinear_tf,
+        "norm": vectorizer.norm,
+    }
+    arrays = {
+        "vocabulary": vocabulary.astype(str),
+        "idf": np.ascontiguousarray(vectorizer.idf_, dtype=np.float64),
+    }
+    return config, arrays
+
+
+def _export_forest(model) -> Dict[str, np.ndarray]:
+    estimators = [model] if isinstance(model, DecisionTreeClassifier) else model.estimators_
+    n_classes = len(model.classes_)
+
+    roots, children_left, children_right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        roots.append(offset)
+        # Offset child indices into the shared node table; -1 marks a leaf
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        children_left.append(np.where(left == -1, -1, left + offset))
+        children_right.append(np.where(right == -1, -1, right + offset))
+        feature.append(tree.feature.astype(np.int64))
+        threshold.append(tree.threshold.astype(np.float64))
+
+        # Same normalization DecisionTreeClassifier.predict_proba applies per leaf
+        proba = tree.value[:, 0, :n_classes].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        value.append(proba)
+        offset += tree.node_count
+
+    return {
+        "roots": np.array(roots, dtype=np.int64),
+        "children_left": np.concatenate(children_left),
+        "children_right": np.concatenate(children_right),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "value": np.concatenate(value),
+    }
+
+
+def _export_linear(model) -> Dict[str, np.ndarray]:
+    if len(model.classes_) <= 2 or model.solver == "liblinear" or getattr(model, "multi_class", "auto") == "ovr":
+        raise ValueError("Only multinomial logistic regression can be exported")
+    return {
+        "coef": np.ascontiguousarray(model.coef_, dtype=np.float64),
+        "intercept": np.ascontiguousarray(model.intercept_, dtype=np.float64),
+    }
+
+
+def export_numpy(trainer: EmotionModelTrainer, path: str = EXPORT_PATH) -> str:
+    """Write the trainer's vectorizer and model as flat arrays to an .npz file"""
+    model = trainer.model
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier)):
+        kind, model_arrays = "forest", _export_forest(model)
+    elif isinstance(model, LogisticRegression):
+        kind, model_arrays = "linear", _export_linear(model)
+    else:
+        raise ValueError(f"Cannot export {type(model).__name__} to NumPy")
+
+    vectorizer_config, vectorizer_arrays = _export_vectorizer(trainer.vectorizer)
+    meta = {
+        "format": EXPORT_FORMAT,
+        "model_kind": kind,
+        "model_type": type(model).__name__,
+        "vectorizer": vectorizer_config,
+        "severity_map": SEVERITY_MAP,
+        "default_severity": DEFAULT_SEVERITY,
+        "help_threshold": HELP_SEVERITY_THRESHOLD,
+    }
+
+    # Uncompressed and pickle-free: np.load(allow_pickle=False) can read it
+    np.savez(
+        path,
+        meta=np.array(json.dumps(meta)),
+        classes=np.asarray(model.classes_).astype(str),
+        **vectorizer_arrays,
+        **model_arrays,
+    )
+    print(f"NumPy export saved to {path}")
+    return path
+
+
+def verify_export(trainer: EmotionModelTrainer, predictor: NumpyEmotionPredictor, texts: List[str]) -> int:
+    """Count texts where the NumPy predictor differs from predict_emotion in any field"""
+    mismatches = 0
+    for text in texts:
+        expected = trainer.predict_emotion(text)
+        actual = predictor.predict_emotion(text)
+        same = (
+            expected["emotion"] == actual["emotion"]
+            and expected["confidence"] == actual["confidence"]
+            and expected["severity"] == actual["severity"]
+            and expected["needs_help"] == actual["needs_help"]
+            and expected["probabilities"] == actual["probabilities"]
+        )
+        if not same:
+            mismatches += 1
+            print(f"Mismatch for {text!r}: {expected['emotion']} vs {actual['emotion']}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    trainer = EmotionModelTrainer()
+    trainer.load_model()
+    export_numpy(trainer)
+
+    predictor = NumpyEmotionPredictor()
+    corpus = [item["text"] for item in EmotionDataset().create_synthetic_dataset()]
+    corpus += [
+        "I am so happy today!",
+        "I feel really sad and hopeless",
+        "I am angry about this situation",
+        "I am scared about the future",
+        "Completely unrelated words like zebra and quantum",
+        "",
+    ]
+    mismatches = verify_export(trainer, predictor, corpus)
+    print(f"Verified {len(corpus)} texts, {mismatches} mismatches")
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned, memory-mappable artifact bundle for the emotion model
+
+A bundle is one directory holding everything needed to serve the model:
+
+    manifest.json      format/model version, library versions, classes, checksums
+    vocabulary.json    TF-IDF term -> column index
+    idf.npy            TF-IDF idf weights (loaded with mmap_mode)
+    model.joblib       classifier, stored uncompressed so its arrays can be mmapped
+
+Bundles are immutable once written: each save builds a fresh directory
+under a temporary name and renames it into place, so a running server that
+has a version memory-mapped never sees its files change.
+
+Loading with mmap_mode="r" maps the numpy arrays straight from the page cache,
+so forked workers share the same physical pages instead of each holding a copy.
+Plain array attributes (idf, linear coef_/intercept_) stay mapped; scikit-learn
+copies tree nodes into its own buffers on unpickle, so forest internals are
+still per-process.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Bump the major version whenever the on-disk layout changes incompatibly
+FORMAT_VERSION = "1.0"
+BUNDLE_ROOT = "app/ml/models/emotion_bundle"
+LATEST_FILE = "LATEST"
+
+MANIFEST_FILE = "manifest.json"
+VOCABULARY_FILE = "vocabulary.json"
+IDF_FILE = "idf.npy"
+MODEL_FILE = "model.joblib"
+
+# Vectorizer settings that affect transform() and must round-trip
+VECTORIZER_PARAMS = [
+    "lowercase", "strip_accents", "stop_words", "token_pattern", "ngram_range", "analyzer",
+    "max_features", "norm", "use_idf", "smooth_idf", "sublinear_tf", "binary",
+    "dtype",
+]
+
+
+class IncompatibleBundleError(ValueError):
+    """Raised when a bundle cannot be loaded by this version of the code"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _major(version: str) -> str:
+    return version.split(".")[0]
+
+
+def _minor(version: str) -> str:
+    return ".".join(version.split(".")[:2])
+
+
+def _vectorizer_params(vectorizer: TfidfVectorizer) -> Dict:
+    params = vectorizer.get_params()
+    saved = {}
+    for name in VECTORIZER_PARAMS:
+        value = params[name]
+        if name == "dtype":
+            value = np.dtype(value).name
+        elif isinstance(value, (tuple, frozenset, set)):
+            value = list(value)
+        saved[name] = value
+    return saved
+
+
+def _restore_vectorizer(params: Dict, vocabulary: Dict[str, int], idf: np.ndarray) -> TfidfVectorizer:
+    params = dict(params)
+    params["ngram_range"] = tuple(params["ngram_range"])
+    if isinstance(params["stop_words"], list):
+        params["stop_words"] = frozenset(params["stop_words"])
+    params["dtype"] = np.dtype(params["dtype"]).type
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def _write_bundle(model, vectorizer: TfidfVectorizer, path: str, version: str):
+    """Write every bundle file into the (not yet published) directory path"""
+    vocabulary = {term: int(index) for term, index in vectorizer.vocabulary_.items()}
+    with open(os.path.join(path, VOCABULARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(vocabulary, f, separators=(",", ":"), sort_keys=True)
+    np.save(os.path.join(path, IDF_FILE), np.ascontiguousarray(vectorizer.idf_))
+    # No compression: compressed joblib files cannot be memory-mapped
+    joblib.dump(model, os.path.join(path, MODEL_FILE), compress=0)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_version": version,
+        "created_at": datetime.now().isoformat(),
+        "model_type": type(model).__name__,
+        "classes": [str(label) for label in model.classes_],
+        "sklearn_version": sklearn.__version__,
+        "numpy_version": np.__version__,
+        "vectorizer": _vectorizer_params(vectorizer),
+        "files": {
+            name: _sha256(os.path.join(path, name))
+            for name in (VOCABULARY_FILE, IDF_FILE, MODEL_FILE)
+        },
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def save_bundle(model, vectorizer: TfidfVectorizer, root: str = BUNDLE_ROOT,
+                version: Optional[str] = None) -> str:
+    """
+    Write a new bundle version under root and point LATEST at it. The
+    default version is a timestamp plus a random suffix, so saves in the
+    same second never collide; an existing version raises FileExistsError.
+    """
+    version = version or f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    final_path = os.path.join(root, version)
+    if os.path.exists(final_path):
+        raise FileExistsError(f"Bundle version {version} already exists in {root}")
+    # Hidden build directory, renamed into place only once complete
+    path = os.path.join(root, f".{version}.tmp-{uuid.uuid4().hex[:8]}")
+    os.makedirs(path)
+    try:
+        _write_bundle(model, vectorizer, path, version)
+        os.replace(path, final_path)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    latest_tmp = os.path.join(root, f".{LATEST_FILE}.tmp-{uuid.uuid4().hex[:8]}")
+    with open(latest_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(root, LATEST_FILE))
+
+    print(f"Model bundle {version} saved to {final_path}")
+    return final_path
+
+
+def resolve_bundle(root: str = BUNDLE_ROOT, version: Optional[str] = None) -> str:
+    """Return the directory of the requested (or latest) bundle version"""
+    if version is None:
+        with open(os.path.join(root, LATEST_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    return os.path.join(root, version)
+
+
+def check_compatibility(manifest: Dict):
+    """Refuse incompatible layouts; warn when library versions drifted"""
+    bundle_format = manifest.get("format_version", "0")
+    if _major(bundle_format) != _major(FORMAT_VERSION):
+        raise IncompatibleBundleError(
+            f"Bundle format {bundle_format} is not compatible with {FORMAT_VERSION}"
+        )
+    if _minor(manifest.get("sklearn_version", "")) != _minor(sklearn.__version__):
+        print(f"⚠️  Bundle was built with scikit-learn {manifest.get('sklearn_version')}, "
+              f"running {sklearn.__version__}")
+
+
+def verify_checksums(path: str, manifest: Dict):
+    for name, expected in manifest["files"].items():
+        actual = _sha256(os.path.join(path, name))
+        if actual != expected:
+            raise IncompatibleBundleError(f"Checksum mismatch for {name} in {path}")
+
+
+def load_bundle(root: str = BUNDLE_ROOT, version: Optional[str] = None,
+                mmap_mode: Optional[str] = "r", verify: bool = True) -> Tuple[object, TfidfVectorizer, Dict]:
+    """Load (model, vectorizer, manifest) from a bundle, memory-mapping arrays
+
+    The manifest gets a "load_seconds" entry with the wall time of the load.
+    """
+    start = time.perf_counter()
+    path = resolve_bundle(root, version)
+
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    check_compatibility(manifest)
+    if verify:
+        verify_checksums(path, manifest)
+
+    with open(os.path.join(path, VOCABULARY_FILE), "r", encoding="utf-8") as f:
+        vocabulary = json.load(f)
+    idf = np.load(os.path.join(path, IDF_FILE), mmap_mode=mmap_mode)
+    model = joblib.load(os.path.join(path, MODEL_FILE), mmap_mode=mmap_mode)
+    vectorizer = _restore_vectorizer(manifest["vectorizer"], vocabulary, idf)
+
+    manifest["load_seconds"] = time.perf_counter() - start
+    print(f"Model bundle {manifest['model_version']} loaded in {manifest['load_seconds'] * 1000:.1f} ms")
+    return model, vectorizer, manifest
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-validated model selection for the emotion classifier
+
+Searches vectorizer and model configurations with GridSearchCV across all
+cores, then refits each candidate on the full data to measure inference
+latency and serialized size. The report is written as JSON so the
+accuracy/latency tradeoff can be compared across runs.
+"""
+
+import json
+import os
+import pickle
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.naive_bayes import ComplementNB
+from sklearn.pipeline import Pipeline
+
+from app.ml.training import dataset_shards
+from app.ml.training.train_emotion_model import EmotionDataset
+
+REPORT_PATH = "app/ml/models/model_selection_report.json"
+
+VECTORIZER_GRID = {
+    "vectorizer__max_features": [1000, 5000],
+    "vectorizer__ngram_range": [(1, 1), (1, 2)],
+    "vectorizer__sublinear_tf": [False, True],
+}
+
+# Every model must support predict_proba: the cascade and predict_batch rely on it
+MODEL_GRIDS = [
+    {"model": [RandomForestClassifier(random_state=42)], "model__n_estimators": [50, 100, 200]},
+    {"model": [LogisticRegression(max_iter=1000)], "model__C": [1.0, 10.0]},
+    {"model": [ComplementNB()], "model__alpha": [0.1, 1.0]},
+]
+
+
+def build_search_space() -> List[Dict]:
+    return [{**VECTORIZER_GRID, **grid} for grid in MODEL_GRIDS]
+
+
+def _describe(params: Dict) -> Dict:
+    """JSON-friendly copy of a candidate's parameters"""
+    described = {}
+    for name, value in params.items():
+        if name == "model":
+            described[name] = type(value).__name__
+        elif isinstance(value, tuple):
+            described[name] = list(value)
+        else:
+            described[name] = value
+    return described
+
+
+def measure_inference(pipeline: Pipeline, texts: List[str], batch_size: int = 1000,
+                      single_calls: int = 100, repeats: int = 3) -> Dict:
+    """Latency per 1k messages in one batch, and per single-message call"""
+    batch = (texts * (batch_size // max(len(texts), 1) + 1))[:batch_size]
+
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pipeline.predict_proba(batch)
+        batch_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for text in batch[:single_calls]:
+        pipeline.predict_proba([text])
+    single_seconds = (time.perf_counter() - start) / single_calls
+
+    return {
+        "latency_ms_per_1k": 1000 * min(batch_times) * 1000 / batch_size,
+        "single_message_ms": 1000 * single_seconds,
+    }
+
+
+def _mark_pareto(candidates: List[Dict]):
+    """Flag candidates no other candidate beats on both accuracy and latency"""
+    for candidate in candidates:
+        candidate["pareto_optimal"] = not any(
+            other["cv_accuracy_mean"] >= candidate["cv_accuracy_mean"]
+            and other["latency_ms_per_1k"] <= candidate["latency_ms_per_1k"]
+            and (other["cv_accuracy_mean"] > candidate["cv_accuracy_mean"]
+                 or other["latency_ms_per_1k"] < candidate["latency_ms_per_1k"])
+            for other in candidates
+        )
+
+
+def run_model_selection(data: List[Dict], folds: int = 5, n_jobs: int = -1,
+                        report_path: Optional[str] = REPORT_PATH) -> Dict:
+    """Search the configuration grid and write a machine-readable report"""
+    texts = [item["text"] for item in data]
+    labels = [item["emotion"] for item in data]
+
+    base = Pipeline([
+        ("vectorizer", TfidfVectorizer(stop_words="english")),
+        ("model", RandomForestClassifier(random_state=42)),
+    ])
+    search = GridSearchCV(
+        base,
+        build_search_space(),
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=42),
+        scoring="accuracy",
+        n_jobs=n_jobs,
+        refit=False,
+    )
+    print(f"Searching {len(search.param_grid)} grids on {len(texts)} examples with {folds}-fold CV...")
+    start = time.perf_counter()
+    search.fit(texts, labels)
+    search_seconds = time.perf_counter() - start
+
+    # Latency is measured sequentially so candidates do not compete for cores
+    results = search.cv_results_
+    candidates = []
+    for i, params in enumerate(results["params"]):
+        pipeline = clone(base).set_params(**params)
+        pipeline.fit(texts, labels)
+        candidate = {
+            "params": _describe(params),
+            "cv_accuracy_mean": float(results["mean_test_score"][i]),
+            "cv_accuracy_std": float(results["std_test_score"][i]),
+            "fit_seconds": float(results["mean_fit_time"][i]),
+            "model_size_bytes": len(pickle.dumps(pipeline, protocol=pickle.HIGHEST_PROTOCOL)),
+        }
+        candidate.update(measure_inference(pipeline, texts))
+        candidates.append(candidate)
+
+    _mark_pareto(candidates)
+    candidates.sort(key=lambda c: (-c["cv_accuracy_mean"], c["latency_ms_per_1k"]))
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "examples": len(texts),
+        "folds": folds,
+        "search_seconds": search_seconds,
+        "best_accuracy": candidates[0],
+        "fastest_pareto": min(
+            (c for c in candidates if c["pareto_optimal"]), key=lambda c: c["latency_ms_per_1k"]
+        ),
+        "candidates": candidates,
+    }
+
+    if report_path:
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Model selection report saved to {report_path}")
+
+    return report
+
+
+def print_summary(report: Dict):
+    print(f"\n{'accuracy':>9} {'ms/1k':>8} {'size KB':>8}  configuration")
+    for candidate in report["candidates"]:
+        if not candidate["pareto_optimal"]:
+            continue
+        params = candidate["params"]
+        config = ", ".join(f"{k.split('__')[-1]}={v}" for k, v in params.items() if k != "model")
+        print(f"{candidate['cv_accuracy_mean']:>9.4f} {candidate['latency_ms_per_1k']:>8.1f} "
+              f"{candidate['model_size_bytes'] / 1024:>8.0f}  {params['model']}({config})")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cross-validated emotion model selection")
+    parser.add_argument("--shards", action="store_true", help="read the train split from dataset shards")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel CV workers (-1 = all cores)")
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.shards:
+        data = dataset_shards.load_split(split="train")
+    else:
+        data = EmotionDataset().create_synthetic_dataset()
+
+    report = run_model_selection(data, folds=args.folds, n_jobs=args.jobs, report_path=args.report)
+    print_summary(report)
@@ -9,9 +9,29 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
 import os
-from typing import List, Dict
+import time
+from typing import List, Dict, Iterable, Iterator
 import json
 
+try:
+    from app.ml.training import dataset_shards, model_bundle
+except ImportError:  # running this file directly as a script
+    import dataset_shards
+    import model_bundle
+
+# Map emotions to severity
+SEVERITY_MAP = {
+    "joy": 2,
+    "neutral": 4,
+    "surprise": 5,
+    "fear": 6,
+    "anger": 7,
+    "sadness": 8,
+    "disgust": 6
+}
+DEFAULT_SEVERITY = 4
+HELP_SEVERITY_THRESHOLD = 6
+
 class EmotionDataset:
     def __init__(self):
         self.emotions = ["joy", "sadness", "anger", "fear", "surprise", "disgust", "neutral"]
@@ -19,6 +39,11 @@ class EmotionDataset:
     
     def create_synthetic_dataset(self):
         """Create synthetic emotion dataset for training"""
+        self.data.extend(self.iter_synthetic_dataset())
+        return self.data
+    
+    def iter_synthetic_dataset(self) -> Iterator[Dict]:
+        """Yield synthetic examples one at a time instead of building a list"""
         synthetic_data = [
             # Joy
             {"text": "I am so happy today!", "emotion": "joy"},
@@ -93,7 +118,7 @@ class EmotionDataset:
         
         # Add more variations
         for item in synthetic_data:
-            self.data.append(item)
+            yield item
             # Add variations
             variations = [
                 item["text"].lower(),
@@ -106,9 +131,7 @@ class EmotionDataset:
                 "It seems like " + item["text"]
             ]
             for variation in variations:
-                self.data.append({"text": variation, "emotion": item["emotion"]})
-        
-        return self.data
+                yield {"text": variation, "emotion": item["emotion"]}
     
     def save_dataset(self, filename: str = "emotion_dataset.json"):
         """Save dataset to file"""
@@ -121,11 +144,27 @@ class EmotionDataset:
         with open(f"app/ml/data/{filename}", "r", encoding='utf-8') as f:
             self.data = json.load(f)
         return self.data
+    
+    def save_shards(self, records: Iterable[Dict] = None, output_dir: str = dataset_shards.SHARD_DIR,
+                    shard_size: int = 10000, test_fraction: float = 0.2, seed: int = 42) -> Dict:
+        """Stream records (synthetic by default) into compressed train/test shards"""
+        if records is None:
+            records = self.iter_synthetic_dataset()
+        return dataset_shards.write_shards(
+            records, output_dir, shard_size=shard_size, test_fraction=test_fraction, seed=seed
+        )
+    
+    def load_shards(self, output_dir: str = dataset_shards.SHARD_DIR, split: str = "train",
+                    workers: int = None) -> List[Dict]:
+        """Load one split from shards, reading shards in parallel"""
+        self.data = dataset_shards.load_split(output_dir, split, workers=workers)
+        return self.data
 
 class EmotionModelTrainer:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words="english")
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+    def __init__(self, vectorizer: TfidfVectorizer = None, model=None):
+        # Defaults can be overridden with a configuration picked by model_selection
+        self.vectorizer = vectorizer if vectorizer is not None else TfidfVectorizer(max_features=1000, stop_words="english")
+        self.model = model if model is not None else RandomForestClassifier(n_estimators=100, random_state=42)
         self.model_path = "app/ml/models/emotion_classifier.pkl"
         self.vectorizer_path = "app/ml/models/vectorizer.pkl"
     
@@ -150,7 +189,23 @@ class EmotionModelTrainer:
         # Train model
         self.model.fit(X_train, y_train)
         
-        # Evaluate
+        return self.evaluate(X_test, y_test)
+    
+    def train_from_shards(self, output_dir: str = dataset_shards.SHARD_DIR, workers: int = None):
+        """Train on the train shards and evaluate on the test shards"""
+        train = dataset_shards.load_split(output_dir, "train", workers=workers)
+        test = dataset_shards.load_split(output_dir, "test", workers=workers)
+        
+        X_train, y_train = self.prepare_data(train)
+        X_test = self.vectorizer.transform([item["text"] for item in test])
+        y_test = [item["emotion"] for item in test]
+        
+        self.model.fit(X_train, y_train)
+        
+        return self.evaluate(X_test, y_test)
+    
+    def evaluate(self, X_test, y_test):
+        """Print accuracy and a classification report on held-out data"""
         y_pred = self.model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
         
@@ -174,6 +229,17 @@ class EmotionModelTrainer:
         self.vectorizer = joblib.load(self.vectorizer_path)
         print("Model and vectorizer loaded successfully")
     
+    def save_bundle(self, version: str = None) -> str:
+        """Save model and vectorizer as one versioned, memory-mappable bundle"""
+        return model_bundle.save_bundle(self.model, self.vectorizer, version=version)
+    
+    def load_bundle(self, version: str = None, mmap_mode: str = "r") -> Dict:
+        """Load model and vectorizer from a bundle, sharing arrays across workers"""
+        self.model, self.vectorizer, manifest = model_bundle.load_bundle(
+            version=version, mmap_mode=mmap_mode
+        )
+        return manifest
+    
     def predict_emotion(self, text: str) -> Dict:
         """Predict emotion for given text"""
         # Vectorize text
@@ -184,19 +250,8 @@ class EmotionModelTrainer:
         probabilities = self.model.predict_proba(X)[0]
         confidence = max(probabilities)
         
-        # Map emotions to severity
-        severity_map = {
-            "joy": 2,
-            "neutral": 4,
-            "surprise": 5,
-            "fear": 6,
-            "anger": 7,
-            "sadness": 8,
-            "disgust": 6
-        }
-        
-        severity = severity_map.get(emotion, 4)
-        needs_help = severity >= 6
+        severity = SEVERITY_MAP.get(emotion, DEFAULT_SEVERITY)
+        needs_help = severity >= HELP_SEVERITY_THRESHOLD
         
         return {
             "emotion": emotion,
@@ -205,26 +260,110 @@ class EmotionModelTrainer:
             "needs_help": needs_help,
             "probabilities": dict(zip(self.model.classes_, probabilities))
         }
+    
+    def predict_batch(self, texts: Iterable[str]) -> Dict:
+        """Predict emotions for many texts in one vectorized pass
+        
+        Returns columnar results: one NumPy array per field, aligned with
+        the input order, plus the probability matrix and its class labels.
+        """
+        texts = list(texts)
+        classes = self.model.classes_
+        if not texts:
+            return {
+                "emotion": np.empty(0, dtype=classes.dtype),
+                "confidence": np.empty(0, dtype=np.float64),
+                "severity": np.empty(0, dtype=np.int64),
+                "needs_help": np.empty(0, dtype=bool),
+                "probabilities": np.empty((0, len(classes)), dtype=np.float64),
+                "classes": classes
+            }
+        
+        # One sparse matrix and a single predict_proba for the whole batch
+        X = self.vectorizer.transform(texts)
+        probabilities = self.model.predict_proba(X)
+        
+        # predict() is argmax over predict_proba, so derive labels from it
+        best = probabilities.argmax(axis=1)
+        class_severity = np.array(
+            [SEVERITY_MAP.get(label, DEFAULT_SEVERITY) for label in classes],
+            dtype=np.int64
+        )
+        severity = class_severity[best]
+        
+        return {
+            "emotion": classes[best],
+            "confidence": probabilities[np.arange(len(texts)), best],
+            "severity": severity,
+            "needs_help": severity >= HELP_SEVERITY_THRESHOLD,
+            "probabilities": probabilities,
+            "classes": classes
+        }
 
-def train_emotion_model():
+def benchmark_batch_prediction(trainer: EmotionModelTrainer, texts: List[str], repeats: int = 3) -> Dict:
+    """Compare predict_batch throughput against the per-item predict_emotion loop"""
+    loop_times = []
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            trainer.predict_emotion(text)
+        loop_times.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        trainer.predict_batch(texts)
+        batch_times.append(time.perf_counter() - start)
+    
+    loop_best = min(loop_times)
+    batch_best = min(batch_times)
+    results = {
+        "messages": len(texts),
+        "loop_seconds": loop_best,
+        "batch_seconds": batch_best,
+        "loop_msgs_per_sec": len(texts) / loop_best if loop_best else float("inf"),
+        "batch_msgs_per_sec": len(texts) / batch_best if batch_best else float("inf"),
+        "speedup": loop_best / batch_best if batch_best else float("inf")
+    }
+    
+    print(f"Per-item loop: {results['loop_msgs_per_sec']:.1f} msgs/sec")
+    print(f"Batch predict: {results['batch_msgs_per_sec']:.1f} msgs/sec")
+    print(f"Speedup: {results['speedup']:.1f}x")
+    
+    return results
+
+def train_emotion_model(use_shards: bool = False):
     """Main function to train the emotion model"""
     print("Creating emotion dataset...")
     dataset = EmotionDataset()
-    data = dataset.create_synthetic_dataset()
-    dataset.save_dataset()
-    
-    print("Training emotion classification model...")
     trainer = EmotionModelTrainer()
-    X, y = trainer.prepare_data(data)
-    accuracy = trainer.train_model(X, y)
+    if use_shards:
+        dataset.save_shards()
+        
+        print("Training emotion classification model...")
+        accuracy = trainer.train_from_shards()
+    else:
+        data = dataset.create_synthetic_dataset()
+        dataset.save_dataset()
+        
+        print("Training emotion classification model...")
+        X, y = trainer.prepare_data(data)
+        accuracy = trainer.train_model(X, y)
     
     trainer.save_model()
+    trainer.save_bundle()
     print(f"Training completed with accuracy: {accuracy:.4f}")
     
     return trainer
 
 if __name__ == "__main__":
-    trainer = train_emotion_model()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the FeelMate emotion model")
+    parser.add_argument("--shards", action="store_true",
+                        help="stream the dataset into compressed shards and train from them")
+    args = parser.parse_args()
+    
+    trainer = train_emotion_model(use_shards=args.shards)
     
     # Test the model
     test_texts = [
@@ -243,3 +382,6 @@ if __name__ == "__main__":
         print(f"Predicted Emotion: {result['emotion']} (confidence: {result['confidence']:.3f})")
         print(f"Severity: {result['severity']}, Needs Help: {result['needs_help']}")
         print("---")
+    
+    print("\nBenchmarking batch prediction:")
+    benchmark_batch_prediction(trainer, [item["text"] for item in EmotionDataset().create_synthetic_dataset()])
@@ -0,0 +1,282 @@
+"""
+Compressed archival tier for expired chat history
+
+Before retention removes data from Postgres, the expiring rows are streamed
+out through a server-side cursor into Parquet files compressed with zstd,
+one directory per day (hive layout, so readers can prune by day):
+
+    data/archive/messages/day=2026-10-16/chat_messages_20261016.parquet
+    data/archive/sessions/day=2026-10-16/sessions.parquet
+
+Message rows are sorted by emotion and then timestamp, so row-group min/max
+statistics let a reader skip row groups that cannot match an emotion
+filter. scan_messages() and scan_sessions() read lazily, in record batches,
+and push the emotion and date predicates down to the Parquet scan.
+Both writers key their files by day only, so re-running one after a failed
+cleanup leaves no duplicate rows behind: a message partition is rewritten
+whole, and new sessions are merged into the day's file by session id.
+"""
+
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from partitions import partition_name
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_ROWS = 5000
+# Rows per Parquet row group; the unit of predicate pushdown
+ROW_GROUP_ROWS = 50000
+COMPRESSION = "zstd"
+
+MESSAGE_SCHEMA = pa.schema([
+    ("message_id", pa.int64()),
+    ("session_id", pa.string()),
+    ("user_id", pa.string()),
+    ("sender", pa.string()),
+    ("message", pa.string()),
+    ("emotion", pa.string()),
+    ("severity", pa.string()),
+    ("confidence", pa.float64()),
+    ("timestamp", pa.timestamp("us")),
+])
+
+SESSION_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("session_id", pa.string()),
+    ("user_id", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    ("last_activity", pa.timestamp("us")),
+    ("current_emotion", pa.string()),
+    ("severity_level", pa.string()),
+    ("conversation_context", pa.string()),
+])
+
+DAY_PARTITIONING = ds.partitioning(pa.schema([("day", pa.date32())]), flavor="hive")
+
+logger = logging.getLogger(__name__)
+
+
+def _day_dir(root: Path, dataset: str, day: date) -> Path:
+    path = Path(root) / dataset / f"day={day.isoformat()}"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _rows_to_batch(rows: List[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _write_stream(cursor, path: Path, schema: pa.Schema) -> int:
+    """Drain a server-side cursor into path; written under a hidden name, then renamed"""
+    # Files starting with "." are ignored by dataset discovery
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    rows_written = 0
+    writer = None
+    # Each write is flushed as its own row group, so buffer fetches up to ROW_GROUP_ROWS
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if rows:
+                pending.append(_rows_to_batch(rows, schema))
+                pending_rows += len(rows)
+                rows_written += len(rows)
+            if pending and (not rows or pending_rows >= ROW_GROUP_ROWS):
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, schema, compression=COMPRESSION)
+                writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=ROW_GROUP_ROWS)
+                pending = []
+                pending_rows = 0
+            if not rows:
+                break
+    finally:
+        if writer is not None:
+            writer.close()
+    if rows_written:
+        os.replace(tmp_path, path)
+    return rows_written
+
+
+def archive_partition(conn, day: date, root) -> int:
+    """
+    Stream the chat_messages partition for day into the archive; returns rows
+    written. Runs before the partition is detached, in a transaction that
+    takes no DDL locks; the caller commits it.
+    """
+    name = partition_name(day)
+    cursor = conn.cursor(name=f"archive_{name}")
+    cursor.itersize = FETCH_ROWS
+    try:
+        cursor.execute(f"""
+            SELECT m.id, s.session_id, s.user_id, m.sender, m.message,
+                   m.emotion, m.severity, m.confidence, m.timestamp
+            FROM "{name}" m
+            JOIN chat_sessions s ON s.id = m.session_pk
+            ORDER BY m.emotion, m.timestamp
+        """)
+        path = _day_dir(root, "messages", day) / f"{name}.parquet"
+        rows = _write_stream(cursor, path, MESSAGE_SCHEMA)
+    finally:
+        cursor.close()
+    logger.info("Archived %d messages from %s", rows, name)
+    return rows
+
+
+def _merge_sessions(day_dir: Path, new: pa.Table) -> int:
+    """
+    Replace the day's sessions.parquet with its rows plus new, one row per
+    id (new wins); returns rows in the file. Older per-batch files in the
+    directory are folded in and removed.
+    """
+    path = day_dir / "sessions.parquet"
+    existing = [pq.ParquetFile(f).read().select(SESSION_SCHEMA.names).cast(SESSION_SCHEMA)
+                for f in sorted(day_dir.glob("*.parquet"))]
+    merged = pa.concat_tables(existing + [new])
+    # Last occurrence of each id wins, so a retried row replaces its first copy
+    ids = merged["id"].to_pylist()
+    last = {session_id: i for i, session_id in enumerate(ids)}
+    merged = merged.take(sorted(last.values())).sort_by("id")
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    pq.write_table(merged, tmp_path, compression=COMPRESSION, row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp_path, path)
+    for stale in day_dir.glob("*.parquet"):
+        if stale != path:
+            stale.unlink()
+    return merged.num_rows
+
+
+def archive_sessions(conn, cutoff: datetime, root) -> int:
+    """
+    Archive the inactive sessions that cleanup is about to delete (the same
+    predicate: inactive and last_activity < cutoff); returns rows archived.
+    Each day has one file, merged by session id, so retries never duplicate.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT DISTINCT last_activity::date
+        FROM chat_sessions
+        WHERE is_active = FALSE AND last_activity < %s
+    """, (cutoff,))
+    days = [day for (day,) in cursor.fetchall()]
+    cursor.close()
+    total = 0
+    for day in sorted(days):
+        stream = conn.cursor(name="archive_sessions")
+        stream.itersize = FETCH_ROWS
+        try:
+            stream.execute("""
+                SELECT id, session_id, user_id, created_at, last_activity,
+                       current_emotion, severity_level, conversation_context
+                FROM chat_sessions
+                WHERE is_active = FALSE AND last_activity < %s
+                AND last_activity >= %s AND last_activity < %s::date + 1
+                ORDER BY id
+            """, (cutoff, day, day))
+            batches = []
+            while True:
+                rows = stream.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                batches.append(_rows_to_batch(rows, SESSION_SCHEMA))
+        finally:
+            stream.close()
+        if batches:
+            _merge_sessions(_day_dir(root, "sessions", day), pa.Table.from_batches(batches, SESSION_SCHEMA))
+            total += sum(batch.num_rows for batch in batches)
+    if total:
+        logger.info("Archived %d expired sessions", total)
+    return total
+
+
+def _filter(emotions: Optional[Iterable[str]], start: Optional[date], end: Optional[date],
+            emotion_field: str):
+    expression = None
+    clauses = []
+    if emotions is not None:
+        clauses.append(ds.field(emotion_field).isin(list(emotions)))
+    if start is not None:
+        clauses.append(ds.field("day") >= pa.scalar(start, type=pa.date32()))
+    if end is not None:
+        clauses.append(ds.field("day") <= pa.scalar(end, type=pa.date32()))
+    for clause in clauses:
+        expression = clause if expression is None else expression & clause
+    return expression
+
+
+def _scan(root, dataset: str, filter_expression, columns: Optional[List[str]],
+          batch_size: int) -> Iterator[pa.RecordBatch]:
+    path = Path(root) / dataset
+    if not path.exists():
+        return
+    source = ds.dataset(path, format="parquet", partitioning=DAY_PARTITIONING)
+    yield from source.to_batches(columns=columns, filter=filter_expression, batch_size=batch_size)
+
+
+def archived_days(root, dataset: str = "messages") -> List[date]:
+    """Days with at least one archived file, oldest first"""
+    path = Path(root) / dataset
+    if not path.exists():
+        return []
+    days = []
+    for child in path.iterdir():
+        if child.is_dir() and child.name.startswith("day=") and any(child.glob("*.parquet")):
+            days.append(date.fromisoformat(child.name[len("day="):]))
+    return sorted(days)
+
+
+def scan_messages(root, emotions: Optional[Iterable[str]] = None, start: Optional[date] = None,
+                  end: Optional[date] = None, columns: Optional[List[str]] = None,
+                  batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+    """
+    Lazily scan archived messages as record batches. Days outside
+    [start, end] are never opened, and row groups whose emotion statistics
+    exclude every requested emotion are skipped.
+    """
+    yield from _scan(root, "messages", _filter(emotions, start, end, "emotion"), columns, batch_size)
+
+
+def scan_sessions(root, emotions: Optional[Iterable[str]] = None, start: Optional[date] = None,
+                  end: Optional[date] = None, columns: Optional[List[str]] = None,
+                  batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+    """Lazily scan archived sessions, filtered on current_emotion and last-activity day"""
+    yield from _scan(root, "sessions", _filter(emotions, start, end, "current_emotion"), columns, batch_size)
+
+
+def iter_records(batches: Iterable[pa.RecordBatch]) -> Iterator[Dict]:
+    """Row dicts from scanned batches, for callers that don't use Arrow"""
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import ARCHIVE_DIR
+
+    parser = argparse.ArgumentParser(description="Query the chat history archive")
+    parser.add_argument("--dataset", choices=["messages", "sessions"], default="messages")
+    parser.add_argument("--emotion", action="append", help="repeat to match several emotions")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=20, help="rows to print; 0 only counts")
+    args = parser.parse_args()
+
+    scan = scan_messages if args.dataset == "messages" else scan_sessions
+    count = 0
+    for record in iter_records(scan(ARCHIVE_DIR, args.emotion, args.since, args.until)):
+        if count < args.limit:
+            print(record)
+        count += 1
+    print(f"{count} matching {args.dataset}")
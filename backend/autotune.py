@@ -0,0 +1,261 @@
+"""
+CPU inference auto-tuner
+
+Benchmarks the emotion model on this machine in two passes and writes the
+best settings to TUNING_FILE:
+
+    python autotune.py                    # full grid, 5s per configuration
+    python autotune.py --seconds 2 --max-p95-ms 150
+
+1. Torch intra-op threads x inter-op threads x server worker processes,
+   with single-message calls, the shape detect_emotion sends per request.
+2. Batch sizes for batched callers (cascade escalation, distillation),
+   with the threads and workers chosen in the first pass.
+
+Each configuration runs in fresh subprocesses, one per simulated worker,
+because torch thread pools can only be sized once per process. Workers
+load and warm up first, then start measuring together. In each pass the
+winner has the highest combined throughput (messages/s) whose p95 call
+latency stays under --max-p95-ms. Configurations that oversubscribe the
+cores (workers x intra-op threads > CPUs) are skipped.
+
+apply_tuning() is called by server.py before torch is imported.
+start_production.py reads the tuned worker count for uvicorn. A file tuned
+on a machine with a different CPU count is ignored.
+"""
+
+import itertools
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_tuning(path) -> Optional[Dict]:
+    """Tuned settings for this machine, or None if missing or tuned elsewhere"""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    tuning = json.loads(path.read_text(encoding="utf-8"))
+    if tuning.get("machine", {}).get("cpu_count") != cpu_count():
+        logger.warning("Ignoring %s: tuned for %s CPUs, this machine has %d",
+                       path, tuning.get("machine", {}).get("cpu_count"), cpu_count())
+        return None
+    return tuning
+
+
+def apply_tuning(path) -> Optional[Dict]:
+    """
+    Apply tuned thread counts to this process. Call before torch is
+    imported: OpenMP/MKL read their variables once, at load.
+    """
+    tuning = load_tuning(path)
+    if tuning is None:
+        return None
+    intra = tuning["torch_intra_op_threads"]
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(intra)
+    import torch
+
+    torch.set_num_threads(intra)
+    try:
+        torch.set_num_interop_threads(tuning["torch_inter_op_threads"])
+    except RuntimeError:
+        # Already fixed by earlier parallel work in this process
+        logger.warning("Could not set torch inter-op threads; keeping %d", torch.get_num_interop_threads())
+    logger.info("Applied CPU tuning from %s: intra %d, inter %d, batch %d, workers %d",
+                path, intra, tuning["torch_inter_op_threads"], tuning["batch_size"], tuning["workers"])
+    return tuning
+
+
+def _texts() -> List[str]:
+    from benchmarks.corpora import LONG_MESSAGES, SHORT_MESSAGES
+
+    # Mostly short chat messages with some long ones, as in production traffic
+    return SHORT_MESSAGES * 3 + LONG_MESSAGES
+
+
+def _worker(model: str, intra: int, inter: int, batch_size: int, seconds: float):
+    """Subprocess body: load, report ready, wait for go, measure, print JSON"""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(intra)
+    import torch
+
+    torch.set_num_threads(intra)
+    torch.set_num_interop_threads(inter)
+    from model_registry import load_pipeline
+
+    classifier = load_pipeline(model)
+    texts = _texts()
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    # Same call shape as detect_emotion (single text) or a batched caller
+    call = (lambda batch: classifier(batch[0], top_k=1)) if batch_size == 1 else \
+        (lambda batch: classifier(batch, top_k=1, batch_size=batch_size))
+    for batch in batches[:3]:
+        call(batch)
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    messages = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    for batch in itertools.cycle(batches):
+        call_start = time.perf_counter()
+        call(batch)
+        latencies.append(time.perf_counter() - call_start)
+        messages += len(batch)
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"messages": messages, "seconds": elapsed, "latencies": latencies}), flush=True)
+
+
+def measure(model: str, intra: int, inter: int, workers: int, batch_size: int, seconds: float) -> Dict:
+    """Run one configuration with `workers` concurrent processes"""
+    command = [sys.executable, __file__, "--worker", "--model", model, "--intra", str(intra),
+               "--inter", str(inter), "--batch-size", str(batch_size), "--seconds", str(seconds)]
+    processes = [
+        subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                         cwd=Path(__file__).parent)
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            line = process.stdout.readline().strip()
+            if line != "ready":
+                raise RuntimeError(f"Benchmark worker failed to start (exit code {process.wait()})")
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        results = [json.loads(process.stdout.readline()) for process in processes]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+    latencies = sorted(l for r in results for l in r["latencies"])
+    return {
+        "torch_intra_op_threads": intra,
+        "torch_inter_op_threads": inter,
+        "workers": workers,
+        "batch_size": batch_size,
+        "throughput": sum(r["messages"] / r["seconds"] for r in results),
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+    }
+
+
+def grid(cores: int) -> List[tuple]:
+    powers = [n for n in (1, 2, 4, 8, 16, 32) if n <= cores] or [1]
+    configurations = []
+    for intra, inter, workers in itertools.product(powers, (1, 2), powers):
+        if intra * workers > cores or inter > max(1, cores // workers):
+            continue
+        configurations.append((intra, inter, workers))
+    return configurations
+
+
+def choose(results: List[Dict], max_p95_ms: float) -> Dict:
+    within_slo = [r for r in results if r["p95_ms"] <= max_p95_ms]
+    if within_slo:
+        return max(within_slo, key=lambda r: r["throughput"])
+    logger.warning("No configuration met p95 <= %.0fms; choosing the lowest p95", max_p95_ms)
+    return min(results, key=lambda r: r["p95_ms"])
+
+
+def _report(result: Dict):
+    print(f"intra {result['torch_intra_op_threads']:>2} inter {result['torch_inter_op_threads']} "
+          f"workers {result['workers']:>2} batch {result['batch_size']:>2}: "
+          f"{result['throughput']:8.1f} msg/s  p50 {result['p50_ms']:7.1f}ms  p95 {result['p95_ms']:7.1f}ms",
+          flush=True)
+
+
+def tune(model: str, output, seconds: float = 5.0, max_p95_ms: float = 250.0,
+         batch_sizes: List[int] = (1, 4, 8, 16)) -> Dict:
+    cores = cpu_count()
+    # Threads and workers serve detect_emotion, which classifies one message per call
+    results = []
+    for intra, inter, workers in grid(cores):
+        result = measure(model, intra, inter, workers, 1, seconds)
+        results.append(result)
+        _report(result)
+    best = choose(results, max_p95_ms)
+
+    # Batched callers run inside those workers, so their batch size is tuned on top
+    batch_results = [best]
+    for batch_size in batch_sizes:
+        if batch_size == 1:
+            continue
+        result = measure(model, best["torch_intra_op_threads"], best["torch_inter_op_threads"],
+                         best["workers"], batch_size, seconds)
+        batch_results.append(result)
+        _report(result)
+    batch = choose(batch_results, max_p95_ms)
+    tuning = {
+        "torch_intra_op_threads": best["torch_intra_op_threads"],
+        "torch_inter_op_threads": best["torch_inter_op_threads"],
+        "workers": best["workers"],
+        "batch_size": batch["batch_size"],
+        "model": model,
+        "max_p95_ms": max_p95_ms,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {"cpu_count": cores, "processor": platform.processor() or platform.machine(),
+                    "platform": platform.platform()},
+        "best": best,
+        "batch": batch,
+        "results": results,
+        "batch_results": batch_results,
+    }
+    Path(output).write_text(json.dumps(tuning, indent=2), encoding="utf-8")
+    return tuning
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tune CPU inference settings for this machine")
+    parser.add_argument("--seconds", type=float, default=5.0, help="measurement time per configuration")
+    parser.add_argument("--max-p95-ms", type=float, default=250.0, help="latency budget per model call")
+    parser.add_argument("--batch-sizes", default="1,4,8,16", help="candidates for batched callers")
+    parser.add_argument("--model", help="model to benchmark (default: EMOTION_MODEL)")
+    parser.add_argument("--output", help="where to write the tuning (default: TUNING_FILE)")
+    # Internal: run as one benchmark worker process
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--intra", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--inter", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--batch-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from config import EMOTION_MODEL, TUNING_FILE
+
+    model_name = args.model or EMOTION_MODEL
+    if args.worker:
+        _worker(model_name, args.intra, args.inter, args.batch_size, args.seconds)
+    else:
+        logging.basicConfig(level=logging.INFO)
+        result = tune(model_name, args.output or TUNING_FILE, args.seconds, args.max_p95_ms,
+                      [int(b) for b in args.batch_sizes.split(",")])
+        print(f"Best: intra {result['torch_intra_op_threads']}, inter {result['torch_inter_op_threads']}, "
+              f"workers {result['workers']}, batch {result['batch_size']} "
+              f"({result['best']['throughput']:.1f} msg/s, p95 {result['best']['p95_ms']:.1f}ms single-message; "
+              f"{result['batch']['throughput']:.1f} msg/s, p95 {result['batch']['p95_ms']:.1f}ms batched)")
+        print(f"Written to {args.output or TUNING_FILE}")
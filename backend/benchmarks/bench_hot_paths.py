@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks for the per-message keyword and template hot paths
+
+Each benchmark processes a whole fixed corpus per call, so its timing is the
+cost of that corpus rather than of a single lucky input.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.corpora import CORPORA, HISTORY
+
+
+def _classify_all(classifier, messages, history):
+    for message in messages:
+        classifier.classify_emotion_with_context(message, history)
+
+
+def _generate_all(generator, emotions, history, messages):
+    for emotion_data, message in zip(emotions, messages):
+        generator.generate_response(emotion_data, history, message)
+
+
+def _apply_all(func, messages):
+    for message in messages:
+        func(message)
+
+
+@pytest.fixture(scope="module")
+def main_module():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("psycopg2")
+    pytest.importorskip("dotenv")
+    from app import main
+    return main
+
+
+@pytest.fixture(scope="module")
+def chatbot_module():
+    pytest.importorskip("transformers")
+    pytest.importorskip("langchain")
+    import chatbot
+    return chatbot
+
+
+@pytest.fixture(scope="module")
+def bot(chatbot_module):
+    # Skip __init__: these paths need only the keyword tables, not the model
+    from config import CRISIS_KEYWORDS
+    instance = chatbot_module.EmotionAwareChatbot.__new__(chatbot_module.EmotionAwareChatbot)
+    instance.crisis_keywords = CRISIS_KEYWORDS
+    return instance
+
+
+@pytest.mark.parametrize("corpus", ["short", "long"])
+@pytest.mark.parametrize("with_history", [False, True], ids=["no_history", "history"])
+def bench_classify_emotion_with_context(bench, main_module, corpus, with_history):
+    classifier = main_module.ContextAwareEmotionClassifier()
+    history = HISTORY if with_history else []
+    bench(_classify_all, classifier, CORPORA[corpus], history)
+
+
+@pytest.mark.parametrize("corpus", ["short", "long"])
+@pytest.mark.parametrize("with_history", [False, True], ids=["no_history", "history"])
+def bench_generate_response(bench, main_module, corpus, with_history):
+    classifier = main_module.ContextAwareEmotionClassifier()
+    generator = main_module.ContextAwareResponseGenerator()
+    history = HISTORY if with_history else []
+    messages = CORPORA[corpus]
+    emotions = [classifier.classify_emotion_with_context(m, history) for m in messages]
+    bench(_generate_all, generator, emotions, history, messages)
+
+
+@pytest.mark.parametrize("corpus", ["short", "long"])
+def bench_fallback_emotion_detection(bench, bot, corpus):
+    bench(_apply_all, bot._fallback_emotion_detection, CORPORA[corpus])
+
+
+@pytest.mark.parametrize("corpus", ["short", "long"])
+def bench_detect_crisis(bench, bot, corpus):
+    bench(_apply_all, bot.detect_crisis, CORPORA[corpus])
+
+
+@pytest.mark.parametrize("corpus", ["short", "long"])
+def bench_extract_emotion_from_prompt(bench, chatbot_module, corpus):
+    llm = chatbot_module.TemplateLLM()
+    bench(_apply_all, llm._extract_emotion_from_prompt, CORPORA[corpus])
+
+
+def _select_all_random(templates, cases):
+    for emotion, _ in cases:
+        random.choice(templates[emotion])
+
+
+def _select_all_index(index, cases):
+    for emotion, query in cases:
+        index.select_embedding(emotion, query)
+
+
+@pytest.fixture(scope="module")
+def template_cases(chatbot_module):
+    # Random unit vectors at MiniLM's width: selection cost does not depend on the values
+    rng = np.random.default_rng(42)
+    emotions = list(chatbot_module.RESPONSE_TEMPLATES)
+    queries = rng.standard_normal((len(CORPORA["short"]), 384)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return [(emotions[i % len(emotions)], query) for i, query in enumerate(queries)]
+
+
+def bench_select_template_random(bench, chatbot_module, template_cases):
+    bench(_select_all_random, chatbot_module.RESPONSE_TEMPLATES, template_cases)
+
+
+def bench_select_template_index(bench, chatbot_module, template_cases):
+    from template_index import TemplateIndex
+
+    templates = chatbot_module.RESPONSE_TEMPLATES
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((sum(map(len, templates.values())), 384)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    bench(_select_all_index, TemplateIndex(templates, embeddings, "random"), template_cases)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal timing fixture with baseline regression checks
+
+Each benchmark is timed as the best of several rounds (after a warm-up) and
+compared against benchmarks/baseline.json. A benchmark more than
+bench_threshold slower than its baseline fails. Baselines are machine
+specific: record them on the machine that runs the checks with
+
+    python -m pytest benchmarks --bench-save
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+ROUNDS = 7
+MIN_ROUND_SECONDS = 0.02
+
+_results_key = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("hot path benchmarks")
+    group.addoption("--bench-save", action="store_true",
+                    help="write this run's timings as the new baseline")
+    group.addoption("--bench-threshold", type=float, default=None,
+                    help="allowed slowdown versus baseline, e.g. 0.25 for 25%%")
+    group.addoption("--bench-baseline", default=BASELINE_PATH,
+                    help="baseline file to compare against")
+    parser.addini("bench_threshold", "allowed slowdown versus baseline", default="0.25")
+
+
+def pytest_configure(config):
+    config.stash[_results_key] = {}
+
+
+def _load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _time_per_call(func, args):
+    """Best-of-ROUNDS seconds per call, with enough loops per round to be measurable"""
+    func(*args)
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(*args)
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_SECONDS:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best / loops
+
+
+@pytest.fixture
+def bench(request):
+    """bench(func, *args) times func(*args) and checks it against the baseline"""
+    config = request.config
+    threshold = config.getoption("--bench-threshold")
+    if threshold is None:
+        threshold = float(config.getini("bench_threshold"))
+    baseline = _load_baseline(config.getoption("--bench-baseline"))
+    name = request.node.nodeid.split("::", 1)[-1]
+
+    def run(func, *args):
+        seconds = _time_per_call(func, args)
+        config.stash[_results_key][name] = seconds
+        reference = baseline.get(name)
+        if reference and not config.getoption("--bench-save"):
+            slowdown = seconds / reference - 1
+            assert slowdown <= threshold, (
+                f"{name} regressed {slowdown:.0%} "
+                f"({reference * 1e6:.1f} us -> {seconds * 1e6:.1f} us, limit {threshold:.0%})"
+            )
+        return seconds
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash[_results_key]
+    if not results:
+        return
+    baseline = _load_baseline(config.getoption("--bench-baseline"))
+    terminalreporter.section("hot path timings")
+    for name, seconds in sorted(results.items()):
+        reference = baseline.get(name)
+        change = f"{seconds / reference - 1:+.0%}" if reference else "no baseline"
+        terminalreporter.write_line(f"{name:<60} {seconds * 1e6:>10.1f} us  {change}")
+
+    if config.getoption("--bench-save"):
+        baseline.update(results)
+        with open(config.getoption("--bench-baseline"), "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        terminalreporter.write_line(f"Baseline saved to {config.getoption('--bench-baseline')}")
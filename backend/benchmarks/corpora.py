@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed input corpora for the hot-path microbenchmarks
+
+Everything here is literal or derived deterministically, so timings from
+different runs and commits are measured on identical inputs.
+"""
+
+SHORT_MESSAGES = [
+    "I am so happy today!",
+    "I feel really sad and hopeless",
+    "I am angry about this situation",
+    "I am scared about the future",
+    "This is amazing news!",
+    "I am feeling okay today",
+    "Nothing special happened",
+    "I feel anxious and nervous",
+    "This is disgusting",
+    "I never saw this coming",
+    "I feel empty inside",
+    "Everything is going great",
+    "I am so tired of everything",
+    "I am worried about my exams",
+    "I feel lonely",
+    "Wow, this is unexpected",
+]
+
+_LONG_SENTENCES = [
+    "I have been trying to keep everything together at work but the deadlines keep piling up",
+    "and every evening I come home feeling more drained and more frustrated than the day before",
+    "my friends say I should take a break yet I am worried that if I slow down I will fall behind",
+    "sometimes I feel hopeful when a project goes well but that feeling never seems to last long",
+    "last weekend I finally went hiking and for a few hours I felt calm and genuinely happy again",
+    "then on Monday the same anxious knot came back and I could not focus on anything at all",
+]
+
+# Long messages: each is the paragraph above, rotated, so no two are identical
+LONG_MESSAGES = [
+    ". ".join(_LONG_SENTENCES[i:] + _LONG_SENTENCES[:i]) + "."
+    for i in range(len(_LONG_SENTENCES))
+]
+
+# Fifty turns of alternating user/ai history, in the format app/main.py stores
+HISTORY = []
+for _turn in range(25):
+    HISTORY.append(f"user: {SHORT_MESSAGES[_turn % len(SHORT_MESSAGES)]}")
+    HISTORY.append("ai: Thank you for sharing that with me. Can you tell me more about how you feel?")
+
+CORPORA = {
+    "short": SHORT_MESSAGES,
+    "long": LONG_MESSAGES,
+}
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end load test for the chat endpoints
+
+Drives POST /api/chat/send-message with multi-turn conversations built from
+the EmotionDataset corpus, one conversation per worker at a time, and reports
+throughput and p50/p95/p99 latency per server. Results are saved as JSON
+(tagged with the git commit) so runs can be compared across commits.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --servers main clean_server --concurrency 16
+    python -m benchmarks.load_test --url http://localhost:8001 --compare benchmarks/results/old.json
+
+Servers are started with uvicorn on a free port. app/main.py persists to the
+Postgres database in DATABASE_URL (use --database-url to point it at a local
+scratch database); without one it runs in its no-database mode.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.ml.training.train_emotion_model import EmotionDataset
+
+SERVERS = {
+    "main": "app.main:app",
+    "server": "server:app",
+    "clean_server": "clean_server:app",
+}
+ENDPOINT = "/api/chat/send-message"
+RESULTS_DIR = "benchmarks/results"
+
+
+def build_conversations(count: int, turns: int, seed: int = 42) -> List[Dict]:
+    """Multi-turn conversations whose messages come from the emotion corpus
+
+    Consecutive turns usually stay on one emotion, occasionally drifting, so
+    the context-aware classifiers see realistic history.
+    """
+    rng = random.Random(seed)
+    by_emotion: Dict[str, List[str]] = {}
+    for item in EmotionDataset().iter_synthetic_dataset():
+        by_emotion.setdefault(item["emotion"], []).append(item["text"])
+    emotions = sorted(by_emotion)
+
+    conversations = []
+    for i in range(count):
+        emotion = rng.choice(emotions)
+        messages = []
+        for _ in range(turns):
+            if rng.random() < 0.2:
+                emotion = rng.choice(emotions)
+            messages.append(rng.choice(by_emotion[emotion]))
+        conversations.append({"user_id": f"loadtest-{seed}-{i}", "messages": messages})
+    return conversations
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _Worker:
+    """One keep-alive HTTP connection replaying whole conversations"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+
+    def _post(self, body: bytes):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        self.connection.request("POST", ENDPOINT, body=body, headers={"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        return response.status, response.read()
+
+    def run(self, conversation: Dict, latencies: List[float], errors: List[str], lock: threading.Lock):
+        session_id = None
+        for message in conversation["messages"]:
+            body = json.dumps({
+                "message": message,
+                "user_id": conversation["user_id"],
+                "session_id": session_id,
+            }).encode("utf-8")
+            start = time.perf_counter()
+            try:
+                status, payload = self._post(body)
+            except (OSError, http.client.HTTPException) as e:
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            elapsed = time.perf_counter() - start
+            if status != 200:
+                with lock:
+                    errors.append(f"HTTP {status}")
+                continue
+            session_id = json.loads(payload).get("session_id", session_id)
+            with lock:
+                latencies.append(elapsed)
+
+
+def run_load(url: str, conversations: List[Dict], concurrency: int, timeout: float = 60.0) -> Dict:
+    """Replay conversations against a running server and summarize latency"""
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def replay(conversation):
+        if not hasattr(local, "worker"):
+            local.worker = _Worker(host, port, timeout)
+        local.worker.run(conversation, latencies, errors, lock)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(replay, conversations))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    error_counts: Dict[str, int] = {}
+    for error in errors:
+        error_counts[error] = error_counts.get(error, 0) + 1
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "conversations": len(conversations),
+        "requests": len(latencies) + len(errors),
+        "errors": error_counts,
+        "duration_seconds": duration,
+        "throughput_rps": len(latencies) / duration if duration else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 50),
+            "p95": 1000 * percentile(latencies, 95),
+            "p99": 1000 * percentile(latencies, 99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_health(port: int, process: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server did not become healthy within {timeout:.0f}s")
+
+
+def start_server(name: str, database_url: Optional[str], startup_timeout: float):
+    """Launch one of the servers under uvicorn on a free local port"""
+    port = _free_port()
+    env = dict(os.environ)
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", SERVERS[name], "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        _wait_for_health(port, process, startup_timeout)
+    except Exception:
+        process.terminate()
+        process.wait()
+        raise
+    return process, f"http://127.0.0.1:{port}"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict, previous: Dict):
+    """Print throughput and p95 deltas against an earlier results file"""
+    print(f"\nComparison against {previous.get('commit')} ({previous.get('created_at')}):")
+    for name, result in current["servers"].items():
+        old = previous.get("servers", {}).get(name)
+        if not old:
+            continue
+        rps_delta = result["throughput_rps"] / old["throughput_rps"] - 1 if old["throughput_rps"] else 0.0
+        p95_delta = result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1 if old["latency_ms"]["p95"] else 0.0
+        print(f"  {name:<13} throughput {rps_delta:+.1%}  p95 {p95_delta:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints")
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=sorted(SERVERS))
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Postgres URL passed to the servers as DATABASE_URL")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    conversations = build_conversations(args.conversations, args.turns, args.seed)
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "conversations": args.conversations,
+            "turns": args.turns,
+            "seed": args.seed,
+            "database": "postgres" if args.database_url or os.getenv("DATABASE_URL") else "none",
+        },
+        "servers": {},
+    }
+
+    targets = [("external", args.url)] if args.url else [(name, None) for name in args.servers]
+    for name, url in targets:
+        process = None
+        if url is None:
+            print(f"Starting {name}...")
+            process, url = start_server(name, args.database_url, args.startup_timeout)
+        try:
+            print(f"Running {len(conversations)} conversations against {name} at concurrency {args.concurrency}")
+            result = run_load(url, conversations, args.concurrency)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        results["servers"][name] = result
+        latency = result["latency_ms"]
+        print(f"  {result['throughput_rps']:.1f} req/s  p50 {latency['p50']:.1f} ms  "
+              f"p95 {latency['p95']:.1f} ms  p99 {latency['p99']:.1f} ms  errors {sum(result['errors'].values())}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{results['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
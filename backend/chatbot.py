@@ -4,14 +4,16 @@ CPU-only version optimized for Core i5 CPU, 8GB RAM, HDD storage
 """
 
 import json
+import logging
 import os
+import random
 import re
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
+from time import perf_counter
 
 # Minimal imports for CPU-only inference
-from transformers import pipeline
 import torch
 from langchain.schema import HumanMessage, AIMessage
 from langchain.memory import ConversationBufferWindowMemory
@@ -20,6 +22,12 @@ from langchain.chains import LLMChain
 from langchain.llms.base import LLM
 from pydantic import BaseModel
 
+from ids import new_session_id
+from model_registry import ModelRegistry
+from metrics import STAGE_CLASSIFY, STAGE_GENERATE, STAGE_SAVE, EMOTIONS
+
+logger = logging.getLogger(__name__)
+
 class ChatMessage(BaseModel):
     """Chat message model for API requests"""
     message: str
@@ -36,14 +44,66 @@ class ChatResponse(BaseModel):
     resources: List[Dict[str, str]]
     session_id: str
 
+# Response templates by emotion; template_index.py embeds them for selection
+RESPONSE_TEMPLATES = {
+    'joy': [
+        "I'm so happy to hear that! Your positive energy is contagious. What made you feel this way?",
+        "That's wonderful! I can feel your joy through your words. Tell me more about what's bringing you happiness!",
+        "Your happiness is radiating! I'd love to hear more about what's making you feel so good."
+    ],
+    'sadness': [
+        "I'm sorry you're feeling sad. It's okay to feel this way, and I'm here to listen. Would you like to talk more about what's on your mind?",
+        "I can sense your sadness, and I want you to know that it's completely normal to feel this way sometimes. What's been weighing on your heart?",
+        "I'm here to listen to whatever you need to share. Sometimes talking about our feelings can help lighten the load."
+    ],
+    'anger': [
+        "I can understand why you'd feel angry about that. It's a natural response. Would you like to talk through what happened?",
+        "Your anger is valid, and I'm here to listen. Sometimes we need to vent to process our feelings. What's been frustrating you?",
+        "I can sense your frustration, and I want you to know that it's okay to feel angry. What's been building up?"
+    ],
+    'fear': [
+        "I can sense your anxiety, and I want you to know you're not alone. Let's talk about what's worrying you.",
+        "It sounds like you're experiencing some fear or anxiety. I'm here to listen and support you through this.",
+        "I can hear the worry in your words. Sometimes talking about our fears can help make them feel less overwhelming."
+    ],
+    'surprise': [
+        "That's quite unexpected! I'm here to help you process this new information. How are you feeling about it?",
+        "Wow, that's surprising! I'd love to hear more about what happened and how you're processing it.",
+        "That's quite a turn of events! How are you feeling about this unexpected situation?"
+    ],
+    'disgust': [
+        "I can see why you'd feel that way. I'm here to listen and support you through this.",
+        "That sounds really difficult to deal with. I'm here to listen if you want to talk about it.",
+        "I can understand why you'd feel that way. Sometimes we need to process difficult emotions together."
+    ],
+    'neutral': [
+        "I'm here to listen and support you. How are you really feeling today?",
+        "I'm here for you. Sometimes it helps to talk about what's on our minds, even if we're not sure how we feel.",
+        "I'm listening. What would you like to share or talk about today?"
+    ]
+}
+
+USER_MESSAGE_PREFIX = "User's message:"
+DEFAULT_RESPONSE = "I'm here to listen and support you. How can I help you today?"
+
 class TemplateLLM(LLM):
     """Custom LLM that uses our response templates instead of external API calls"""
     
+    # Optional template_index.TemplateIndex; random choice among templates without it
+    template_index: Any = None
+    
     def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
         """Generate response using our template system"""
         # Extract emotion from the prompt (assuming it's passed in the prompt)
         emotion = self._extract_emotion_from_prompt(prompt)
-        return self._generate_template_response(emotion)
+        return self._generate_template_response(emotion, self._extract_user_message_from_prompt(prompt))
+    
+    def _extract_user_message_from_prompt(self, prompt: str) -> str:
+        """The line the conversation prompt renders as "User's message: ..." """
+        for line in prompt.splitlines():
+            if line.startswith(USER_MESSAGE_PREFIX):
+                return line[len(USER_MESSAGE_PREFIX):].strip()
+        return ""
     
     def _extract_emotion_from_prompt(self, prompt: str) -> str:
         """Extract emotion from the prompt text"""
@@ -62,50 +122,18 @@ class TemplateLLM(LLM):
                 return emotion
         return 'neutral'
     
-    def _generate_template_response(self, emotion: str) -> str:
+    def _generate_template_response(self, emotion: str, user_message: str = "") -> str:
         """Generate response using our emotion-based templates"""
-        response_templates = {
-            'joy': [
-                "I'm so happy to hear that! Your positive energy is contagious. What made you feel this way?",
-                "That's wonderful! I can feel your joy through your words. Tell me more about what's bringing you happiness!",
-                "Your happiness is radiating! I'd love to hear more about what's making you feel so good."
-            ],
-            'sadness': [
-                "I'm sorry you're feeling sad. It's okay to feel this way, and I'm here to listen. Would you like to talk more about what's on your mind?",
-                "I can sense your sadness, and I want you to know that it's completely normal to feel this way sometimes. What's been weighing on your heart?",
-                "I'm here to listen to whatever you need to share. Sometimes talking about our feelings can help lighten the load."
-            ],
-            'anger': [
-                "I can understand why you'd feel angry about that. It's a natural response. Would you like to talk through what happened?",
-                "Your anger is valid, and I'm here to listen. Sometimes we need to vent to process our feelings. What's been frustrating you?",
-                "I can sense your frustration, and I want you to know that it's okay to feel angry. What's been building up?"
-            ],
-            'fear': [
-                "I can sense your anxiety, and I want you to know you're not alone. Let's talk about what's worrying you.",
-                "It sounds like you're experiencing some fear or anxiety. I'm here to listen and support you through this.",
-                "I can hear the worry in your words. Sometimes talking about our fears can help make them feel less overwhelming."
-            ],
-            'surprise': [
-                "That's quite unexpected! I'm here to help you process this new information. How are you feeling about it?",
-                "Wow, that's surprising! I'd love to hear more about what happened and how you're processing it.",
-                "That's quite a turn of events! How are you feeling about this unexpected situation?"
-            ],
-            'disgust': [
-                "I can see why you'd feel that way. I'm here to listen and support you through this.",
-                "That sounds really difficult to deal with. I'm here to listen if you want to talk about it.",
-                "I can understand why you'd feel that way. Sometimes we need to process difficult emotions together."
-            ],
-            'neutral': [
-                "I'm here to listen and support you. How are you really feeling today?",
-                "I'm here for you. Sometimes it helps to talk about what's on our minds, even if we're not sure how we feel.",
-                "I'm listening. What would you like to share or talk about today?"
-            ]
-        }
-        
-        import random
-        if emotion in response_templates:
-            return random.choice(response_templates[emotion])
-        return "I'm here to listen and support you. How can I help you today?"
+        templates = RESPONSE_TEMPLATES.get(emotion)
+        if not templates:
+            return DEFAULT_RESPONSE
+        if self.template_index is not None and user_message:
+            # Closest template to the message by embedding similarity
+            try:
+                return self.template_index.select(emotion, user_message) or random.choice(templates)
+            except Exception as e:
+                logger.warning("Template index selection failed: %s", e)
+        return random.choice(templates)
     
     @property
     def _llm_type(self) -> str:
@@ -119,7 +147,12 @@ class EmotionAwareChatbot:
     
     def __init__(self):
         """Initialize the chatbot with LangChain workflow"""
-        from config import MEMORY_FILE, MAX_MEMORY_MESSAGES, CRISIS_KEYWORDS
+        from config import (
+            MEMORY_FILE, MAX_MEMORY_MESSAGES, CRISIS_KEYWORDS,
+            CASCADE_ENABLED, CASCADE_THRESHOLD,
+            EMOTION_MODEL, SHADOW_MODEL, SHADOW_SAMPLE_RATE, TUNING_FILE
+        )
+        from autotune import load_tuning
         
         self.memory_file = Path(MEMORY_FILE)
         self.conversation_memory = ConversationBufferWindowMemory(
@@ -133,29 +166,49 @@ class EmotionAwareChatbot:
         # Load existing conversation memory
         self._load_memory()
         
-        # Initialize emotion classifier (lightweight model)
-        print("Loading emotion classifier...")
+        # Initialize emotion classifier (lightweight model). The registry is
+        # called like a pipeline and lets the model be swapped without a restart.
+        logger.info("Loading emotion classifier %s...", EMOTION_MODEL)
+        tuning = load_tuning(TUNING_FILE)
+        self.models = ModelRegistry(
+            shadow_sample_rate=SHADOW_SAMPLE_RATE,
+            batch_size=tuning["batch_size"] if tuning else None
+        )
+        # Always route through the registry: a model loaded later through
+        # /admin/models/load takes effect without a restart
+        self.emotion_classifier = self.models
         try:
-            self.emotion_classifier = pipeline(
-                "text-classification",
-                model="j-hartmann/emotion-english-distilroberta-base",
-                device=-1  # Force CPU usage
-            )
-            print("✅ Emotion classifier loaded successfully")
+            self.models.load(EMOTION_MODEL)
+            logger.info("Emotion classifier loaded successfully")
         except Exception as e:
-            print(f"⚠️  Emotion classifier failed to load: {e}")
-            self.emotion_classifier = None
+            logger.warning("Emotion classifier failed to load, using keyword fallback until one is loaded: %s", e)
+        if SHADOW_MODEL:
+            self.models.load_async(SHADOW_MODEL, shadow=True)
+        
+        # Optional cascade: cheap TF-IDF model first, transformer on low confidence
+        self.cascade = None
+        if CASCADE_ENABLED:
+            try:
+                from app.ml.inference.cascade import CascadeEmotionClassifier
+                self.cascade = CascadeEmotionClassifier.from_saved_model(
+                    transformer=self.emotion_classifier,
+                    threshold=CASCADE_THRESHOLD
+                )
+                logger.info("Cascade classifier enabled (threshold %s)", CASCADE_THRESHOLD)
+            except Exception as e:
+                logger.warning("Cascade classifier failed to load: %s", e)
+                self.cascade = None
         
         # Initialize LangChain workflow
         self._setup_langchain_workflow()
         
-        print("✅ Production emotion-aware chatbot initialized successfully!")
+        logger.info("Production emotion-aware chatbot initialized successfully")
     
     def _setup_langchain_workflow(self):
         """Setup LangChain workflow with prompts and chains"""
         
         # Create our custom template-based LLM
-        self.template_llm = TemplateLLM()
+        self.template_llm = TemplateLLM(template_index=self._load_template_index())
         
         # Define the main conversation prompt template
         self.conversation_prompt = PromptTemplate(
@@ -202,7 +255,26 @@ Analysis:"""
             prompt=self.crisis_prompt
         )
         
-        print("✅ LangChain workflow initialized successfully")
+        logger.info("LangChain workflow initialized successfully")
+    
+    def _load_template_index(self):
+        """Embedding index for template selection, or None to keep random choice"""
+        from config import (
+            MODEL_DIR, MODEL_OFFLINE,
+            TEMPLATE_INDEX_ENABLED, TEMPLATE_EMBEDDING_MODEL, TEMPLATE_INDEX_FILE
+        )
+        
+        if not TEMPLATE_INDEX_ENABLED:
+            return None
+        try:
+            from template_index import load_index
+            index = load_index(RESPONSE_TEMPLATES, TEMPLATE_EMBEDDING_MODEL, MODEL_DIR,
+                               TEMPLATE_INDEX_FILE, offline=MODEL_OFFLINE)
+            logger.info("Template index loaded (%d templates)", len(index.templates))
+            return index
+        except Exception as e:
+            logger.warning("Template index unavailable, choosing templates at random: %s", e)
+            return None
     
     def _load_memory(self):
         """Load conversation memory from JSON file"""
@@ -216,9 +288,9 @@ Analysis:"""
                             self.conversation_memory.chat_memory.add_user_message(msg['content'])
                         elif msg['type'] == 'ai':
                             self.conversation_memory.chat_memory.add_ai_message(msg['content'])
-                print(f"✅ Loaded {len(memory_data.get('messages', []))} messages from memory")
+                logger.info("Loaded %d messages from memory", len(memory_data.get('messages', [])))
         except Exception as e:
-            print(f"⚠️  Could not load memory: {e}")
+            logger.warning("Could not load memory: %s", e)
     
     def _save_memory(self):
         """Save conversation memory to JSON file"""
@@ -247,14 +319,19 @@ Analysis:"""
                 json.dump(memory_data, f, indent=2)
                 
         except Exception as e:
-            print(f"⚠️  Could not save memory: {e}")
+            logger.warning("Could not save memory: %s", e)
     
     def detect_emotion(self, text: str) -> Dict[str, Any]:
         """
         Detect emotion in text using lightweight transformer model
         """
         try:
-            if self.emotion_classifier:
+            if self.cascade:
+                # Cheap model first, escalates to the transformer when unsure
+                result = self.cascade.classify(text)
+                emotion = result['emotion']
+                confidence = result['confidence']
+            elif self.models.active is not None:
                 # Use emotion classifier
                 result = self.emotion_classifier(text, top_k=1)[0]
                 emotion = result['label'].lower()
@@ -283,7 +360,7 @@ Analysis:"""
             }
             
         except Exception as e:
-            print(f"⚠️  Emotion detection failed: {e}")
+            logger.warning("Emotion detection failed: %s", e)
             return {
                 'emotion': 'neutral',
                 'confidence': 0.5,
@@ -348,7 +425,7 @@ Analysis:"""
             return response.strip()
             
         except Exception as e:
-            print(f"⚠️  LangChain response generation failed: {e}")
+            logger.warning("LangChain response generation failed: %s", e)
             # Fallback to template response
             return self._get_fallback_response(emotion)
     
@@ -382,7 +459,7 @@ Analysis:"""
             
             return "\n".join(history)
         except Exception as e:
-            print(f"⚠️  Could not get conversation history: {e}")
+            logger.warning("Could not get conversation history: %s", e)
             return "No previous conversation."
     
     def _get_fallback_response(self, emotion: str) -> str:
@@ -438,6 +515,7 @@ Analysis:"""
         Main chat method that processes user input and returns response
         """
         # Detect emotion
+        start = perf_counter()
         emotion_data = self.detect_emotion(user_message)
         emotion = emotion_data['emotion']
         confidence = emotion_data['confidence']
@@ -445,16 +523,24 @@ Analysis:"""
         
         # Detect crisis
         is_crisis = self.detect_crisis(user_message)
+        stage_end = perf_counter()
+        STAGE_CLASSIFY.observe(stage_end - start)
+        EMOTIONS.labels(emotion).inc()
         
         # Generate response using LangChain workflow
+        start = stage_end
         response = self.generate_supportive_response(user_message, emotion, is_crisis)
+        stage_end = perf_counter()
+        STAGE_GENERATE.observe(stage_end - start)
         
         # Update conversation memory
+        start = stage_end
         self.conversation_memory.chat_memory.add_user_message(user_message)
         self.conversation_memory.chat_memory.add_ai_message(response)
         
         # Save memory to file
         self._save_memory()
+        STAGE_SAVE.observe(perf_counter() - start)
         
         # Get resources if needed
         needs_help = is_crisis or severity in ['high', 'critical']
@@ -462,7 +548,7 @@ Analysis:"""
         
         # Generate session ID if not provided
         if not session_id:
-            session_id = f"session_{user_id}_{int(datetime.now().timestamp())}"
+            session_id = new_session_id()
         
         return ChatResponse(
             response=response,
@@ -474,9 +560,13 @@ Analysis:"""
             session_id=session_id
         )
 
-# Global chatbot instance
-chatbot = EmotionAwareChatbot()
+# Global chatbot instance, created on first use so importing this module
+# does not load the emotion model
+chatbot = None
 
 def get_chatbot():
     """Get the global chatbot instance"""
+    global chatbot
+    if chatbot is None:
+        chatbot = EmotionAwareChatbot()
     return chatbot
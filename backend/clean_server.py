@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import Optional
 import uvicorn
 
 app = FastAPI(title="FeelMate API", version="1.0.0")
@@ -16,8 +17,8 @@ app.add_middleware(
 
 class ChatMessage(BaseModel):
     message: str
-    user_id: str = None
-    session_id: str = None
+    user_id: Optional[str] = None
+    session_id: Optional[str] = None
 
 @app.get("/")
 def read_root():
@@ -16,6 +16,52 @@ PORT = int(os.getenv("PORT", 8001))
 EMOTION_MODEL = os.getenv("EMOTION_MODEL", "j-hartmann/emotion-english-distilroberta-base")
 DEVICE = os.getenv("DEVICE", "cpu")
 
+# Local model store (see model_store.py); offline loads only from MODEL_DIR
+MODEL_DIR = os.getenv("MODEL_DIR", str(BASE_DIR / "models"))
+MODEL_OFFLINE = os.getenv("MODEL_OFFLINE", "true").lower() == "true"
+MODEL_VERIFY = os.getenv("MODEL_VERIFY", "false").lower() == "true"  # checksum files on every load
+
+# Model Registry (see model_registry.py); SHADOW_MODEL is loaded as a candidate at startup
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", 0.1))
+
+# Response-template embedding index (see template_index.py); random choice without it
+TEMPLATE_INDEX_ENABLED = os.getenv("TEMPLATE_INDEX_ENABLED", "true").lower() == "true"
+TEMPLATE_EMBEDDING_MODEL = os.getenv("TEMPLATE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+TEMPLATE_INDEX_FILE = os.getenv("TEMPLATE_INDEX_FILE", str(BASE_DIR / "data" / "template_index.npz"))
+
+# CPU tuning written by `python autotune.py`, applied at server startup
+TUNING_FILE = os.getenv("TUNING_FILE", str(BASE_DIR / "tuning.json"))
+
+# Cascade Configuration (cheap TF-IDF model first, transformer on low confidence)
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", 0.6))
+
+# Admission Control (see admission.py)
+INFERENCE_MAX_IN_FLIGHT = int(os.getenv("INFERENCE_MAX_IN_FLIGHT", 1))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", 32))
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", 10.0))
+
+# Chat History Retention (see partitions.py)
+MESSAGE_RETENTION_HOURS = float(os.getenv("MESSAGE_RETENTION_HOURS", 24))
+PARTITION_PREMAKE_DAYS = int(os.getenv("PARTITION_PREMAKE_DAYS", 7))
+PARTITION_RETENTION_MODE = os.getenv("PARTITION_RETENTION_MODE", "drop")  # "drop" or "detach"
+
+# Expired chat history is written to Parquet here before removal (see archive.py)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+
+# Emotion time series downsampling (see timeseries.py)
+TIMESERIES_MINUTE_RETENTION_HOURS = float(os.getenv("TIMESERIES_MINUTE_RETENTION_HOURS", 48))
+TIMESERIES_HOUR_RETENTION_DAYS = float(os.getenv("TIMESERIES_HOUR_RETENTION_DAYS", 90))
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", 2000))
+
+# Per-user mood score half-life (see trajectory.py)
+TRAJECTORY_HALF_LIFE_HOURS = float(os.getenv("TRAJECTORY_HALF_LIFE_HOURS", 72))
+
+# Background health prober (see health.py)
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 5.0))
+
 # Memory Configuration
 MEMORY_FILE = os.getenv("MEMORY_FILE", "data/conversation_memory.json")
 MAX_MEMORY_MESSAGES = int(os.getenv("MAX_MEMORY_MESSAGES", 5))
@@ -24,6 +70,17 @@ MAX_MEMORY_MESSAGES = int(os.getenv("MAX_MEMORY_MESSAGES", 5))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", "logs/chatbot.log")
 
+# Profiling Configuration (see profiling.py)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")  # "sample" or "cprofile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 1.0))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+PROFILE_PATHS = ["/api/chat/send-message", "/chat/invoke"]
+
+# Admin endpoints and header-triggered profiling are disabled unless set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # Frontend Configuration
 FRONTEND_URLS = [
     "http://localhost:3000",
@@ -0,0 +1,108 @@
+"""
+Background health prober
+
+A daemon thread runs every registered check once per interval and caches
+the outcome, so /health only copies a small dict and never touches the
+database or the model. A check is a callable that returns an optional
+dict of details, or raises on failure. Overall status:
+
+    healthy    every check passed on the last probe
+    degraded   only non-critical checks failed
+    unhealthy  a critical check failed, or the cache is stale because the
+               prober has not finished a round in 3 intervals (e.g. a hung
+               connect); served with 503 so load balancers drain the worker
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import HEALTH_CHECK_SECONDS, HEALTH_CHECK_UP
+
+logger = logging.getLogger(__name__)
+
+STALE_INTERVALS = 3
+
+
+class HealthProber:
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._checks: Dict[str, Tuple[Callable[[], Optional[Dict[str, Any]]], bool]] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._last_probe: Optional[float] = None
+        self._last_probe_at: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_check(self, name: str, check: Callable[[], Optional[Dict[str, Any]]], critical: bool = True):
+        self._checks[name] = (check, critical)
+
+    def probe_once(self):
+        results = {}
+        for name, (check, critical) in self._checks.items():
+            start = time.perf_counter()
+            result: Dict[str, Any] = {"critical": critical}
+            try:
+                details = check()
+                result["status"] = "ok"
+                if details:
+                    result.update(details)
+            except Exception as e:
+                result["status"] = "fail"
+                result["error"] = str(e) or type(e).__name__
+            elapsed = time.perf_counter() - start
+            result["latency_ms"] = round(elapsed * 1000, 3)
+            results[name] = result
+            HEALTH_CHECK_UP.labels(name).set(1 if result["status"] == "ok" else 0)
+            HEALTH_CHECK_SECONDS.labels(name).set(elapsed)
+            if result["status"] != "ok":
+                logger.warning("Health check %s failed: %s", name, result["error"])
+        # Swap in a new dict so readers never see a half-written round
+        self._results = results
+        self._last_probe = time.monotonic()
+        self._last_probe_at = datetime.now(timezone.utc).isoformat()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_once()
+            except Exception:
+                logger.exception("Health prober round failed")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """(HTTP status code, body) from the cached results"""
+        results = self._results
+        last_probe = self._last_probe
+        if last_probe is None:
+            return 503, {"status": "starting", "checks": {}}
+        age = time.monotonic() - last_probe
+        if age > self.interval * STALE_INTERVALS:
+            status = "unhealthy"
+        elif any(r["status"] != "ok" and r["critical"] for r in results.values()):
+            status = "unhealthy"
+        elif any(r["status"] != "ok" for r in results.values()):
+            status = "degraded"
+        else:
+            status = "healthy"
+        body = {
+            "status": status,
+            "checked_at": self._last_probe_at,
+            "age_seconds": round(age, 3),
+            "checks": results,
+        }
+        return (503 if status == "unhealthy" else 200), body
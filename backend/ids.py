@@ -0,0 +1,49 @@
+"""
+Time-ordered identifiers
+
+new_session_id() returns a UUIDv7 (RFC 9562): a 48-bit Unix millisecond
+timestamp followed by a counter and random bits. IDs sort by creation time,
+so B-tree inserts land on the right-most pages, and two sessions created in
+the same microsecond cannot collide the way "session-{user}-{timestamp}" did.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """UUIDv7 with a 12-bit per-millisecond counter for monotonic ordering"""
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms <= _last_ms:
+            # Same (or a rewound) millisecond: keep counting from the last one
+            ms = _last_ms
+            _counter += 1
+            if _counter > 0xFFF:
+                ms += 1
+                _counter = 0
+        else:
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        _last_ms = ms
+        counter = _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (
+        (ms & ((1 << 48) - 1)) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | rand_b
+    )
+    return uuid.UUID(int=value)
+
+
+def new_session_id() -> str:
+    return str(uuid7())
@@ -0,0 +1,234 @@
+"""
+Lightweight Prometheus metrics for FeelMate
+
+Recording a sample is a bucket lookup and two additions on plain Python
+lists, so instrumentation stays well under a microsecond; all formatting
+work happens only when /metrics is scraped. On hot paths, time stages with
+perf_counter() and observe() directly and keep labeled children in module
+constants rather than calling labels() per request. Updates rely on the GIL and are
+not locked, so concurrent threads may very rarely lose an increment.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Seconds; tuned for per-stage latencies from tens of microseconds to seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the value lazily at scrape time"""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function else self.value
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus the +Inf overflow slot; counts are not cumulative
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Family:
+    """A named metric with zero or more label dimensions"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 factory: Callable = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[tuple, object] = {}
+        if not self.labelnames:
+            self._children[()] = factory()
+
+    def labels(self, *values: str):
+        """Child metric for these label values; cache it at call sites on hot paths"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(key, self._factory())
+        return child
+
+    def render(self) -> List[str]:
+        # Text format 0.0.4 names counter series, HELP and TYPE with the _total suffix
+        name = f"{self.name}_total" if self.kind == "counter" else self.name
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(child.buckets + (float("inf"),), child.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+            elif self.kind == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(child.value)}")
+            else:
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.get())}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, Family] = {}
+
+    def _register(self, family: Family):
+        """Register a family; unlabeled families hand back their single metric"""
+        family = self._families.setdefault(family.name, family)
+        return family if family.labelnames else family.labels()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register(Family("counter", name, documentation, labelnames, Counter))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register(Family("gauge", name, documentation, labelnames, Gauge))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS):
+        return self._register(Family("histogram", name, documentation, labelnames,
+                                     lambda: Histogram(buckets)))
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "feelmate_stage_seconds", "Latency of each chat pipeline stage", ["stage"]
+)
+STAGE_SESSION_LOOKUP = STAGE_SECONDS.labels("session_lookup")
+STAGE_HISTORY_FETCH = STAGE_SECONDS.labels("history_fetch")
+STAGE_CLASSIFY = STAGE_SECONDS.labels("classify")
+STAGE_GENERATE = STAGE_SECONDS.labels("generate")
+STAGE_SAVE = STAGE_SECONDS.labels("save")
+
+INFERENCE_BATCH_SIZE = REGISTRY.histogram(
+    "feelmate_inference_batch_size", "Messages per model inference call", ["model"],
+    buckets=BATCH_SIZE_BUCKETS
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "feelmate_cache_requests", "Cache lookups by cache and result", ["cache", "result"]
+)
+EMOTIONS = REGISTRY.counter(
+    "feelmate_emotions", "Classified user messages by emotion", ["emotion"]
+)
+DB_CONNECTIONS_OPENED = REGISTRY.counter(
+    "feelmate_db_connections_opened", "Database connections opened"
+)
+DB_CONNECTION_ERRORS = REGISTRY.counter(
+    "feelmate_db_connection_errors", "Failed database connection attempts"
+)
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    "feelmate_db_connect_seconds", "Time to open a database connection"
+)
+DB_CONNECTIONS_IN_USE = REGISTRY.gauge(
+    "feelmate_db_connections_in_use", "Database connections currently checked out"
+)
+
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "feelmate_inference_in_flight", "Inference calls currently running"
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "feelmate_inference_queue_depth", "Requests waiting for an inference slot"
+)
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "feelmate_inference_rejections", "Requests shed by admission control", ["reason"]
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "feelmate_inference_queue_wait_seconds", "Time spent waiting for an inference slot"
+)
+
+MODEL_INFERENCE_SECONDS = REGISTRY.histogram(
+    "feelmate_model_inference_seconds", "Emotion model call latency by role (active or shadow)", ["role"]
+)
+MODEL_SHADOW_COMPARISONS = REGISTRY.counter(
+    "feelmate_model_shadow_comparisons", "Shadow model predictions compared with the active model", ["result"]
+)
+
+WEBSOCKET_CONNECTIONS = REGISTRY.gauge(
+    "feelmate_websocket_connections", "Open chat WebSocket connections"
+)
+
+HEALTH_CHECK_UP = REGISTRY.gauge(
+    "feelmate_health_check_up", "Whether the last background health probe of a dependency passed", ["check"]
+)
+HEALTH_CHECK_SECONDS = REGISTRY.gauge(
+    "feelmate_health_check_seconds", "Latency of the last background health probe of a dependency", ["check"]
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,94 @@
+"""
+Minimal SQL migration runner for the chat tables
+
+Applies migrations/NNN_*.sql in order, each in its own transaction, and
+records applied versions in schema_migrations. An advisory lock keeps
+several workers starting at once from applying the same migration twice.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+# Arbitrary constant shared by every process running migrations
+MIGRATION_LOCK_ID = 7_246_021
+
+logger = logging.getLogger(__name__)
+
+
+def available_migrations() -> List[Tuple[str, Path]]:
+    return sorted((path.name.split("_", 1)[0], path) for path in MIGRATIONS_DIR.glob("*.sql"))
+
+
+def applied_versions(cursor) -> set:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations(conn) -> List[str]:
+    """Apply every pending migration on conn; returns the versions applied"""
+    applied_now = []
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        done = applied_versions(cursor)
+        conn.commit()
+        for version, path in available_migrations():
+            if version in done:
+                continue
+            logger.info("Applying migration %s", path.name)
+            try:
+                cursor.execute(path.read_text(encoding="utf-8"))
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, path.name)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied_now.append(version)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cursor.close()
+    return applied_now
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply FeelMate database migrations")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        if args.status:
+            cursor = conn.cursor()
+            done = applied_versions(cursor)
+            conn.commit()
+            for version, path in available_migrations():
+                print(f"{'applied' if version in done else 'pending':<8} {path.name}")
+        else:
+            applied = run_migrations(conn)
+            print(f"Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ""))
+    finally:
+        conn.close()
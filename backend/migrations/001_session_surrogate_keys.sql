@@ -0,0 +1,24 @@
+-- Reference sessions from chat_messages by a compact BIGINT surrogate key
+-- instead of the wide TEXT session_id, and widen both primary keys to BIGINT.
+
+ALTER TABLE chat_sessions ALTER COLUMN id TYPE BIGINT;
+ALTER SEQUENCE chat_sessions_id_seq AS BIGINT;
+ALTER TABLE chat_messages ALTER COLUMN id TYPE BIGINT;
+ALTER SEQUENCE chat_messages_id_seq AS BIGINT;
+
+-- Backfill the surrogate key from the existing TEXT foreign key
+ALTER TABLE chat_messages ADD COLUMN session_pk BIGINT;
+UPDATE chat_messages m
+SET session_pk = s.id
+FROM chat_sessions s
+WHERE s.session_id = m.session_id;
+ALTER TABLE chat_messages ALTER COLUMN session_pk SET NOT NULL;
+ALTER TABLE chat_messages
+    ADD CONSTRAINT chat_messages_session_pk_fkey
+    FOREIGN KEY (session_pk) REFERENCES chat_sessions(id) ON DELETE CASCADE;
+
+-- Dropping the TEXT column also drops its foreign key
+ALTER TABLE chat_messages DROP COLUMN session_id;
+
+-- History reads filter by session and order by time
+CREATE INDEX chat_messages_session_pk_timestamp_idx ON chat_messages (session_pk, timestamp);
@@ -0,0 +1,49 @@
+-- Range-partition chat_messages by day on timestamp so retention can drop
+-- whole partitions (see partitions.py) instead of deleting rows.
+
+ALTER TABLE chat_messages RENAME TO chat_messages_unpartitioned;
+ALTER SEQUENCE chat_messages_id_seq OWNED BY NONE;
+
+CREATE TABLE chat_messages (
+    id BIGINT NOT NULL DEFAULT nextval('chat_messages_id_seq'),
+    session_pk BIGINT NOT NULL,
+    message TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    emotion TEXT,
+    severity TEXT,
+    confidence FLOAT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (timestamp);
+ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id;
+
+-- One partition per day from the oldest existing message to a week ahead
+DO $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR day IN
+        SELECT generate_series(
+            LEAST(CURRENT_DATE, COALESCE((SELECT MIN(timestamp)::date FROM chat_messages_unpartitioned), CURRENT_DATE)),
+            CURRENT_DATE + 7,
+            INTERVAL '1 day'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+            'chat_messages_' || to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO chat_messages (id, session_pk, message, sender, emotion, severity, confidence, timestamp)
+SELECT id, session_pk, message, sender, emotion, severity, confidence, COALESCE(timestamp, CURRENT_TIMESTAMP)
+FROM chat_messages_unpartitioned;
+
+DROP TABLE chat_messages_unpartitioned;
+
+-- The partition key has to be part of the primary key
+ALTER TABLE chat_messages ADD CONSTRAINT chat_messages_pkey PRIMARY KEY (id, timestamp);
+ALTER TABLE chat_messages
+    ADD CONSTRAINT chat_messages_session_pk_fkey
+    FOREIGN KEY (session_pk) REFERENCES chat_sessions(id) ON DELETE CASCADE;
+CREATE INDEX chat_messages_session_pk_timestamp_idx ON chat_messages (session_pk, timestamp);
@@ -0,0 +1,19 @@
+-- Pre-aggregated counts of user messages by emotion and severity, kept at
+-- minute, hour and day resolution (see timeseries.py). Every message is
+-- counted in exactly one tier; aged minute/hour buckets are rolled up.
+
+CREATE TABLE emotion_buckets (
+    resolution TEXT NOT NULL CHECK (resolution IN ('minute', 'hour', 'day')),
+    bucket_start TIMESTAMP NOT NULL,
+    emotion TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (resolution, bucket_start, emotion, severity)
+);
+
+INSERT INTO emotion_buckets (resolution, bucket_start, emotion, severity, count)
+SELECT 'minute', date_trunc('minute', timestamp),
+       COALESCE(emotion, 'unknown'), COALESCE(severity, 'unknown'), COUNT(*)
+FROM chat_messages
+WHERE sender = 'user'
+GROUP BY 2, 3, 4;
@@ -0,0 +1,19 @@
+-- Rolling per-user emotional trajectory, updated with each user message
+-- (see trajectory.py). Filled for existing data by `python trajectory.py --backfill`.
+
+CREATE TABLE user_trajectories (
+    user_id TEXT PRIMARY KEY,
+    message_count BIGINT NOT NULL,
+    emotion_counts JSONB NOT NULL,
+    severity_counts JSONB NOT NULL,
+    -- Exponentially decayed sums; mood score = mood_sum / mood_weight
+    mood_sum DOUBLE PRECISION NOT NULL,
+    mood_weight DOUBLE PRECISION NOT NULL,
+    -- Consecutive messages at high/critical severity
+    severe_streak INTEGER NOT NULL,
+    longest_severe_streak INTEGER NOT NULL,
+    last_emotion TEXT,
+    last_severity TEXT,
+    first_seen TIMESTAMP NOT NULL,
+    last_seen TIMESTAMP NOT NULL
+);
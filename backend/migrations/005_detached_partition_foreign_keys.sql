@@ -0,0 +1,20 @@
+-- Partitions detached by PARTITION_RETENTION_MODE=detach kept the session_pk
+-- foreign key (ON DELETE CASCADE), so deleting expired sessions emptied
+-- them. Drop it from tables detached before partitions.py did so itself.
+
+DO $$
+DECLARE
+    fk RECORD;
+BEGIN
+    FOR fk IN
+        SELECT c.conrelid::regclass AS table_name, c.conname
+        FROM pg_constraint c
+        JOIN pg_class t ON t.oid = c.conrelid
+        WHERE c.contype = 'f'
+        AND t.relname LIKE 'chat\_messages\_%'
+        AND NOT t.relispartition
+        AND t.relkind = 'r'
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.table_name, fk.conname);
+    END LOOP;
+END $$;
@@ -0,0 +1,9 @@
+-- Id the client generates per user message, sent on both the WebSocket and
+-- the HTTP path, so a turn resent after a dropped socket is stored once
+-- (see save_messages in app/main.py).
+
+ALTER TABLE chat_messages ADD COLUMN client_message_id TEXT;
+
+CREATE INDEX chat_messages_client_message_id_idx
+    ON chat_messages (session_pk, client_message_id)
+    WHERE client_message_id IS NOT NULL;
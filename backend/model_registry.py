@@ -0,0 +1,285 @@
+"""
+Hot-swappable emotion model registry with shadow evaluation
+
+The registry behaves like a transformers text-classification pipeline
+(registry(text, top_k=1)), so the chatbot and the cascade call it the same
+way they called the pipeline. Each call goes to the current active version.
+
+    load(name)          load and warm synchronously, then activate (startup)
+    load_async(name)    load and warm on a background thread, then swap it
+                        in with one attribute assignment; requests already
+                        running finish on the version they started with
+    load_async(name, shadow=True)
+                        same, but install it as the shadow candidate instead
+    promote()           make the shadow candidate active
+
+While a shadow candidate is installed, a sampled fraction of calls
+(SHADOW_SAMPLE_RATE) is replayed against it on a single background worker.
+The replay compares top labels and latency with the active model without
+adding latency to the request. When that worker is busy the sample is
+dropped. stats() reports agreement and latency so a candidate can be judged
+before promotion. Each loaded version holds a full model in memory, so a
+shadow candidate roughly doubles model RAM until it is promoted or dropped.
+"""
+
+import hmac
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException
+from pydantic import BaseModel
+
+from metrics import MODEL_INFERENCE_SECONDS, MODEL_SHADOW_COMPARISONS
+from model_store import load_local_pipeline, local_model_path
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXTS = ["I feel okay today", "I am so worried about tomorrow", "This is wonderful news"]
+# Latency samples kept per role for the percentiles in stats()
+LATENCY_WINDOW = 1000
+
+
+def load_pipeline(name: str):
+    """Local store first (see model_store.py); the hub only when MODEL_OFFLINE is off"""
+    from config import MODEL_DIR, MODEL_OFFLINE, MODEL_VERIFY
+
+    if MODEL_OFFLINE or local_model_path(name, MODEL_DIR).is_dir():
+        classifier, _ = load_local_pipeline(name, MODEL_DIR, verify_files=MODEL_VERIFY)
+        return classifier
+    from transformers import pipeline
+
+    return pipeline("text-classification", model=name, device=-1)  # Force CPU usage
+
+
+def _top_labels(inputs: Any, output: Any) -> List[str]:
+    """Top label per input from a text-classification pipeline result"""
+    if isinstance(output, dict):
+        return [output["label"].lower()]
+    if isinstance(inputs, str):
+        # One input: a list of label dicts (sorted when top_k is given)
+        return [max(output, key=lambda d: d["score"])["label"].lower()]
+    return [_top_labels("", item)[0] for item in output]
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelVersion:
+    __slots__ = ("name", "pipeline", "loaded_at", "load_seconds", "warmup_seconds")
+
+    def __init__(self, name: str, pipeline, load_seconds: float, warmup_seconds: float):
+        self.name = name
+        self.pipeline = pipeline
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+        }
+
+
+class ModelRegistry:
+    def __init__(self, loader: Callable[[str], Any] = load_pipeline, shadow_sample_rate: float = 0.0,
+                 batch_size: Optional[int] = None):
+        self.loader = loader
+        self.shadow_sample_rate = shadow_sample_rate
+        # Pipeline batch size for list inputs (e.g. cascade escalations)
+        self.batch_size = batch_size
+        self.active: Optional[ModelVersion] = None
+        self.shadow: Optional[ModelVersion] = None
+        self.loading: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._load_lock = threading.Lock()
+        self._shadow_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-eval")
+        self._shadow_busy = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._reset_shadow_stats()
+
+    def _reset_shadow_stats(self):
+        with self._stats_lock:
+            self._compared = 0
+            self._agreed = 0
+            self._dropped = 0
+            self._latency = {"active": deque(maxlen=LATENCY_WINDOW), "shadow": deque(maxlen=LATENCY_WINDOW)}
+
+    def _load_version(self, name: str) -> ModelVersion:
+        start = time.perf_counter()
+        pipeline = self.loader(name)
+        loaded = time.perf_counter()
+        # First calls pay for lazy initialization; do that before serving traffic
+        for text in WARMUP_TEXTS:
+            pipeline(text, top_k=1)
+        version = ModelVersion(name, pipeline, loaded - start, time.perf_counter() - loaded)
+        logger.info("Loaded emotion model %s in %.2fs (+%.2fs warmup)", name, version.load_seconds, version.warmup_seconds)
+        return version
+
+    def load(self, name: str) -> ModelVersion:
+        """Load, warm and activate a model, blocking until it is ready"""
+        with self._load_lock:
+            self.active = self._load_version(name)
+        return self.active
+
+    def load_async(self, name: str, shadow: bool = False) -> bool:
+        """Start loading in the background; False if another load is running"""
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        self.loading = {"name": name, "shadow": shadow, "started_at": datetime.now(timezone.utc).isoformat()}
+        threading.Thread(target=self._background_load, args=(name, shadow),
+                         name="model-load", daemon=True).start()
+        return True
+
+    def _background_load(self, name: str, shadow: bool):
+        try:
+            version = self._load_version(name)
+            if shadow:
+                self._reset_shadow_stats()
+                self.shadow = version
+                logger.info("Emotion model %s is now the shadow candidate", name)
+            else:
+                previous, self.active = self.active, version
+                logger.info("Swapped emotion model %s -> %s", previous.name if previous else None, name)
+            self.last_error = None
+        except Exception as e:
+            logger.exception("Loading emotion model %s failed", name)
+            self.last_error = f"{name}: {e}"
+        finally:
+            self.loading = None
+            self._load_lock.release()
+
+    def promote(self) -> ModelVersion:
+        """Make the shadow candidate the active model"""
+        candidate = self.shadow
+        if candidate is None:
+            raise LookupError("No shadow model to promote")
+        self.active, self.shadow = candidate, None
+        logger.info("Promoted shadow emotion model %s", candidate.name)
+        return candidate
+
+    def drop_shadow(self):
+        self.shadow = None
+
+    def __call__(self, inputs, **kwargs):
+        version = self.active
+        if version is None:
+            raise RuntimeError("No emotion model loaded")
+        if self.batch_size and not isinstance(inputs, str):
+            kwargs.setdefault("batch_size", self.batch_size)
+        start = time.perf_counter()
+        output = version.pipeline(inputs, **kwargs)
+        elapsed = time.perf_counter() - start
+        MODEL_INFERENCE_SECONDS.labels("active").observe(elapsed)
+        shadow = self.shadow
+        if shadow is not None and random.random() < self.shadow_sample_rate:
+            self._submit_shadow(shadow, inputs, kwargs, output, elapsed)
+        return output
+
+    def _submit_shadow(self, shadow: ModelVersion, inputs, kwargs, active_output, active_seconds: float):
+        if self._shadow_busy.is_set():
+            with self._stats_lock:
+                self._dropped += 1
+            return
+        self._shadow_busy.set()
+        self._shadow_worker.submit(self._compare, shadow, inputs, kwargs, active_output, active_seconds)
+
+    def _compare(self, shadow: ModelVersion, inputs, kwargs, active_output, active_seconds: float):
+        try:
+            start = time.perf_counter()
+            shadow_output = shadow.pipeline(inputs, **kwargs)
+            shadow_seconds = time.perf_counter() - start
+            MODEL_INFERENCE_SECONDS.labels("shadow").observe(shadow_seconds)
+            agree = [a == b for a, b in zip(_top_labels(inputs, active_output), _top_labels(inputs, shadow_output))]
+            with self._stats_lock:
+                self._compared += len(agree)
+                self._agreed += sum(agree)
+                self._latency["active"].append(active_seconds)
+                self._latency["shadow"].append(shadow_seconds)
+            MODEL_SHADOW_COMPARISONS.labels("agree").inc(sum(agree))
+            MODEL_SHADOW_COMPARISONS.labels("disagree").inc(len(agree) - sum(agree))
+        except Exception as e:
+            logger.warning("Shadow evaluation failed: %s", e)
+        finally:
+            self._shadow_busy.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            latency = {
+                role: {
+                    "p50_ms": None if not samples else round(_percentile(samples, 0.5) * 1000, 3),
+                    "p95_ms": None if not samples else round(_percentile(samples, 0.95) * 1000, 3),
+                }
+                for role, samples in self._latency.items()
+            }
+            shadow_stats = {
+                "sample_rate": self.shadow_sample_rate,
+                "compared": self._compared,
+                "agreement": self._agreed / self._compared if self._compared else None,
+                "dropped_busy": self._dropped,
+                "latency": latency,
+            }
+        return {
+            "active": self.active.describe() if self.active else None,
+            "shadow": self.shadow.describe() if self.shadow else None,
+            "loading": self.loading,
+            "last_error": self.last_error,
+            "shadow_evaluation": shadow_stats,
+        }
+
+
+class LoadRequest(BaseModel):
+    model: str
+    shadow: bool = False
+
+
+def install_model_admin(app: FastAPI, registry: ModelRegistry, admin_token: str):
+    """Register /admin/models endpoints for registry on app"""
+    router = APIRouter(prefix="/admin/models")
+
+    def require_admin(token: Optional[str]):
+        if not admin_token or token is None or not hmac.compare_digest(
+                token.encode("utf-8"), admin_token.encode("utf-8")):
+            raise HTTPException(status_code=403, detail="Admin token required")
+
+    @router.get("")
+    def model_status(x_admin_token: Optional[str] = Header(None)):
+        require_admin(x_admin_token)
+        return registry.stats()
+
+    @router.post("/load", status_code=202)
+    def load_model(request: LoadRequest, x_admin_token: Optional[str] = Header(None)):
+        """Load a model in the background, as the active model or as a shadow candidate"""
+        require_admin(x_admin_token)
+        if not registry.load_async(request.model, shadow=request.shadow):
+            raise HTTPException(status_code=409, detail="Another model is still loading")
+        return {"loading": registry.loading}
+
+    @router.post("/promote")
+    def promote_shadow(x_admin_token: Optional[str] = Header(None)):
+        require_admin(x_admin_token)
+        try:
+            version = registry.promote()
+        except LookupError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"active": version.describe()}
+
+    @router.delete("/shadow")
+    def drop_shadow(x_admin_token: Optional[str] = Header(None)):
+        require_admin(x_admin_token)
+        registry.drop_shadow()
+        return {"shadow": None}
+
+    app.include_router(router)
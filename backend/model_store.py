@@ -0,0 +1,193 @@
+"""
+Local model store for offline, fast cold starts
+
+Production hosts have no network, so models are provisioned ahead of time
+into MODEL_DIR, one directory per model ("org/name" becomes "org--name"):
+
+    python model_store.py provision              # EMOTION_MODEL (+ SHADOW_MODEL, TEMPLATE_EMBEDDING_MODEL)
+    python model_store.py provision --model org/name --revision <commit>
+    python model_store.py verify                 # re-check every file's SHA-256
+
+Provisioning downloads only the files inference needs, converts PyTorch
+.bin weights to safetensors when the hub has no safetensors copy, and
+test-loads the result offline. It then writes provision.json with the
+resolved revision and a SHA-256 per file. load_local_pipeline() loads
+only from that directory, with the hub disabled. It uses safetensors
+(memory-mapped, no pickle) and, when accelerate is installed,
+low_cpu_mem_usage (no throwaway random init), and logs the cold-start time of each phase.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "provision.json"
+# Config, tokenizer and safetensors weights; no TF/Flax/ONNX variants
+ALLOW_PATTERNS = ["*.json", "*.txt", "*.model", "*.safetensors"]
+
+
+class ModelNotProvisioned(RuntimeError):
+    pass
+
+
+def local_model_path(name: str, model_dir) -> Path:
+    return Path(model_dir) / name.replace("/", "--")
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(path: Path) -> Dict[str, str]:
+    return {
+        str(file.relative_to(path)): _sha256(file)
+        for file in sorted(path.rglob("*"))
+        if file.is_file() and file.name != MANIFEST and ".cache" not in file.parts
+    }
+
+
+def verify(name: str, model_dir) -> Dict:
+    """Check a provisioned model against its manifest; raises on any mismatch"""
+    path = local_model_path(name, model_dir)
+    manifest_path = path / MANIFEST
+    if not manifest_path.is_file():
+        raise ModelNotProvisioned(
+            f"{name} is not provisioned in {path}; run `python model_store.py provision --model {name}`"
+        )
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    actual = _checksums(path)
+    expected = manifest["files"]
+    missing = sorted(set(expected) - set(actual))
+    changed = sorted(f for f in expected if f in actual and actual[f] != expected[f])
+    if missing or changed:
+        raise ModelNotProvisioned(f"{name} in {path} failed verification (missing {missing}, changed {changed})")
+    return manifest
+
+
+def provision(name: str, model_dir, revision: Optional[str] = None, encoder: bool = False) -> Dict:
+    """
+    Download, convert to safetensors if needed, test-load and checksum a
+    model; encoder=True for sentence-transformers models (template_index.py)
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    path = local_model_path(name, model_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    info = HfApi().model_info(name, revision=revision)
+    has_safetensors = any(s.rfilename.endswith(".safetensors") for s in info.siblings)
+    patterns = ALLOW_PATTERNS if has_safetensors else ALLOW_PATTERNS + ["pytorch_model.bin"]
+    logger.info("Downloading %s@%s into %s", name, info.sha, path)
+    snapshot_download(name, revision=info.sha, local_dir=path, allow_patterns=patterns)
+
+    if not has_safetensors:
+        from transformers import AutoModel, AutoModelForSequenceClassification
+
+        logger.info("Converting %s weights to safetensors", name)
+        model_class = AutoModel if encoder else AutoModelForSequenceClassification
+        model = model_class.from_pretrained(path, local_files_only=True)
+        model.save_pretrained(path, safe_serialization=True)
+        (path / "pytorch_model.bin").unlink()
+
+    # Prove the directory is self-contained before trusting it offline
+    start = time.perf_counter()
+    if encoder:
+        from template_index import load_encoder
+
+        load_encoder(name, model_dir, offline=True)
+    else:
+        load_local_pipeline(name, model_dir, verify_files=False)
+    manifest = {
+        "model": name,
+        "revision": info.sha,
+        "provisioned_at": datetime.now(timezone.utc).isoformat(),
+        "load_seconds": time.perf_counter() - start,
+        "files": _checksums(path),
+    }
+    (path / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    logger.info("Provisioned %s (%d files)", name, len(manifest["files"]))
+    return manifest
+
+
+def load_local_pipeline(name: str, model_dir, verify_files: bool = False):
+    """
+    text-classification pipeline loaded only from the local store; returns
+    (pipeline, timings). Never contacts the hub.
+    """
+    # Make any accidental hub lookup fail fast instead of waiting on a timeout
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    path = local_model_path(name, model_dir)
+    if not (path / "config.json").is_file():
+        raise ModelNotProvisioned(
+            f"{name} is not provisioned in {path}; run `python model_store.py provision --model {name}`"
+        )
+    timings = {}
+    start = time.perf_counter()
+    if verify_files:
+        verify(name, model_dir)
+        timings["verify_seconds"] = time.perf_counter() - start
+
+    phase = time.perf_counter()
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    from transformers.utils import is_accelerate_available
+    timings["import_seconds"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    # transformers 4.x raises ImportError for low_cpu_mem_usage without accelerate
+    model = AutoModelForSequenceClassification.from_pretrained(
+        path, local_files_only=True, use_safetensors=True,
+        low_cpu_mem_usage=is_accelerate_available()
+    )
+    model.eval()
+    timings["weights_seconds"] = time.perf_counter() - phase
+
+    classifier = pipeline("text-classification", model=model, tokenizer=tokenizer, device=-1)  # Force CPU usage
+    timings["total_seconds"] = time.perf_counter() - start
+    logger.info(
+        "Cold start for %s: %s", name,
+        ", ".join(f"{key.replace('_seconds', '')} {value:.2f}s" for key, value in timings.items())
+    )
+    return classifier, timings
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import EMOTION_MODEL, MODEL_DIR, SHADOW_MODEL, TEMPLATE_EMBEDDING_MODEL, TEMPLATE_INDEX_ENABLED
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Provision and verify local model artifacts")
+    parser.add_argument("command", choices=["provision", "verify"])
+    parser.add_argument("--model", action="append",
+                        help="model to handle (default: EMOTION_MODEL, SHADOW_MODEL and TEMPLATE_EMBEDDING_MODEL)")
+    parser.add_argument("--revision", help="hub revision to pin when provisioning a single model")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    template_model = TEMPLATE_EMBEDDING_MODEL if TEMPLATE_INDEX_ENABLED else None
+    names = args.model or [m for m in (EMOTION_MODEL, SHADOW_MODEL, template_model) if m]
+    failed = False
+    for model_name in names:
+        try:
+            if args.command == "provision":
+                result = provision(model_name, args.model_dir, args.revision if len(names) == 1 else None,
+                                   encoder=model_name == TEMPLATE_EMBEDDING_MODEL)
+            else:
+                result = verify(model_name, args.model_dir)
+            print(f"OK  {model_name}@{result['revision'][:12]} ({len(result['files'])} files)")
+        except Exception as e:
+            failed = True
+            print(f"FAIL {model_name}: {e}")
+    raise SystemExit(1 if failed else 0)
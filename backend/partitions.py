@@ -0,0 +1,173 @@
+"""
+Daily partitions of chat_messages and partition-level retention
+
+chat_messages is range-partitioned on timestamp with one partition per day,
+named chat_messages_YYYYMMDD (migrations/002). ensure_partitions creates
+partitions ahead of time so inserts never miss one; expire_partitions
+removes every partition whose whole day is older than the retention window
+by detaching it and then dropping it (or leaving it detached). Either way
+the cost is a catalog change per day, not a DELETE per message, so cleanup
+no longer generates WAL, dead tuples or vacuum work proportional to traffic.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional
+
+PARENT_TABLE = "chat_messages"
+PARTITION_PREFIX = "chat_messages_"
+# Partition DDL locks chat_messages; give up rather than stall inserts
+LOCK_TIMEOUT = "2s"
+
+logger = logging.getLogger(__name__)
+
+
+def database_now(cursor) -> datetime:
+    """Server time as stored by CURRENT_TIMESTAMP defaults in TIMESTAMP columns"""
+    cursor.execute("SELECT LOCALTIMESTAMP")
+    return cursor.fetchone()[0]
+
+
+def to_database_time(cursor, value: datetime) -> datetime:
+    """
+    An offset-aware datetime as the naive local time LOCALTIMESTAMP would
+    show in the database's TimeZone; naive values are returned unchanged
+    """
+    if value.tzinfo is None:
+        return value
+    cursor.execute("SELECT %s::timestamptz AT TIME ZONE current_setting('TimeZone')", (value,))
+    return cursor.fetchone()[0]
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def attached_partitions(cursor) -> List[date]:
+    """Days that currently have a partition attached, oldest first"""
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+    """, (PARENT_TABLE,))
+    days = []
+    for (name,) in cursor.fetchall():
+        try:
+            days.append(datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date())
+        except ValueError:
+            logger.warning("Ignoring partition with unexpected name %s", name)
+    return sorted(days)
+
+
+def ensure_partitions(cursor, days_ahead: int, now: Optional[datetime] = None) -> List[str]:
+    """Create missing partitions from today through today + days_ahead"""
+    today = (now or database_now(cursor)).date()
+    existing = set(attached_partitions(cursor))
+    created = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if day in existing:
+            continue
+        name = partition_name(day)
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+            "FOR VALUES FROM (%s) TO (%s)",
+            (day, day + timedelta(days=1))
+        )
+        created.append(name)
+    return created
+
+
+def retention_cutoff(cursor, retention_hours: float, now: Optional[datetime] = None) -> datetime:
+    """Messages older than this are past retention"""
+    return (now or database_now(cursor)) - timedelta(hours=retention_hours)
+
+
+def oldest_retained_day(cursor, retention_hours: float, now: Optional[datetime] = None) -> Optional[date]:
+    """Start of the oldest partition that survives expire_partitions"""
+    cutoff = retention_cutoff(cursor, retention_hours, now)
+    for day in attached_partitions(cursor):
+        if datetime.combine(day + timedelta(days=1), datetime.min.time()) > cutoff:
+            return day
+    return None
+
+
+def expiring_partitions(cursor, retention_hours: float, now: Optional[datetime] = None) -> List[date]:
+    """Attached days whose whole partition ends before the retention cutoff"""
+    cutoff = retention_cutoff(cursor, retention_hours, now)
+    return [
+        day for day in attached_partitions(cursor)
+        if datetime.combine(day + timedelta(days=1), datetime.min.time()) <= cutoff
+    ]
+
+
+def _drop_foreign_keys(cursor, table: str):
+    """
+    DETACH turns the inherited session_pk FK (ON DELETE CASCADE) into one of
+    the table's own; drop it so deleting expired sessions cannot cascade
+    into the history a detached partition is kept for
+    """
+    cursor.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, (f'"{table}"',))
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{constraint}"')
+
+
+def expire_partitions(conn, retention_hours: float, mode: str = "drop",
+                      now: Optional[datetime] = None,
+                      before_expire: Optional[Callable[[date], object]] = None,
+                      lock_timeout: str = LOCK_TIMEOUT) -> List[str]:
+    """
+    Detach every partition that ends before the retention cutoff; with
+    mode="drop" also drop it, with mode="detach" keep it as a standalone table
+    without foreign keys, so the later session DELETE leaves it untouched.
+
+    Runs in two phases so the ACCESS EXCLUSIVE lock that DETACH takes on
+    chat_messages is never held across slow work. First before_expire(day)
+    (e.g. archiving) runs for every expiring day, each in its own
+    transaction that holds no DDL locks; if it fails for a day, that day
+    and all later ones are left in place. Then each archived partition is
+    detached and dropped in a short transaction of its own, giving up after
+    lock_timeout instead of queueing inserts behind it. Commits on conn.
+    """
+    if mode not in ("drop", "detach"):
+        raise ValueError(f"Unknown partition retention mode: {mode}")
+    cursor = conn.cursor()
+    days = expiring_partitions(cursor, retention_hours, now)
+    conn.commit()
+
+    if before_expire is not None:
+        for i, day in enumerate(days):
+            try:
+                before_expire(day)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.exception("Keeping %s and later partitions: pre-expiry step failed",
+                                 partition_name(day))
+                days = days[:i]
+                break
+
+    expired = []
+    for day in days:
+        name = partition_name(day)
+        try:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"')
+            if mode == "drop":
+                cursor.execute(f'DROP TABLE "{name}"')
+            else:
+                _drop_foreign_keys(cursor, name)
+            conn.commit()
+        except Exception as e:
+            # Usually a lock timeout under load; the next cleanup retries
+            conn.rollback()
+            logger.warning("Could not expire %s, retrying on the next cleanup: %s", name, e)
+            break
+        expired.append(name)
+    cursor.close()
+    return expired
@@ -0,0 +1,323 @@
+"""
+On-demand request profiling for FeelMate
+
+Profiles selected requests and writes flamegraph-ready files to PROFILE_DIR.
+A request is profiled when it carries "X-Profile: 1" together with a valid
+"X-Admin-Token", or when it hits one of PROFILE_PATHS and wins the
+PROFILE_SAMPLE_RATE draw. Two modes are available:
+
+- "sample": a background thread samples the profiled threads' stacks every
+  PROFILE_INTERVAL_MS and writes collapsed stacks (.collapsed), readable by
+  flamegraph.pl, speedscope or inferno.
+- "cprofile": deterministic cProfile, written as .pstats for snakeviz or
+  gprof2dot.
+
+Only one request is profiled at a time; others proceed unprofiled. Both
+modes observe the event-loop thread, not the request alone: any other
+request whose coroutine runs on the loop while the profile is open shows up
+in it too. Each profile's metadata therefore records "overlapping_requests"
+(other requests in flight at any point during the profile); a profile with
+0 contains only the profiled request. Work the request runs in the thread
+pool through admission.py is wrapped with profiled(), so the pool thread is
+profiled too while it runs that work ("worker_threads" in the metadata).
+Recent profiles are listed and fetched through /admin/profiles.
+"""
+
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from config import (
+    ADMIN_TOKEN, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES,
+    PROFILE_MODE, PROFILE_PATHS, PROFILE_SAMPLE_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_EXTENSIONS = {"sample": ".collapsed", "cprofile": ".pstats"}
+_SAFE_NAME = re.compile(r"^[\w.-]+$")
+
+# A second concurrent cProfile/sampler on the same thread would corrupt both
+_active = threading.Lock()
+# Requests currently inside the middleware, and how many others overlapped
+# the open profile (all mutated on the event-loop thread)
+_in_flight = 0
+_overlapping: Optional[int] = None
+# The open profile, for work the request hands to pool threads (see profiled)
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+class StackSampler:
+    """Samples some threads' Python stacks on an interval and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_ids = {thread_id}
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = current.get(thread_id)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if frames:
+                    self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """
+    One request's profile: the event-loop thread from start to stop, plus
+    every pool thread while it runs work wrapped by profiled()
+    """
+
+    def __init__(self, mode: str, interval: float):
+        self.mode = mode
+        self.threads = 0
+        self._lock = threading.Lock()
+        if mode == "cprofile":
+            self._loop_profile = cProfile.Profile()
+            # Finished per-thread profiles; cProfile only sees the thread that enabled it
+            self._thread_profiles: List[cProfile.Profile] = []
+        else:
+            self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._loop_profile.enable()
+        else:
+            self.sampler.start()
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self._loop_profile.disable()
+        else:
+            self.sampler.stop()
+
+    @contextmanager
+    def thread(self):
+        """Profile the calling thread for the duration of the block"""
+        with self._lock:
+            self.threads += 1
+        if self.mode == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                with self._lock:
+                    self._thread_profiles.append(profile)
+        else:
+            thread_id = threading.get_ident()
+            self.sampler.thread_ids.add(thread_id)
+            try:
+                yield
+            finally:
+                self.sampler.thread_ids.discard(thread_id)
+
+    def write(self, path: str) -> Optional[int]:
+        """Write the data file; returns the sample count (None for cprofile)"""
+        if self.mode == "cprofile":
+            stats = pstats.Stats(self._loop_profile)
+            with self._lock:
+                for profile in self._thread_profiles:
+                    stats.add(profile)
+            stats.dump_stats(path)
+            return None
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+        return sum(self.sampler.stacks.values())
+
+
+def profiled(func: Callable) -> Callable:
+    """
+    func, profiled on whatever thread runs it when the calling request is
+    being profiled. Used by admission.py for work sent to the thread pool,
+    which the event-loop profile would otherwise miss.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return func
+
+    def run(*args, **kwargs):
+        with profile.thread():
+            return func(*args, **kwargs)
+
+    return run
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    # Constant-time comparison, so response timing does not leak the token
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(
+        token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def _should_profile(request: Request) -> bool:
+    if request.headers.get("x-profile") == "1":
+        return _is_admin(request.headers.get("x-admin-token"))
+    return (
+        PROFILE_SAMPLE_RATE > 0
+        and request.url.path in PROFILE_PATHS
+        and random.random() < PROFILE_SAMPLE_RATE
+    )
+
+
+def _prune_old_profiles():
+    profiles = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        with open(entry.path, "r", encoding="utf-8") as f:
+            data_file = json.load(f).get("file")
+        for path in (entry.path, os.path.join(PROFILE_DIR, data_file or "")):
+            if os.path.isfile(path):
+                os.remove(path)
+
+
+def _write_profile(request: Request, status: int, duration: float, profile: RequestProfile,
+                   overlapping: int) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w]+", "-", request.url.path).strip("-") or "root"
+    profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.method.lower()}-{slug}"
+    data_file = profile_id + _PROFILE_EXTENSIONS[PROFILE_MODE]
+
+    samples = profile.write(os.path.join(PROFILE_DIR, data_file))
+
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "id": profile_id,
+            "file": data_file,
+            "mode": PROFILE_MODE,
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "duration_ms": duration * 1000,
+            "samples": samples,
+            "worker_threads": profile.threads,
+            # Profiles cover the whole event-loop thread; see the module docstring
+            "scope": "event-loop",
+            "overlapping_requests": overlapping,
+            "created_at": datetime.now().isoformat(),
+        }, f, indent=2)
+
+    _prune_old_profiles()
+    return profile_id
+
+
+async def profiling_middleware(request: Request, call_next):
+    global _in_flight, _overlapping
+    if _overlapping is not None:
+        _overlapping += 1
+    _in_flight += 1
+    try:
+        if not _should_profile(request) or not _active.acquire(blocking=False):
+            return await call_next(request)
+        try:
+            return await _profile(request, call_next)
+        finally:
+            _overlapping = None
+            _active.release()
+    finally:
+        _in_flight -= 1
+
+
+async def _profile(request: Request, call_next):
+    global _overlapping
+    # Requests already in flight share the loop with this one from the start
+    _overlapping = _in_flight - 1
+    # The endpoint (and any sync work it does inline) runs on this thread;
+    # pool work joins the profile through profiled()
+    profile = RequestProfile(PROFILE_MODE, PROFILE_INTERVAL_MS / 1000)
+    token = _current_profile.set(profile)
+    profile.start()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        duration = time.perf_counter() - start
+        profile.stop()
+        _current_profile.reset(token)
+
+    try:
+        response.headers["X-Profile-Id"] = _write_profile(request, response.status_code, duration,
+                                                          profile, _overlapping)
+    except OSError as e:
+        logger.warning("Could not write profile: %s", e)
+    return response
+
+
+def _require_admin(token: Optional[str]):
+    if not _is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/admin/profiles")
+
+
+@router.get("")
+def list_profiles(limit: int = 20, x_admin_token: Optional[str] = Header(None)) -> Dict[str, List[Dict]]:
+    """Most recent profiles first"""
+    _require_admin(x_admin_token)
+    if not os.path.isdir(PROFILE_DIR):
+        return {"profiles": []}
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.name.endswith(".json"):
+            with open(entry.path, "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return {"profiles": profiles[:limit]}
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Download the profile data file (.collapsed or .pstats)"""
+    _require_admin(x_admin_token)
+    if not _SAFE_NAME.match(profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    metadata_path = os.path.join(PROFILE_DIR, profile_id + ".json")
+    if not os.path.isfile(metadata_path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        data_file = json.load(f)["file"]
+    return FileResponse(os.path.join(PROFILE_DIR, data_file), filename=data_file)
+
+
+def install_profiling(app: FastAPI):
+    """Register the profiling middleware and the admin endpoints on an app"""
+    app.middleware("http")(profiling_middleware)
+    app.include_router(router)
@@ -5,17 +5,29 @@ CPU-only version with frontend integration
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from typing import Optional
 import uvicorn
 import logging
 
+# Configure logging before the chatbot starts loading models
+from logging_config import setup_logging, install_request_logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Tuned torch thread counts must be applied before the chatbot imports torch
+from config import TUNING_FILE
+from autotune import apply_tuning, load_tuning
+apply_tuning(TUNING_FILE)
+
 # Import our production chatbot
 from chatbot import get_chatbot, ChatMessage, ChatResponse
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+import metrics
+from admission import AdmissionController, Overloaded
+from health import HealthProber
+from model_registry import install_model_admin
+from profiling import install_profiling
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -25,7 +37,11 @@ app = FastAPI(
 )
 
 # Import configuration
-from config import FRONTEND_URLS, DEBUG
+from config import (
+    FRONTEND_URLS, DEBUG,
+    INFERENCE_MAX_IN_FLIGHT, INFERENCE_MAX_QUEUE, INFERENCE_QUEUE_TIMEOUT, HEALTH_PROBE_INTERVAL,
+    ADMIN_TOKEN
+)
 
 # Add CORS middleware for frontend integration
 app.add_middleware(
@@ -36,15 +52,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling and /admin/profiles endpoints
+install_profiling(app)
+
+# Request IDs for log correlation (registered last so it wraps everything)
+install_request_logging(app)
+
 # Get production chatbot instance
 chatbot = get_chatbot()
 
+# /admin/models: background model loads, shadow evaluation and promotion
+install_model_admin(app, chatbot.models, ADMIN_TOKEN)
+
+# Bound concurrent inference; shed excess load with 503 + Retry-After
+admission = AdmissionController(
+    max_in_flight=INFERENCE_MAX_IN_FLIGHT,
+    max_queue=INFERENCE_MAX_QUEUE,
+    queue_timeout=INFERENCE_QUEUE_TIMEOUT
+)
+
+# Dependencies are probed in the background; /health serves the cached result
+health = HealthProber(interval=HEALTH_PROBE_INTERVAL)
+
+def check_model():
+    # Calls the active pipeline directly so probes don't count in cascade or shadow metrics
+    version = chatbot.models.active
+    if version is None:
+        return {"backend": "keyword fallback"}
+    result = version.pipeline("I feel okay today", top_k=1)[0]
+    return {"backend": "transformer", "model": version.name, "emotion": result["label"].lower()}
+
+def check_queue():
+    details = {
+        "in_flight": admission.in_flight,
+        "queued": admission.queued,
+        "max_queue": admission.max_queue,
+    }
+    if admission.queued >= admission.max_queue:
+        raise RuntimeError(f"inference queue full ({admission.queued}/{admission.max_queue})")
+    return details
+
+health.add_check("model", check_model)
+# A full queue sheds load by itself; report it without draining the worker
+health.add_check("queue", check_queue, critical=False)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize chatbot on startup"""
     logger.info("🚀 Starting FeelMate Production Emotion-Aware Chatbot...")
     logger.info("✅ Server ready to accept requests")
     logger.info("💡 Using CPU-only emotion detection with intelligent response templates")
+    health.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    health.stop()
 
 @app.get("/")
 async def root():
@@ -64,20 +126,29 @@ async def root():
             "/chat/invoke": "POST - Send a message and get response",
             "/api/chat/send-message": "POST - Frontend compatibility endpoint",
             "/health": "GET - Check server health",
+            "/metrics": "GET - Prometheus metrics",
             "/docs": "GET - API documentation"
         }
     }
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "service": "FeelMate Production Chatbot",
-        "model": "CPU-only emotion detection",
-        "version": "1.0.0",
-        "timestamp": "2024-01-01T00:00:00Z"
-    }
+    """Cached result of the background dependency probes"""
+    status_code, body = health.snapshot()
+    body.update({"service": "FeelMate Production Chatbot", "version": "1.0.0"})
+    return JSONResponse(body, status_code=status_code)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/cascade/metrics")
+async def cascade_metrics():
+    """Escalation and agreement metrics for the cascade classifier"""
+    if not chatbot.cascade:
+        return {"enabled": False}
+    return {"enabled": True, **chatbot.cascade.get_metrics()}
 
 @app.post("/chat/invoke")
 async def chat_invoke(request: ChatMessage) -> ChatResponse:
@@ -92,21 +163,30 @@ async def chat_invoke(request: ChatMessage) -> ChatResponse:
     5. Returns structured response with emotion data
     """
     try:
-        logger.info(f"Processing message from user {request.user_id}")
+        logger.info("Processing message from user %s", request.user_id)
         
-        # Process the message through our production chatbot
-        response = chatbot.chat(
+        # Crisis messages jump the queue and are never shed
+        response = await admission.run(
+            chatbot.chat,
             user_message=request.message,
             user_id=request.user_id,
-            session_id=request.session_id
+            session_id=request.session_id,
+            priority=chatbot.detect_crisis(request.message)
         )
         
-        logger.info(f"Generated response with emotion: {response.emotion}, severity: {response.severity}")
+        logger.info("Generated response with emotion: %s, severity: %s", response.emotion, response.severity)
         
         return response
         
+    except Overloaded as e:
+        logger.warning("Shedding chat request: %s", e.reason)
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        logger.error(f"Error processing chat request: {e}")
+        logger.exception("Error processing chat request: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -125,11 +205,16 @@ if __name__ == "__main__":
     # Import configuration
     from config import HOST, PORT, RELOAD, LOG_LEVEL
     
+    # Worker processes from `python autotune.py`; reload mode needs a single process
+    tuning = load_tuning(TUNING_FILE)
+    workers = tuning["workers"] if tuning and not RELOAD else 1
+    
     # Run the production server
     uvicorn.run(
         "server:app",
         host=HOST,
         port=PORT,  # Match the port expected by your frontend
         reload=RELOAD,  # Use config for reload setting
-        log_level=LOG_LEVEL
+        workers=workers,
+        log_level=LOG_LEVEL.lower()
     )
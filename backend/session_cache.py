@@ -0,0 +1,95 @@
+"""
+In-process write-through cache of active chat sessions
+
+Holds the active flag, last activity and current emotion for recently used
+sessions so a message on a hot session is validated without touching
+Postgres. Entries expire after the session inactivity timeout, the same rule
+cleanup_expired_sessions applies in the database, so a cached session is
+never considered active longer than the database would allow. Writers update
+Postgres first and then the cache (write-through).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import record_cache
+
+
+class CachedSession:
+    __slots__ = ("session_id", "pk", "user_id", "is_active", "last_activity", "current_emotion", "severity_level")
+
+    def __init__(self, session_id: str, pk: Optional[int], user_id: Optional[str], last_activity: float,
+                 current_emotion: Optional[str] = None, severity_level: Optional[str] = None):
+        self.session_id = session_id
+        # chat_sessions.id, the surrogate key chat_messages references
+        self.pk = pk
+        self.user_id = user_id
+        self.is_active = True
+        # time.monotonic() of the last message, for TTL checks
+        self.last_activity = last_activity
+        self.current_emotion = current_emotion
+        self.severity_level = severity_level
+
+
+class SessionCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[CachedSession]:
+        """Active, unexpired session or None; records a hit or miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and (not entry.is_active or now - entry.last_activity >= self.ttl_seconds):
+                del self._entries[session_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+        record_cache("session", entry is not None)
+        return entry
+
+    def peek(self, session_id: str) -> Optional[CachedSession]:
+        """Cached entry regardless of expiry, without recording a hit or miss"""
+        with self._lock:
+            return self._entries.get(session_id)
+
+    def put(self, session_id: str, pk: Optional[int], user_id: Optional[str], idle_seconds: float = 0.0,
+            current_emotion: Optional[str] = None, severity_level: Optional[str] = None):
+        """Cache a session known to be active, idle for idle_seconds"""
+        if idle_seconds >= self.ttl_seconds:
+            return
+        entry = CachedSession(session_id, pk, user_id, time.monotonic() - idle_seconds,
+                              current_emotion, severity_level)
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, session_id: str, current_emotion: Optional[str] = None,
+              severity_level: Optional[str] = None):
+        """Mirror a committed activity/emotion update into the cache"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            entry.last_activity = time.monotonic()
+            if current_emotion is not None:
+                entry.current_emotion = current_emotion
+                entry.severity_level = severity_level
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -38,6 +38,38 @@ def create_directories():
         Path(dir_name).mkdir(exist_ok=True)
         print(f"✅ Created directory: {dir_name}")
 
+def check_models():
+    """Check that the emotion model is provisioned locally (offline hosts can't download it)"""
+    from config import EMOTION_MODEL, MODEL_DIR, MODEL_OFFLINE
+    from model_store import ModelNotProvisioned, verify
+
+    try:
+        manifest = verify(EMOTION_MODEL, MODEL_DIR)
+    except ModelNotProvisioned as e:
+        if not MODEL_OFFLINE:
+            print(f"⚠️  {e}; it will be downloaded from the Hugging Face hub")
+            return True
+        print(f"❌ {e}")
+        print("On a host with network access run: python model_store.py provision, then copy the model directory here")
+        return False
+    print(f"✅ Model {EMOTION_MODEL}@{manifest['revision'][:12]} provisioned and verified")
+    return True
+
+def check_tuning():
+    """Report the CPU tuning server.py will apply, and pass its thread count to the server"""
+    from config import TUNING_FILE
+    from autotune import THREAD_ENV_VARS, load_tuning
+
+    tuning = load_tuning(TUNING_FILE)
+    if tuning is None:
+        print("💡 No CPU tuning for this machine; run `python autotune.py` to tune threads, workers and batch size")
+        return
+    # OpenMP reads these when the server process starts
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(tuning["torch_intra_op_threads"])
+    print(f"✅ CPU tuning: {tuning['torch_intra_op_threads']} intra-op / {tuning['torch_inter_op_threads']} inter-op "
+          f"threads, {tuning['workers']} worker(s), batch size {tuning['batch_size']}")
+
 def check_port_availability(port=8001):
     """Check if the required port is available"""
     import socket
@@ -83,6 +115,13 @@ def main():
     # Create directories
     create_directories()
     
+    # Check local model artifacts
+    if not check_models():
+        sys.exit(1)
+    
+    # Apply tuned CPU settings
+    check_tuning()
+    
     # Check port availability
     if not check_port_availability():
         sys.exit(1)
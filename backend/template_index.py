@@ -0,0 +1,191 @@
+"""
+Embedding index for response-template selection
+
+Every response template is embedded once, offline, into one L2-normalized
+float32 matrix with a contiguous row range per emotion:
+
+    python template_index.py build    # embed chatbot.RESPONSE_TEMPLATES
+    python template_index.py bench    # compare with random.choice
+
+The matrix is cached on disk with a fingerprint of the encoder name and the
+template texts, so editing a template triggers a rebuild instead of silently
+serving stale rows. At runtime the message is encoded once and the best
+template is the argmax of a single matrix-vector product over its emotion's
+rows; with normalized vectors that is cosine similarity.
+
+The encoder is a sentence-transformers model from the local model store
+(see model_store.py). If it or the cache is unavailable the chatbot keeps
+its random.choice selection.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from model_store import local_model_path
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(model_name: str, groups: Dict[str, Sequence[str]]) -> str:
+    payload = json.dumps({"model": model_name, "groups": groups}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_encoder(name: str, model_dir, offline: bool = True):
+    """SentenceTransformer from the local store, or the hub when not offline"""
+    from sentence_transformers import SentenceTransformer
+
+    path = local_model_path(name, model_dir)
+    if path.is_dir():
+        return SentenceTransformer(str(path), device="cpu")
+    if offline:
+        raise FileNotFoundError(
+            f"{name} is not provisioned in {path}; run `python model_store.py provision --model {name}`"
+        )
+    return SentenceTransformer(name, device="cpu")
+
+
+class TemplateIndex:
+    """Normalized template embeddings with one row range per group"""
+
+    def __init__(self, groups: Dict[str, Sequence[str]], embeddings: np.ndarray,
+                 model_name: str, encoder=None):
+        self.templates: List[str] = []
+        self.ranges: Dict[str, tuple] = {}
+        for group, templates in groups.items():
+            start = len(self.templates)
+            self.templates.extend(templates)
+            self.ranges[group] = (start, len(self.templates))
+        if embeddings.shape[0] != len(self.templates):
+            raise ValueError(f"{embeddings.shape[0]} embeddings for {len(self.templates)} templates")
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.model_name = model_name
+        self.fingerprint = fingerprint(model_name, {g: list(t) for g, t in groups.items()})
+        self.encoder = encoder
+
+    def encode(self, text: str) -> np.ndarray:
+        return self.encoder.encode([text], normalize_embeddings=True, convert_to_numpy=True,
+                                   show_progress_bar=False)[0]
+
+    def select_embedding(self, group: str, query: np.ndarray) -> Optional[str]:
+        """Best template of a group for an already normalized message embedding"""
+        bounds = self.ranges.get(group)
+        if bounds is None:
+            return None
+        start, end = bounds
+        return self.templates[start + int(np.argmax(self.embeddings[start:end] @ query))]
+
+    def select(self, group: str, text: str) -> Optional[str]:
+        """Best template of a group for a message; None if the group is unknown"""
+        if group not in self.ranges:
+            return None
+        return self.select_embedding(group, self.encode(text))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.stem}.tmp.npz")
+        np.savez(
+            tmp,
+            embeddings=self.embeddings,
+            fingerprint=np.array(self.fingerprint),
+            model=np.array(self.model_name),
+        )
+        os.replace(tmp, path)
+
+
+def build_index(groups: Dict[str, Sequence[str]], encoder, model_name: str,
+                path=None, batch_size: int = 64) -> TemplateIndex:
+    """Embed every template in one batched encode and optionally cache the matrix"""
+    templates = [template for group in groups.values() for template in group]
+    start = time.perf_counter()
+    embeddings = encoder.encode(templates, batch_size=batch_size, normalize_embeddings=True,
+                                convert_to_numpy=True, show_progress_bar=False)
+    index = TemplateIndex(groups, embeddings, model_name, encoder=encoder)
+    logger.info("Embedded %d templates with %s in %.2fs", len(templates), model_name,
+                time.perf_counter() - start)
+    if path:
+        index.save(path)
+    return index
+
+
+def load_index(groups: Dict[str, Sequence[str]], model_name: str, model_dir, path,
+               offline: bool = True, rebuild: bool = True) -> TemplateIndex:
+    """
+    Cached index for these templates; rebuilt (and re-cached) when the file
+    is missing or was built from other templates or another encoder
+    """
+    encoder = load_encoder(model_name, model_dir, offline=offline)
+    path = Path(path)
+    if path.is_file():
+        cached = np.load(path, allow_pickle=False)
+        if str(cached["fingerprint"]) == fingerprint(model_name, {g: list(t) for g, t in groups.items()}):
+            return TemplateIndex(groups, cached["embeddings"], model_name, encoder=encoder)
+        if not rebuild:
+            raise ValueError(f"{path} was built from different templates or encoder")
+        logger.info("%s is stale, re-embedding templates", path)
+    elif not rebuild:
+        raise FileNotFoundError(f"{path} not found; run `python template_index.py build`")
+    return build_index(groups, encoder, model_name, path)
+
+
+def benchmark(index: TemplateIndex, messages: Sequence[str], repeats: int = 5) -> Dict:
+    """Per-message cost of random.choice vs encode + dot-product selection"""
+    emotions = list(index.ranges)
+    cases = [(emotions[i % len(emotions)], message) for i, message in enumerate(messages)]
+    groups = {g: index.templates[s:e] for g, (s, e) in index.ranges.items()}
+    queries = [index.encode(message) for _, message in cases]
+
+    def best_of(func) -> float:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return 1e6 * best / len(cases)
+
+    results = {
+        "messages": len(cases),
+        "templates": len(index.templates),
+        "dimensions": int(index.embeddings.shape[1]),
+        "random_choice_us": best_of(lambda: [random.choice(groups[g]) for g, _ in cases]),
+        "dot_product_us": best_of(lambda: [index.select_embedding(g, q) for (g, _), q in zip(cases, queries)]),
+        "encode_and_select_us": best_of(lambda: [index.select(g, m) for g, m in cases]),
+    }
+    # Extra cost of choosing by similarity once the message is encoded
+    results["selection_overhead_us"] = results["dot_product_us"] - results["random_choice_us"]
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from config import MODEL_DIR, MODEL_OFFLINE, TEMPLATE_EMBEDDING_MODEL, TEMPLATE_INDEX_FILE
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or benchmark the response-template embedding index")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--model", default=TEMPLATE_EMBEDDING_MODEL)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--output", default=TEMPLATE_INDEX_FILE)
+    args = parser.parse_args()
+
+    from chatbot import RESPONSE_TEMPLATES
+
+    if args.command == "build":
+        index = build_index(RESPONSE_TEMPLATES, load_encoder(args.model, args.model_dir, MODEL_OFFLINE),
+                            args.model, args.output)
+        print(f"Saved {index.embeddings.shape[0]}x{index.embeddings.shape[1]} template matrix to {args.output}")
+    else:
+        from benchmarks.corpora import LONG_MESSAGES, SHORT_MESSAGES
+
+        index = load_index(RESPONSE_TEMPLATES, args.model, args.model_dir, args.output, MODEL_OFFLINE)
+        print(json.dumps(benchmark(index, SHORT_MESSAGES + LONG_MESSAGES), indent=2))
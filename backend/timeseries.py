@@ -0,0 +1,82 @@
+"""
+Pre-aggregated emotion time series
+
+save_message bumps one minute bucket per user message in emotion_buckets
+(migrations/003), in the same transaction as the message insert. rollup()
+downsamples as data ages: minute buckets older than
+TIMESERIES_MINUTE_RETENTION_HOURS are summed into hour buckets, and hour
+buckets older than TIMESERIES_HOUR_RETENTION_DAYS into day buckets. A
+message is counted in exactly one tier, so query() sums every tier and
+stays exact. Data that has been rolled up is reported at the start of its
+coarser bucket even when a finer granularity is requested.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+GRANULARITIES = ("minute", "hour", "day")
+STEP = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+UNKNOWN = "unknown"
+
+
+def record_message(cursor, emotion, severity):
+    """Count one user message in the current minute bucket"""
+    cursor.execute("""
+        INSERT INTO emotion_buckets (resolution, bucket_start, emotion, severity, count)
+        VALUES ('minute', date_trunc('minute', LOCALTIMESTAMP), %s, %s, 1)
+        ON CONFLICT (resolution, bucket_start, emotion, severity)
+        DO UPDATE SET count = emotion_buckets.count + 1
+    """, (emotion or UNKNOWN, severity or UNKNOWN))
+
+
+def _roll(cursor, source: str, target: str, cutoff: datetime) -> int:
+    cursor.execute("""
+        WITH moved AS (
+            DELETE FROM emotion_buckets
+            WHERE resolution = %s AND bucket_start < %s
+            RETURNING bucket_start, emotion, severity, count
+        )
+        INSERT INTO emotion_buckets (resolution, bucket_start, emotion, severity, count)
+        SELECT %s, date_trunc(%s, bucket_start), emotion, severity, SUM(count)
+        FROM moved
+        GROUP BY 2, 3, 4
+        ON CONFLICT (resolution, bucket_start, emotion, severity)
+        DO UPDATE SET count = emotion_buckets.count + EXCLUDED.count
+    """, (source, cutoff, target, target))
+    return cursor.rowcount
+
+
+def rollup(cursor, now: datetime, minute_retention_hours: float, hour_retention_days: float) -> int:
+    """Downsample aged buckets; returns the number of coarser buckets written"""
+    written = _roll(cursor, "minute", "hour", now - timedelta(hours=minute_retention_hours))
+    written += _roll(cursor, "hour", "day", now - timedelta(days=hour_retention_days))
+    return written
+
+
+def bucket_count(start: datetime, end: datetime, granularity: str) -> int:
+    return max(0, int((end - start) / STEP[granularity]))
+
+
+def query(cursor, start: datetime, end: datetime, granularity: str) -> List[Dict]:
+    """Per-bucket emotion and severity counts for [start, end), oldest first"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    cursor.execute("""
+        SELECT date_trunc(%s, bucket_start) AS bucket, emotion, severity, SUM(count)
+        FROM emotion_buckets
+        WHERE bucket_start >= %s AND bucket_start < %s
+        GROUP BY 1, 2, 3
+        ORDER BY 1
+    """, (granularity, start, end))
+    series: Dict[datetime, Dict] = {}
+    for bucket, emotion, severity, count in cursor.fetchall():
+        point = series.get(bucket)
+        if point is None:
+            point = series[bucket] = {
+                "bucket": bucket.isoformat(), "total": 0, "emotions": {}, "severities": {}
+            }
+        count = int(count)
+        point["total"] += count
+        point["emotions"][emotion] = point["emotions"].get(emotion, 0) + count
+        point["severities"][severity] = point["severities"].get(severity, 0) + count
+    return list(series.values())
@@ -0,0 +1,274 @@
+"""
+Per-user emotional trajectory, maintained incrementally
+
+Every saved user message folds into one user_trajectories row
+(migrations/004) with a single upsert. The upsert increments the emotion
+and severity frequencies and tracks the current and longest run of
+high/critical messages. It also updates an exponentially decayed mood
+score. The score is kept as two decayed sums, so reading it is a division:
+
+    decay       = 0.5 ** (hours since last message / half-life)
+    mood_sum    = mood_sum * decay + valence(emotion)
+    mood_weight = mood_weight * decay + 1
+    mood_score  = mood_sum / mood_weight       (-1 very negative .. 1 positive)
+
+Reading a trajectory is a primary-key lookup, independent of how many
+sessions or messages the user has. `python trajectory.py --backfill`
+rebuilds the table with the same fold, reading expired days from the
+Parquet archive (archive.py) and the rest from chat_messages. It refuses
+to run when older history has been expired without an archive.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Valence per emotion label, covering the keyword classifier in app/main.py
+# and the transformer/TF-IDF labels used by chatbot.py
+VALENCE = {
+    "happy": 1.0, "joy": 1.0,
+    "surprise": 0.2,
+    "neutral": 0.0, "supportive": 0.0,
+    "confused": -0.2,
+    "disgust": -0.5,
+    "anxious": -0.6, "fear": -0.6,
+    "angry": -0.6, "anger": -0.6,
+    "sad": -0.8, "sadness": -0.8,
+    "crisis": -1.0,
+}
+SEVERE_LEVELS = ("high", "critical")
+UNKNOWN = "unknown"
+
+
+def valence(emotion: Optional[str]) -> float:
+    return VALENCE.get(emotion or UNKNOWN, 0.0)
+
+
+def record_message(cursor, user_id: str, emotion: Optional[str], severity: Optional[str],
+                   half_life_hours: float):
+    """Fold one user message into the user's trajectory (row-locked upsert)"""
+    emotion = emotion or UNKNOWN
+    severity = severity or UNKNOWN
+    cursor.execute("""
+        INSERT INTO user_trajectories AS t (
+            user_id, message_count, emotion_counts, severity_counts, mood_sum, mood_weight,
+            severe_streak, longest_severe_streak, last_emotion, last_severity, first_seen, last_seen
+        )
+        VALUES (
+            %(user_id)s, 1, jsonb_build_object(%(emotion)s::text, 1), jsonb_build_object(%(severity)s::text, 1),
+            %(valence)s, 1, %(severe)s::int, %(severe)s::int, %(emotion)s, %(severity)s,
+            LOCALTIMESTAMP, LOCALTIMESTAMP
+        )
+        ON CONFLICT (user_id) DO UPDATE SET
+            message_count = t.message_count + 1,
+            emotion_counts = t.emotion_counts || jsonb_build_object(
+                %(emotion)s::text, COALESCE((t.emotion_counts ->> %(emotion)s)::bigint, 0) + 1),
+            severity_counts = t.severity_counts || jsonb_build_object(
+                %(severity)s::text, COALESCE((t.severity_counts ->> %(severity)s)::bigint, 0) + 1),
+            mood_sum = t.mood_sum * power(0.5, GREATEST(EXTRACT(EPOCH FROM LOCALTIMESTAMP - t.last_seen), 0)
+                                                / 3600.0 / %(half_life)s) + %(valence)s,
+            mood_weight = t.mood_weight * power(0.5, GREATEST(EXTRACT(EPOCH FROM LOCALTIMESTAMP - t.last_seen), 0)
+                                                      / 3600.0 / %(half_life)s) + 1,
+            severe_streak = CASE WHEN %(severe)s THEN t.severe_streak + 1 ELSE 0 END,
+            longest_severe_streak = GREATEST(t.longest_severe_streak,
+                                             CASE WHEN %(severe)s THEN t.severe_streak + 1 ELSE 0 END),
+            last_emotion = %(emotion)s,
+            last_severity = %(severity)s,
+            last_seen = LOCALTIMESTAMP
+    """, {
+        "user_id": user_id, "emotion": emotion, "severity": severity,
+        "valence": valence(emotion), "severe": severity in SEVERE_LEVELS,
+        "half_life": half_life_hours,
+    })
+
+
+def get_trajectory(cursor, user_id: str) -> Optional[Dict]:
+    cursor.execute("""
+        SELECT message_count, emotion_counts, severity_counts, mood_sum, mood_weight,
+               severe_streak, longest_severe_streak, last_emotion, last_severity, first_seen, last_seen
+        FROM user_trajectories
+        WHERE user_id = %s
+    """, (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    (count, emotion_counts, severity_counts, mood_sum, mood_weight,
+     streak, longest_streak, last_emotion, last_severity, first_seen, last_seen) = row
+    return {
+        "user_id": user_id,
+        "message_count": count,
+        "emotion_frequencies": {emotion: n / count for emotion, n in emotion_counts.items()},
+        "emotion_counts": emotion_counts,
+        "severity_counts": severity_counts,
+        "dominant_emotion": max(emotion_counts, key=emotion_counts.get) if emotion_counts else None,
+        "mood_score": mood_sum / mood_weight if mood_weight else 0.0,
+        "severe_streak": streak,
+        "longest_severe_streak": longest_streak,
+        "last_emotion": last_emotion,
+        "last_severity": last_severity,
+        "first_seen": first_seen.isoformat(),
+        "last_seen": last_seen.isoformat(),
+    }
+
+
+class _Fold:
+    """In-memory version of record_message's upsert, for the backfill"""
+
+    __slots__ = ("count", "emotions", "severities", "mood_sum", "mood_weight",
+                 "streak", "longest", "last_emotion", "last_severity", "first_seen", "last_seen")
+
+    def __init__(self, first_seen: datetime):
+        self.count = 0
+        self.emotions: Dict[str, int] = {}
+        self.severities: Dict[str, int] = {}
+        self.mood_sum = 0.0
+        self.mood_weight = 0.0
+        self.streak = 0
+        self.longest = 0
+        self.last_emotion = None
+        self.last_severity = None
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+
+    def add(self, emotion: Optional[str], severity: Optional[str], timestamp: datetime, half_life_hours: float):
+        emotion = emotion or UNKNOWN
+        severity = severity or UNKNOWN
+        hours = max((timestamp - self.last_seen).total_seconds(), 0) / 3600.0
+        decay = 0.5 ** (hours / half_life_hours)
+        self.count += 1
+        self.emotions[emotion] = self.emotions.get(emotion, 0) + 1
+        self.severities[severity] = self.severities.get(severity, 0) + 1
+        self.mood_sum = self.mood_sum * decay + valence(emotion)
+        self.mood_weight = self.mood_weight * decay + 1
+        self.streak = self.streak + 1 if severity in SEVERE_LEVELS else 0
+        self.longest = max(self.longest, self.streak)
+        self.last_emotion = emotion
+        self.last_severity = severity
+        self.last_seen = timestamp
+
+    def row(self, user_id: str) -> tuple:
+        return (user_id, self.count, json.dumps(self.emotions), json.dumps(self.severities),
+                self.mood_sum, self.mood_weight, self.streak, self.longest,
+                self.last_emotion, self.last_severity, self.first_seen, self.last_seen)
+
+
+def _archived_user_messages(root, day) -> List[tuple]:
+    """One archived day's user messages in the order they were saved"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    from archive import scan_messages
+
+    columns = ["message_id", "user_id", "sender", "emotion", "severity", "timestamp"]
+    table = pa.Table.from_batches(list(scan_messages(root, start=day, end=day, columns=columns)))
+    if table.num_rows == 0:
+        return []
+    table = table.filter(pc.equal(table["sender"], "user"))
+    table = table.sort_by([("timestamp", "ascending"), ("message_id", "ascending")])
+    return list(zip(*(table[name].to_pylist() for name in ("user_id", "emotion", "severity", "timestamp"))))
+
+
+def backfill(conn, half_life_hours: float, archive_root=None, force: bool = False,
+             fetch_rows: int = 5000) -> int:
+    """
+    Rebuild user_trajectories from the Parquet archive (days whose partition
+    has been expired) followed by the live chat_messages partitions; returns
+    users written. Holds an EXCLUSIVE lock on user_trajectories, so
+    concurrent save_message calls wait and then apply on top of the rebuilt
+    rows.
+
+    Without an archive, history older than retention is gone, and a rebuild
+    would shrink every trajectory to the retained window. In that case
+    (existing trajectories start before the oldest day still available) it
+    raises RuntimeError instead, unless force is set.
+    """
+    from psycopg2.extras import execute_values
+
+    from partitions import attached_partitions
+
+    cursor = conn.cursor()
+    cursor.execute("LOCK TABLE user_trajectories IN EXCLUSIVE MODE")
+    live_days = attached_partitions(cursor)
+    archived = []
+    if archive_root:
+        from archive import archived_days
+
+        # A day that failed to detach is both archived and live; read it live only
+        archived = [day for day in archived_days(archive_root) if day not in set(live_days)]
+    available = sorted(archived + live_days)
+    cursor.execute("SELECT MIN(first_seen) FROM user_trajectories")
+    first_seen = cursor.fetchone()[0]
+    if not force and first_seen is not None and (not available or first_seen.date() < available[0]):
+        conn.rollback()
+        cursor.close()
+        raise RuntimeError(
+            f"user_trajectories go back to {first_seen:%Y-%m-%d} but history is only available from "
+            f"{available[0] if available else 'nowhere'}; rebuilding would drop expired messages "
+            "(enable the archive, or pass force to rebuild from what is left)"
+        )
+
+    folds: Dict[str, _Fold] = {}
+
+    def fold_row(user_id, emotion, severity, timestamp):
+        fold = folds.get(user_id)
+        if fold is None:
+            fold = folds[user_id] = _Fold(timestamp)
+        fold.add(emotion, severity, timestamp, half_life_hours)
+
+    # Days are folded oldest first, so each user's messages arrive in time order
+    for day in archived:
+        for row in _archived_user_messages(archive_root, day):
+            fold_row(*row)
+    stream = conn.cursor(name="trajectory_backfill")
+    stream.itersize = fetch_rows
+    stream.execute("""
+        SELECT s.user_id, m.emotion, m.severity, m.timestamp
+        FROM chat_messages m
+        JOIN chat_sessions s ON s.id = m.session_pk
+        WHERE m.sender = 'user'
+        ORDER BY m.timestamp, m.id
+    """)
+    for row in stream:
+        fold_row(*row)
+    stream.close()
+
+    cursor.execute("TRUNCATE user_trajectories")
+    rows = [fold.row(user_id) for user_id, fold in folds.items()]
+    for offset in range(0, len(rows), fetch_rows):
+        execute_values(cursor, "INSERT INTO user_trajectories VALUES %s", rows[offset:offset + fetch_rows])
+    conn.commit()
+    cursor.close()
+    logger.info("Backfilled %d users from %d archived and %d live days", len(rows), len(archived), len(live_days))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    import psycopg2
+    from dotenv import load_dotenv
+
+    from config import ARCHIVE_DIR, ARCHIVE_ENABLED, TRAJECTORY_HALF_LIFE_HOURS
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Per-user emotional trajectories")
+    parser.add_argument("--backfill", action="store_true", help="rebuild user_trajectories from the archive and chat_messages")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild even if expired history is missing from the archive")
+    parser.add_argument("--user", help="print one user's trajectory")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        if args.backfill:
+            users = backfill(conn, TRAJECTORY_HALF_LIFE_HOURS, ARCHIVE_DIR if ARCHIVE_ENABLED else None, args.force)
+            print(f"Backfilled trajectories for {users} users")
+        if args.user:
+            print(json.dumps(get_trajectory(conn.cursor(), args.user), indent=2))
+    finally:
+        conn.close()
@@ -1,35 +1,123 @@
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
+
+const API_URL = "http://localhost:8001";
+const WS_URL = "ws://localhost:8001/ws/chat";
+const USER_ID = "user-123"; // You can get this from auth context
+const MAX_RECONNECT_DELAY_MS = 10000;
+
+// Sent with each message on both transports, so the server stores a resend once
+const newMessageId = () =>
+  (typeof crypto !== "undefined" && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 
 export default function ChatBox() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
-  const [sessionId, setSessionId] = useState(null);
+  const socketRef = useRef(null);
+  const sessionIdRef = useRef(null);
+  // { text, id } sent over the socket whose reply has not arrived yet
+  const pendingRef = useRef(null);
 
-  const sendMessage = async () => {
-    if (!input.trim()) return;
-    
-    const userMessage = input.trim();
-    setInput("");
-    setIsLoading(true);
-    
-    // Add user message immediately
+  const addAiMessage = (data) => {
     setMessages(prev => [...prev, { 
-      text: userMessage, 
-      from: "user",
+      text: data.response,
+      from: "ai",
+      emotion: data.emotion,
+      severity: data.severity,
+      confidence: data.confidence,
+      needs_help: data.needs_help,
+      resources: data.resources,
       timestamp: new Date().toLocaleTimeString()
     }]);
+  };
+
+  const addErrorMessage = () => {
+    setMessages(prev => [...prev, { 
+      text: "I'm sorry, I'm having trouble connecting right now. Please try again.",
+      from: "ai",
+      error: true,
+      timestamp: new Date().toLocaleTimeString()
+    }]);
+  };
+
+  // One socket for the whole conversation: the server resolves the session
+  // once per connection. Reconnects resume the same session.
+  useEffect(() => {
+    let closed = false;
+    let retryDelay = 1000;
+    let retryTimer = null;
+
+    const connect = () => {
+      const params = new URLSearchParams({ user_id: USER_ID });
+      if (sessionIdRef.current) {
+        params.set("session_id", sessionIdRef.current);
+      }
+      const socket = new WebSocket(`${WS_URL}?${params}`);
+      socketRef.current = socket;
+
+      socket.onopen = () => {
+        retryDelay = 1000;
+      };
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === "session") {
+          sessionIdRef.current = data.session_id;
+        } else if (data.type === "reply") {
+          pendingRef.current = null;
+          addAiMessage(data);
+          setIsLoading(false);
+        } else if (data.type === "error") {
+          pendingRef.current = null;
+          console.error("Chat socket error:", data.detail);
+          addErrorMessage();
+          setIsLoading(false);
+        }
+      };
+      socket.onclose = () => {
+        socketRef.current = null;
+        // Dropped before the reply: retry over HTTP rather than leave it
+        // spinning. Same id, so the server skips it if the socket got it.
+        const pending = pendingRef.current;
+        pendingRef.current = null;
+        if (pending !== null) {
+          if (closed) {
+            setIsLoading(false);
+          } else {
+            sendOverHttp(pending.text, pending.id);
+          }
+        }
+        if (!closed) {
+          retryTimer = setTimeout(connect, retryDelay);
+          retryDelay = Math.min(retryDelay * 2, MAX_RECONNECT_DELAY_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socketRef.current) {
+        socketRef.current.close();
+      }
+    };
+  }, []);
 
+  // Fallback while the socket is (re)connecting
+  const sendOverHttp = async (userMessage, messageId) => {
     try {
-      const response = await fetch('http://localhost:8001/api/chat/send-message', {
+      const response = await fetch(`${API_URL}/api/chat/send-message`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           message: userMessage,
-          user_id: "user-123", // You can get this from auth context
-          session_id: sessionId // Use existing session or null for new session
+          user_id: USER_ID,
+          session_id: sessionIdRef.current, // Use existing session or null for new session
+          message_id: messageId
         })
       });
 
@@ -40,35 +128,46 @@ export default function ChatBox() {
       const data = await response.json();
       
       // Store session ID for future messages
-      if (!sessionId) {
-        setSessionId(data.session_id);
+      if (!sessionIdRef.current) {
+        sessionIdRef.current = data.session_id;
       }
       
       // Add AI response with emotion data
-      setMessages(prev => [...prev, { 
-        text: data.response,
-        from: "ai",
-        emotion: data.emotion,
-        severity: data.severity,
-        confidence: data.confidence,
-        needs_help: data.needs_help,
-        resources: data.resources,
-        timestamp: new Date().toLocaleTimeString()
-      }]);
+      addAiMessage(data);
 
     } catch (error) {
       console.error('Error sending message:', error);
-      setMessages(prev => [...prev, { 
-        text: "I'm sorry, I'm having trouble connecting right now. Please try again.",
-        from: "ai",
-        error: true,
-        timestamp: new Date().toLocaleTimeString()
-      }]);
+      addErrorMessage();
     } finally {
       setIsLoading(false);
     }
   };
 
+  const sendMessage = async () => {
+    if (!input.trim()) return;
+    
+    const userMessage = input.trim();
+    const messageId = newMessageId();
+    setInput("");
+    setIsLoading(true);
+    
+    // Add user message immediately
+    setMessages(prev => [...prev, { 
+      text: userMessage, 
+      from: "user",
+      timestamp: new Date().toLocaleTimeString()
+    }]);
+
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      // The reply arrives in socket.onmessage
+      pendingRef.current = { text: userMessage, id: messageId };
+      socket.send(JSON.stringify({ message: userMessage, message_id: messageId }));
+    } else {
+      await sendOverHttp(userMessage, messageId);
+    }
+  };
+
   const handleKeyPress = (e) => {
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault();